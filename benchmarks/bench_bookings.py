@@ -0,0 +1,82 @@
+"""Скорость поиска свободного времени по мере накопления аренд
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_bookings
+    python -m benchmarks.bench_bookings --days 180 --per-day 6
+
+База заполняется арендами катеров каталога за --days дней (по --per-day
+на катер в день), после каждой порции замеряются free_starts (клавиатура
+часов) и add с отказом из-за пересечения. Время не должно расти с числом
+аренд — поиск идет по индексам (катер, начало) и (капитан, начало).
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import tempfile
+
+from benchmarks.bench_render import summarize
+
+
+def main(argv=None) -> int:
+    from utils.bookings import BookingConflict, BookingStore, captain_key, to_minutes
+    from utils.catalog import catalog
+
+    parser = argparse.ArgumentParser(description="Поиск свободного времени в базе аренд")
+    parser.add_argument('--days', type=int, default=120, help="дней сезона")
+    parser.add_argument('--per-day', type=int, default=4, help="аренд на катер в день")
+    parser.add_argument('--samples', type=int, default=200, help="замеров на каждой точке")
+    args = parser.parse_args(argv)
+
+    snapshot = catalog.snapshot
+    boats = [(name, captain_key(*snapshot[name].captains[0])) for name in snapshot.names if snapshot[name].captains]
+    first_day = datetime.date.today()
+    dates = [(first_day + datetime.timedelta(days=day)).strftime("%d.%m.%Y") for day in range(args.days)]
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BookingStore(os.path.join(tmp, 'bookings.sqlite3'))
+        print(f"{'аренд':>8}{'free_starts p50, мс':>22}{'p95':>8}{'отказ add p50, мс':>20}{'p95':>8}")
+        total = 0
+        checkpoints = {args.days // 8 or 1, args.days // 2 or 1, args.days}
+        for day_index, date in enumerate(dates, 1):
+            day = to_minutes(date)
+            for boat, captain in boats:
+                for slot in range(args.per_day):
+                    start = day + 9 * 60 + slot * 150
+                    try:
+                        store.add(boat, captain, start, start + 120)
+                        total += 1
+                    except BookingConflict:
+                        pass  # капитан уже занят на другом катере
+            if day_index not in checkpoints:
+                continue
+
+            free, conflict = [], []
+            for _ in range(args.samples):
+                boat, captain = rng.choice(boats)
+                date = rng.choice(dates[:day_index])
+                started = time.perf_counter()
+                store.free_starts(boat, captain, date, 120)
+                free.append(time.perf_counter() - started)
+
+                start = to_minutes(date, '09:30')
+                started = time.perf_counter()
+                try:
+                    store.add(boat, captain, start, start + 60)
+                except BookingConflict:
+                    pass
+                conflict.append(time.perf_counter() - started)
+            free, conflict = summarize(free), summarize(conflict)
+            print(
+                f"{total:>8}{free['median_ms']:>22.2f}{free['p95_ms']:>8.2f}"
+                f"{conflict['median_ms']:>20.2f}{conflict['p95_ms']:>8.2f}"
+            )
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""Превью карточки картинкой против PDF: время и размер
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_preview
+    python -m benchmarks.bench_preview --repeat 20 --scale 2
+
+Для каждого катера рендерятся PDF (render_card) и превью (render_preview)
+в JPEG и WebP; фоны обоих движков собираются до замеров, так что
+сравнивается рендер одной карточки на прогретых кэшах, как в боте.
+"""
+import sys
+import time
+import argparse
+
+from benchmarks.bench_render import sample_data, summarize
+
+
+def main(argv=None) -> int:
+    from utils import pdf_builder, preview
+    from utils.catalog import catalog
+
+    parser = argparse.ArgumentParser(description="Превью карточки против PDF")
+    parser.add_argument('--repeat', type=int, default=10, help="рендеров на катер")
+    parser.add_argument('--scale', type=float, default=preview.SCALE, help="пикселей на пункт превью")
+    args = parser.parse_args(argv)
+
+    snapshot = catalog.snapshot
+    engines = {
+        'pdf': lambda data: pdf_builder.render_card(data),
+        'jpeg': lambda data: preview.render_preview(data, image_format='JPEG', scale=args.scale),
+        'webp': lambda data: preview.render_preview(data, image_format='WEBP', scale=args.scale),
+    }
+
+    started = time.perf_counter()
+    pdf_builder.warm_backgrounds()
+    print(f"Фоны PDF: {(time.perf_counter() - started) * 1000:.0f} мс")
+    started = time.perf_counter()
+    preview.warm_previews()
+    print(f"Фоны превью: {(time.perf_counter() - started) * 1000:.0f} мс\n")
+
+    print(f"{'движок':<8}{'p50, мс':>10}{'p95, мс':>10}{'размер, КБ':>13}")
+    for engine, render in engines.items():
+        samples, sizes = [], []
+        for name in snapshot.names:
+            data = sample_data(snapshot[name])
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                result = render(data)
+                samples.append(time.perf_counter() - started)
+            sizes.append(len(result))
+        stats = summarize(samples)
+        print(f"{engine:<8}{stats['median_ms']:>10.1f}{stats['p95_ms']:>10.1f}{sum(sizes) / len(sizes) / 1024:>13.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
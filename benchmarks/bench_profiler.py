@@ -0,0 +1,82 @@
+"""Затраты сэмплирующего профайлера на рендер карточек
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_profiler
+    python -m benchmarks.bench_profiler --cards 400 --interval 1 --out /tmp/render.folded
+
+Карточки рендерятся в пуле потоков, как в боте, сначала без профайлера,
+потом под ним. Выводятся время на карточку в обоих прогонах, собственные
+затраты сэмплера и функции с наибольшим собственным временем. С --out
+свернутые стеки сохраняются для flamegraph.pl или speedscope.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+from benchmarks.bench_render import sample_data
+
+# Бенчмарку не нужно постоянное FSM-хранилище бота
+os.environ.setdefault('FSM_STORAGE', 'memory')
+
+
+async def run(cards: int, workers: int, interval: float, rounds: int, out: str) -> int:
+    from utils.catalog import catalog
+    from utils.pdf_builder import render_card_timed, warm_backgrounds
+    from utils.profiler import SamplingProfiler
+    from utils.render_pool import RenderPool
+
+    snapshot = catalog.snapshot
+    datas = [sample_data(snapshot[name]) for name in snapshot.names if snapshot[name].captains]
+    warm_backgrounds()
+    pool = RenderPool('thread', workers, max_queue=cards)
+
+    async def render_all() -> float:
+        started = time.perf_counter()
+        await asyncio.gather(*(pool.run(render_card_timed, datas[i % len(datas)]) for i in range(cards)))
+        return (time.perf_counter() - started) / cards
+
+    await render_all()  # прогрев
+    plain, profiled = [], []
+    profiler = SamplingProfiler(interval)
+    profile = None
+    for _ in range(rounds):
+        plain.append(await render_all())
+        handle = profiler.start()
+        try:
+            profiled.append(await render_all())
+        finally:
+            profile = await asyncio.to_thread(profiler.stop, handle)
+    pool.shutdown()
+
+    plain_ms = statistics.median(plain) * 1000
+    profiled_ms = statistics.median(profiled) * 1000
+    print(f"Карточек: {cards} x {rounds}, воркеров {workers}, сэмпл раз в {interval * 1000:.1f} мс")
+    print(f"Без профайлера: {plain_ms:.2f} мс на карточку, под профайлером: {profiled_ms:.2f} мс "
+          f"({(profiled_ms / plain_ms - 1):+.1%})")
+    print(f"Последний профиль: сэмплов {profile.samples}, стеков {len(profile.stacks)}, "
+          f"затраты сэмплера {profile.overhead:.1%}")
+    for name, share in profile.top(8):
+        print(f"  {share:6.1%}  {name}")
+    if out:
+        with open(out, 'w', encoding='utf-8') as f:
+            f.write(profile.collapsed())
+        print(f"Свернутые стеки: {out}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Затраты сэмплирующего профайлера на рендер")
+    parser.add_argument('--cards', type=int, default=200, help="карточек в прогоне")
+    parser.add_argument('--workers', type=int, default=2, help="потоков рендера")
+    parser.add_argument('--interval', type=float, default=5.0, help="интервал сэмплирования, мс")
+    parser.add_argument('--rounds', type=int, default=3, help="пар прогонов без и с профайлером")
+    parser.add_argument('--out', help="файл для свернутых стеков")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.cards, args.workers, args.interval / 1000, args.rounds, args.out))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
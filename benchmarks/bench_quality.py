@@ -0,0 +1,85 @@
+"""Размер карточек по профилям качества (PDF_QUALITY)
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_quality
+    python -m benchmarks.bench_quality --mode incremental --profiles original standard
+
+Для каждого катера и профиля рендерится карточка и выводится ее размер.
+В итогах — средний размер и из чего он складывается: фото (с маской),
+встроенные шрифты и остальное (шаблон, текст, служебные объекты).
+Шрифты DejaVu reportlab всегда встраивает подмножеством — только
+использованные в карточке глифы.
+"""
+import sys
+import argparse
+from io import BytesIO
+
+from benchmarks.bench_render import sample_data
+
+
+def breakdown(pdf: bytes) -> dict:
+    """Байты потоков PDF по видам: image, font и прочее"""
+    from PyPDF2 import PdfReader
+    from PyPDF2.generic import StreamObject
+
+    reader = PdfReader(BytesIO(pdf))
+    sizes = {'image': 0, 'font': 0}
+    seen = set()
+    for idnum in range(1, int(reader.trailer['/Size'])):
+        try:
+            obj = reader.get_object(idnum)
+        except Exception:
+            continue
+        if not isinstance(obj, StreamObject) or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if obj.get('/Subtype') == '/Image':
+            sizes['image'] += len(obj._data)
+        elif any(name in obj for name in ('/Length1', '/Length2', '/Length3')):
+            sizes['font'] += len(obj._data)
+    sizes['other'] = len(pdf) - sizes['image'] - sizes['font']
+    return sizes
+
+
+def main(argv=None) -> int:
+    from utils import pdf_builder
+    from utils.catalog import catalog
+
+    parser = argparse.ArgumentParser(description="Размер карточек по профилям качества")
+    parser.add_argument('--mode', choices=('rewrite', 'incremental'), default=pdf_builder.OUTPUT_MODE)
+    parser.add_argument('--profiles', nargs='+', choices=tuple(pdf_builder.QUALITY_PROFILES),
+                        default=tuple(pdf_builder.QUALITY_PROFILES))
+    args = parser.parse_args(argv)
+
+    snapshot = catalog.snapshot
+    sizes = {}  # (катер, профиль) -> байты
+    totals = {}
+    for profile in args.profiles:
+        pdf_builder.QUALITY = pdf_builder.QUALITY_PROFILES[profile]
+        total = totals[profile] = {'image': 0, 'font': 0, 'other': 0}
+        for name in snapshot.names:
+            pdf = pdf_builder.render_card(sample_data(snapshot[name]), mode=args.mode)
+            sizes[name, profile] = len(pdf)
+            for kind, size in breakdown(pdf).items():
+                total[kind] += size
+
+    print(f"Режим записи: {args.mode}, размер карточки, КБ")
+    print(f"{'катер':<24}" + ''.join(f"{profile:>12}" for profile in args.profiles))
+    for name in snapshot.names:
+        print(f"{name:<24}" + ''.join(f"{sizes[name, profile] / 1024:>12.0f}" for profile in args.profiles))
+
+    count = len(snapshot)
+    print(f"\n{'профиль':<12}{'среднее':>10}{'фото':>10}{'шрифты':>10}{'прочее':>10}   параметры")
+    for profile in args.profiles:
+        total = totals[profile]
+        average = sum(total.values()) / count / 1024
+        print(
+            f"{profile:<12}{average:>10.0f}"
+            + ''.join(f"{total[kind] / count / 1024:>10.0f}" for kind in ('image', 'font', 'other'))
+            + f"   {pdf_builder.QUALITY_PROFILES[profile]}"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
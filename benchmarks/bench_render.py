@@ -0,0 +1,201 @@
+"""Микробенчмарки генерации карточек
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_render                  # замер и вывод
+    python -m benchmarks.bench_render --save           # сохранить baseline
+    python -m benchmarks.bench_render --compare        # сравнить с baseline
+
+В режиме сравнения скрипт завершается с кодом 1, если медиана какого-либо
+этапа стала медленнее baseline больше чем на --threshold (по умолчанию 20%).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(BASE_DIR, 'benchmarks', 'baseline.json')
+
+# Бенчмарку не нужно постоянное FSM-хранилище бота
+os.environ.setdefault('FSM_STORAGE', 'memory')
+
+
+def sample_data(boat) -> dict:
+    """Данные карточки, как их собирает бот"""
+    captain = boat.captains[0]
+    return {
+        'boat': boat.name,
+        'pier': boat.pier,
+        'captain_name': captain.name,
+        'captain_phone': captain.phone,
+        'date': '12.07.2026',
+        'time': '18:30',
+        'hours': '2.5',
+        'guests_count': '8',
+        'client_name': 'Константин Константинопольский',
+        'remaining_payment': '15000',
+    }
+
+
+def measure(func, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        'median_ms': statistics.median(samples) * 1000,
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        'max_ms': samples[-1] * 1000,
+        'runs': len(samples),
+    }
+
+
+def run(repeat: int, mode: str = None) -> dict:
+    from utils import backgrounds, pdf_builder
+    from utils.backgrounds import BackgroundCache
+    from utils.catalog import catalog
+    from utils.photo_cache import round_corners
+
+    snapshot = catalog.snapshot
+    boats = [snapshot[name] for name in snapshot.names]
+    plan = pdf_builder.layout_registry.plan()
+    stages = {}
+
+    def add(stage, samples):
+        stages.setdefault(stage, []).extend(samples)
+
+    # Обработка фото без кэша: скругление углов и PNG
+    for boat in boats:
+        add('image', measure(lambda: round_corners(boat.photo_path, plan.photo.radius), 1))
+
+    # Сборка фона (шаблон + фото) без кэша фонов, с прогретым кэшем фото
+    for boat in boats:
+        add('background_build', measure(
+            lambda: pdf_builder.build_background(plan.template_path, boat.photo_path, plan.photo), 1
+        ))
+
+    # Горячий рендер по этапам: фон из кэша, текст, слияние, сериализация
+    pdf_builder.warm_backgrounds()
+    sizes = {}
+    for boat in boats:
+        data = sample_data(boat)
+        for _ in range(repeat):
+            timings = {}
+            started = time.perf_counter()
+            pdf = pdf_builder.render_card(data, timings, mode=mode)
+            timings['total'] = time.perf_counter() - started
+            for stage, seconds in timings.items():
+                add(f"render_{stage}", [seconds])
+        sizes[boat.name] = len(pdf)
+
+    # Клавиатуры бота
+    import main
+    add('keyboard_boats', measure(lambda: main.build_boats_keyboard(snapshot), repeat * 10))
+    add('keyboard_hours', measure(main.get_hours_keyboard, repeat * 10))
+    add('keyboard_start_hours', measure(main.generate_hours_keyboard, repeat * 10))
+    add('keyboard_minutes', measure(lambda: main.generate_minutes_keyboard(12), repeat * 10))
+
+    # Пиковая память одного холодного и одного горячего рендера
+    shared_cache = backgrounds.background_cache
+    with tempfile.TemporaryDirectory() as tmp:
+        backgrounds.background_cache = BackgroundCache(cache_dir=tmp)
+        tracemalloc.start()
+        pdf_builder.render_card(sample_data(boats[0]))
+        cold_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        pdf_builder.render_card(sample_data(boats[0]))
+        warm_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    backgrounds.background_cache = shared_cache
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'boats': len(boats),
+            'repeat': repeat,
+            'mode': mode or pdf_builder.OUTPUT_MODE,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'stages': {stage: summarize(samples) for stage, samples in stages.items()},
+        'memory': {
+            'cold_render_peak_kb': cold_peak / 1024,
+            'warm_render_peak_kb': warm_peak / 1024,
+        },
+        'size': {
+            'avg_kb': statistics.mean(sizes.values()) / 1024,
+            'max_kb': max(sizes.values()) / 1024,
+            'per_boat_kb': {name: size / 1024 for name, size in sizes.items()},
+        },
+    }
+
+
+def print_report(result: dict):
+    print(f"{'этап':<26}{'медиана, мс':>14}{'p95, мс':>12}{'макс, мс':>12}")
+    for stage, stats in result['stages'].items():
+        print(f"{stage:<26}{stats['median_ms']:>14.3f}{stats['p95_ms']:>12.3f}{stats['max_ms']:>12.3f}")
+    memory = result['memory']
+    size = result['size']
+    print(
+        f"\nПиковая память: холодный рендер {memory['cold_render_peak_kb']:.0f} КБ, "
+        f"горячий {memory['warm_render_peak_kb']:.0f} КБ"
+    )
+    print(f"Размер PDF: в среднем {size['avg_kb']:.0f} КБ, максимум {size['max_kb']:.0f} КБ")
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list:
+    """Возвращает список этапов, ставших медленнее baseline больше чем на threshold"""
+    regressions = []
+    for stage, base in baseline['stages'].items():
+        current = result['stages'].get(stage)
+        if current is None:
+            continue
+        change = current['median_ms'] / base['median_ms'] - 1 if base['median_ms'] else 0.0
+        mark = 'РЕГРЕССИЯ' if change > threshold else 'ok'
+        print(f"{stage:<26}{base['median_ms']:>12.3f} -> {current['median_ms']:>10.3f} мс  {change:+7.1%}  {mark}")
+        if change > threshold:
+            regressions.append(stage)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки генерации карточек")
+    parser.add_argument('--repeat', type=int, default=5, help="повторов горячего рендера на катер")
+    parser.add_argument('--mode', choices=('rewrite', 'incremental'), help="способ записи карточки")
+    parser.add_argument('--save', nargs='?', const=BASELINE_PATH, help="сохранить результат как baseline")
+    parser.add_argument('--compare', nargs='?', const=BASELINE_PATH, help="сравнить с baseline")
+    parser.add_argument('--threshold', type=float, default=0.2, help="допустимое замедление (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    result = run(args.repeat, args.mode)
+    print_report(result)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nBaseline сохранен: {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nСравнение с {args.compare} (порог {args.threshold:.0%}):")
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"\nМедленнее baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Скорость поиска катеров (инлайн-поиск и листание списка)
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_search
+    python -m benchmarks.bench_search --boats 10000
+
+Каталог configs/boats.json размножается до --boats катеров (копии с
+номерами и переставленными причалами/капитанами), строится BoatSearchIndex
+и замеряется search() на запросах разного вида: префикс названия, причал,
+капитан и запрос с опечаткой (нечеткий поиск по триграммам).
+"""
+import sys
+import time
+import random
+import argparse
+
+from benchmarks.bench_render import summarize
+
+QUERIES = {
+    'prefix': ['Мон', 'Ma', 'Jer', 'Фран', 'Эль'],
+    'pier': ['Мойк', 'Фонтан', 'Грибо'],
+    'captain': ['Дмит', 'Роман', 'Евг'],
+    'typo': ['Belgua', 'Франчесо', 'Монфернан', 'Черны шериф'],
+}
+
+
+def fleet(size: int):
+    """Срез каталога из size катеров на основе настоящего каталога"""
+    from utils.catalog import CatalogSnapshot, catalog
+
+    snapshot = catalog.snapshot
+    base = [snapshot[name] for name in snapshot.names]
+    piers = [boat.pier for boat in base]
+    captains = [boat.captains for boat in base]
+    rng = random.Random(1)
+    boats = {}
+    for number in range(size):
+        boat = base[number % len(base)]
+        name = boat.name if number < len(base) else f"{boat.name} {number // len(base) + 1}"
+        boats[name] = boat._replace(name=name, pier=rng.choice(piers), captains=rng.choice(captains))
+    return CatalogSnapshot(boats, 0, 1)
+
+
+def main(argv=None) -> int:
+    from utils.search import BoatSearchIndex
+
+    parser = argparse.ArgumentParser(description="Скорость поиска катеров")
+    parser.add_argument('--boats', type=int, default=5000, help="размер каталога")
+    parser.add_argument('--repeat', type=int, default=200, help="повторов каждого запроса")
+    parser.add_argument('--limit', type=int, default=50, help="результатов на запрос")
+    args = parser.parse_args(argv)
+
+    snapshot = fleet(args.boats)
+    started = time.perf_counter()
+    index = BoatSearchIndex(snapshot)
+    print(f"Катеров: {len(snapshot)}, построение индекса: {(time.perf_counter() - started) * 1000:.1f} мс\n")
+
+    print(f"{'запросы':<10}{'p50, мс':>10}{'p95, мс':>10}{'макс, мс':>10}   пример")
+    for kind, queries in QUERIES.items():
+        samples = []
+        for _ in range(args.repeat):
+            for query in queries:
+                started = time.perf_counter()
+                index.search(query, args.limit)
+                samples.append(time.perf_counter() - started)
+        stats = summarize(samples)
+        example = index.search(queries[0], 3)
+        print(
+            f"{kind:<10}{stats['median_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['max_ms']:>10.3f}"
+            f"   {queries[0]!r} -> {', '.join(example)}"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
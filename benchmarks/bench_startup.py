@@ -0,0 +1,161 @@
+"""Время запуска бота: импорт main.py и первый рендер
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_startup                 # замер и вывод
+    python -m benchmarks.bench_startup --save          # сохранить baseline
+    python -m benchmarks.bench_startup --compare       # сравнить с baseline
+
+Каждый замер идет в отдельном процессе интерпретатора, чтобы модули не были
+уже загружены. Импорт разбирается по выводу python -X importtime.
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks.bench_render import BASE_DIR, compare, summarize
+
+BASELINE_PATH = os.path.join(BASE_DIR, 'benchmarks', 'startup_baseline.json')
+# Пакеты, которые показываем в отчете отдельно
+PACKAGES = ('aiogram', 'aiohttp', 'pydantic', 'reportlab', 'PyPDF2', 'PIL', 'utils.pdf_builder')
+
+# Первый рендер в свежем процессе: импорт стека PDF, шрифты, карточка.
+# argv[1] — каталог с уже прогретым кэшем метрик шрифтов
+FIRST_RENDER = """
+import sys, time, json
+timings = {}
+started = time.perf_counter()
+from utils import pdf_builder
+from utils.catalog import catalog
+from utils.font_cache import load_ttfont
+timings['import_pdf_builder'] = time.perf_counter() - started
+
+started = time.perf_counter()
+from reportlab.pdfbase.ttfonts import TTFont
+timings['import_reportlab'] = time.perf_counter() - started
+
+started = time.perf_counter()
+TTFont('DejaVuSans', pdf_builder.font_path)
+TTFont('DejaVuSans-Bold', pdf_builder.bold_font_path)
+timings['fonts_parse'] = time.perf_counter() - started
+
+started = time.perf_counter()
+load_ttfont('DejaVuSans', pdf_builder.font_path, cache_dir=sys.argv[1])
+load_ttfont('DejaVuSans-Bold', pdf_builder.bold_font_path, cache_dir=sys.argv[1])
+timings['fonts_cached'] = time.perf_counter() - started
+
+pdf_builder.layout_registry.plan()
+boat = catalog.snapshot[catalog.snapshot.names[0]]
+started = time.perf_counter()
+pdf_builder.render_card({
+    'boat': boat.name, 'pier': boat.pier, 'captain_name': 'Иван', 'captain_phone': '+7 900 000-00-00',
+    'date': '12.07.2026', 'time': '18:30', 'hours': '2', 'guests_count': '6',
+    'client_name': 'Петр', 'remaining_payment': '5000',
+})
+timings['first_render'] = time.perf_counter() - started
+print(json.dumps(timings))
+"""
+
+
+def _env() -> dict:
+    return dict(os.environ, FSM_STORAGE='memory', PYTHONDONTWRITEBYTECODE='1')
+
+
+def import_profile() -> dict:
+    """Время импорта main.py и отдельных пакетов по -X importtime, секунды"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=BASE_DIR, env=_env(), capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    # Формат строки: "import time: <self, мкс> | <cumulative, мкс> | <модуль>"
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, total_us, module = line.split('|')
+        module = module.strip()
+        cumulative[module] = max(cumulative.get(module, 0), int(total_us) / 1e6)
+    return cumulative
+
+
+def first_render_profile(cache_dir: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, '-c', FIRST_RENDER, cache_dir],
+        cwd=BASE_DIR, env=_env(), capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(repeat: int) -> dict:
+    from utils.font_cache import load_ttfont
+    from utils.pdf_builder import bold_font_path, font_path
+
+    stages = {}
+    loaded = {}
+
+    def add(stage, seconds):
+        stages.setdefault(stage, []).append(seconds)
+
+    font_cache_dir = tempfile.mkdtemp()
+    load_ttfont('DejaVuSans', font_path, cache_dir=font_cache_dir)
+    load_ttfont('DejaVuSans-Bold', bold_font_path, cache_dir=font_cache_dir)
+
+    for _ in range(repeat):
+        cumulative = import_profile()
+        add('import_main', cumulative['main'])
+        for package in PACKAGES:
+            if package in cumulative:
+                add(f"import_{package}", cumulative[package])
+            loaded[package] = package in cumulative
+
+        for stage, seconds in first_render_profile(font_cache_dir).items():
+            add(stage, seconds)
+
+    shutil.rmtree(font_cache_dir, ignore_errors=True)
+    return {
+        'stages': {stage: summarize(samples) for stage, samples in stages.items()},
+        'loaded_by_main': loaded,
+    }
+
+
+def print_report(result: dict):
+    print(f"{'этап':<30}{'медиана, мс':>14}{'макс, мс':>12}")
+    for stage, stats in result['stages'].items():
+        print(f"{stage:<30}{stats['median_ms']:>14.1f}{stats['max_ms']:>12.1f}")
+    print("\nЗагружаются при импорте main.py:")
+    for package, loaded in result['loaded_by_main'].items():
+        print(f"  {package:<28}{'да' if loaded else 'нет'}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Время запуска бота")
+    parser.add_argument('--repeat', type=int, default=5, help="число запусков интерпретатора")
+    parser.add_argument('--save', nargs='?', const=BASELINE_PATH, help="сохранить результат как baseline")
+    parser.add_argument('--compare', nargs='?', const=BASELINE_PATH, help="сравнить с baseline")
+    parser.add_argument('--threshold', type=float, default=0.2, help="допустимое замедление (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    result = run(args.repeat)
+    print_report(result)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nBaseline сохранен: {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nСравнение с {args.compare} (порог {args.threshold:.0%}):")
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"\nМедленнее baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
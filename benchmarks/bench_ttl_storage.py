@@ -0,0 +1,81 @@
+"""Брошенные анкеты в памяти: учет размера и удаление по сроку (TTLStorage)
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_ttl_storage
+    python -m benchmarks.bench_ttl_storage --drafts 100000 --ttl 2
+
+В MemoryStorage, обернутое TTLStorage, записываются --drafts анкет с
+данными, как у бота на середине анкеты. Выводится оценка объема из
+stats() рядом с реальным приростом памяти (tracemalloc), затраты обертки
+на запись и время, за которое истекшие анкеты удаляются.
+"""
+import sys
+import time
+import asyncio
+import argparse
+import tracemalloc
+
+from benchmarks.bench_render import sample_data
+
+
+async def run(drafts: int, ttl: float) -> int:
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.fsm.storage.memory import MemoryStorage
+    from utils.catalog import catalog
+    from utils.ttl_storage import TTLStorage
+
+    snapshot = catalog.snapshot
+    boats = [snapshot[name] for name in snapshot.names]
+    keys = [StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id) for chat_id in range(1, drafts + 1)]
+
+    async def fill(storage):
+        started = time.perf_counter()
+        for index, key in enumerate(keys):
+            await storage.set_state(key, 'Form:guests_count')
+            # Имя гостя свое у каждой анкеты, как в жизни; остальные строки общие
+            data = dict(sample_data(boats[index % len(boats)]), client_name=f"Гость {index}")
+            await storage.set_data(key, data)
+        return time.perf_counter() - started
+
+    plain = await fill(MemoryStorage())
+    timed_storage = TTLStorage(MemoryStorage(), 3600)
+    wrapped = await fill(timed_storage)
+    await timed_storage.close()
+
+    expired = []
+
+    async def on_expire(key, state):
+        expired.append(time.perf_counter())
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    storage = TTLStorage(MemoryStorage(), ttl, on_expire=on_expire, check_interval=0.5)
+    await fill(storage)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    stats = storage.stats()
+    print(f"Анкет: {stats['entries']}, оценка stats(): {stats['bytes'] / 2**20:.1f} МБ, "
+          f"рост памяти (tracemalloc): {held / 2**20:.1f} МБ")
+    print(f"Запись анкет: MemoryStorage {plain / drafts * 1e6:.1f} мкс, с TTLStorage {wrapped / drafts * 1e6:.1f} мкс")
+
+    started = time.perf_counter()
+    while storage.stats()['entries']:
+        await asyncio.sleep(0.05)
+    finished = time.perf_counter()
+    print(f"Удаление: {len(expired)} анкет за {(finished - expired[0]) * 1000:.0f} мс после первого истечения "
+          f"(ждали {finished - started:.1f} с), осталось в памяти {storage.stats()['bytes']} байт")
+    await storage.close()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Удаление брошенных анкет по сроку")
+    parser.add_argument('--drafts', type=int, default=50000, help="число брошенных анкет")
+    parser.add_argument('--ttl', type=float, default=1.0, help="срок жизни анкеты, секунды")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.drafts, args.ttl))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Проверка повторных запросов: двойные нажатия, повторная сумма, та же анкета
+
+Запуск из корня проекта:
+    python -m benchmarks.check_duplicates
+
+main.py запускается против стенда Bot API (loadtest.fake_api), как в
+нагрузочном тесте. Один менеджер:
+  1. дважды подряд нажимает кнопку катера — вопрос о капитане должен
+     прийти один раз;
+  2. дважды подряд отправляет сумму — карточка (превью и PDF) одна;
+  3. не получает PDF из-за ошибки отправки и повторяет сумму — аренда
+     признается своей, а карточка берется из кэша без нового рендера.
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import subprocess
+
+from aiohttp import web
+
+from loadtest.fake_api import FakeBotAPI, serve
+from loadtest.simulate import BASE_DIR, FLOW, VirtualUser, wait_bot_ready
+
+PORT = 8093
+
+
+async def drain(user: VirtualUser, seconds: float) -> list:
+    """Все ответы бота за seconds секунд"""
+    replies = []
+    deadline = time.monotonic() + seconds
+    while True:
+        try:
+            out = await asyncio.wait_for(user.inbox.get(), max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            return replies
+        user.last_message_id = out.message_id
+        replies.append(out)
+
+
+def texts(replies: list, method: str, marker: str = '') -> list:
+    return [
+        out for out in replies
+        if out.method == method and marker in (out.payload.get('text') or out.payload.get('caption') or '')
+    ]
+
+
+async def fill_form(user: VirtualUser, boat: str, until: str):
+    """Проходит шаги анкеты до шага until (не включая его)"""
+    for step in FLOW:
+        if step.handler == until:
+            return
+        await user.step(step, boat, 60)
+
+
+async def check(api: FakeBotAPI, boat: str) -> list:
+    problems = []
+    user = VirtualUser(api, 555001)
+    user.start_flow()
+    steps = {step.handler: step for step in FLOW}
+
+    # 1. Двойное нажатие кнопки катера
+    await fill_form(user, boat, 'process_boat')
+    update = steps['process_boat'].update(user, boat)
+    api.push_update(update)
+    api.push_update(steps['process_boat'].update(user, boat))
+    replies = await drain(user, 4)
+    prompts = len(texts(replies, 'sendMessage', 'Выберите капитана'))
+    print(f"Двойное нажатие катера: вопросов о капитане {prompts}")
+    if prompts != 1:
+        problems.append(f"вопрос о капитане пришел {prompts} раз")
+
+    # 2. Сумма отправлена дважды
+    for name in ('process_captain_choice', 'process_hours', 'process_simple_calendar', 'process_hour_selection',
+                 'process_minute_selection', 'process_guests_count', 'process_client_name'):
+        await user.step(steps[name], boat, 60)
+    api.push_update(user.message('15000'))
+    api.push_update(user.message('15000'))
+    replies = await drain(user, 8)
+    documents = texts(replies, 'sendDocument')
+    photos = texts(replies, 'sendPhoto')
+    print(f"Сумма дважды: PDF {len(documents)}, превью {len(photos)}")
+    if len(documents) != 1:
+        problems.append(f"PDF отправлен {len(documents)} раз")
+
+    # 3. Отправка PDF не удалась, менеджер повторяет сумму
+    send_document = api._api_senddocument
+
+    async def fail_once(method: str, payload: dict):
+        api._api_senddocument = send_document
+        raise web.HTTPBadRequest(
+            text=json.dumps({'ok': False, 'error_code': 400, 'description': "Bad Request: test failure"}),
+            content_type='application/json',
+        )
+
+    user.start_flow()
+    await fill_form(user, boat, 'process_remaining_payment')
+    api._api_senddocument = fail_once
+    api.push_update(user.message('15000'))
+    failed = texts(await drain(user, 8), 'sendDocument')
+    api.push_update(user.message('15000'))
+    replies = await drain(user, 8)
+    documents = texts(replies, 'sendDocument')
+    api.push_update(user.message('/render_stats'))
+    stats = texts(await drain(user, 4), 'sendMessage', 'Кэш карточек')
+    cache = re.search(r'из кэша (\d+), к идущему рендеру (\d+), отрисовано (\d+)', stats[0].payload['text']) if stats else None
+    hits, coalesced, misses = map(int, cache.groups()) if cache else (0, 0, 0)
+    print(
+        f"Повтор после ошибки отправки: PDF {len(failed)} -> {len(documents)}, "
+        f"из кэша {hits}, к идущему рендеру {coalesced}, отрисовано {misses}"
+    )
+    if len(documents) != 1:
+        problems.append("после повтора суммы PDF не пришел")
+    if texts(replies, 'sendMessage', 'уже занят'):
+        problems.append("повтор суммы принят за пересечение аренд")
+    # Две анкеты — по одному рендеру превью и PDF на каждую, повтор целиком из кэша
+    if misses != 4 or hits < 2:
+        problems.append(f"повтор суммы отрисован заново (отрисовано {misses}, из кэша {hits})")
+    return problems
+
+
+async def run() -> int:
+    from utils.catalog import catalog
+    boat = next(name for name in catalog.snapshot.names if catalog.snapshot[name].captains)
+
+    api = FakeBotAPI()
+    runner = await serve(api, '127.0.0.1', PORT)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            TELEGRAM_API_URL=f"http://127.0.0.1:{PORT}",
+            BOT_TOKEN='123456:DUPLICATES',
+            # /render_stats отвечает только ADMIN_ID
+            ADMIN_ID='555001',
+            BOT_MODE='polling',
+            METRICS_PORT='0',
+            FSM_DB_PATH=os.path.join(tmp, 'fsm.sqlite3'),
+            FILE_ID_CACHE_PATH=os.path.join(tmp, 'file_ids.json'),
+            BOOKINGS_DB_PATH=os.path.join(tmp, 'bookings.sqlite3'),
+        )
+        process = subprocess.Popen(
+            [sys.executable, 'main.py'], cwd=BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+        )
+        try:
+            await wait_bot_ready(api, process)
+            problems = await check(api, boat)
+        finally:
+            process.terminate()
+            await asyncio.to_thread(process.wait, 30)
+            await runner.cleanup()
+
+    print("Все проверки пройдены" if not problems else "Проблемы:\n  " + "\n  ".join(problems))
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,87 @@
+"""Проверка режима incremental: карточки совпадают с обычным рендером
+
+Запуск из корня проекта:
+    python -m benchmarks.check_incremental
+    python -m benchmarks.check_incremental --dpi 200
+
+Для каждого катера карточка рендерится в обоих режимах. Проверяется, что
+incremental-файл начинается с байтов configs/form.pdf без изменений и что
+страницы растрируются в одинаковые пиксели (нужен pymupdf). Без pymupdf
+сравнивается только извлеченный текст. Код выхода 1 при расхождении.
+"""
+import os
+import sys
+import time
+import argparse
+from io import BytesIO
+
+from benchmarks.bench_render import sample_data
+
+
+def rasterize(pdf: bytes, dpi: int):
+    import pymupdf
+    with pymupdf.open(stream=pdf, filetype='pdf') as document:
+        if document.is_repaired:
+            raise ValueError("PDF пришлось восстанавливать при открытии")
+        return [page.get_pixmap(dpi=dpi).samples for page in document]
+
+
+def extract_text(pdf: bytes):
+    from PyPDF2 import PdfReader
+    return [page.extract_text() for page in PdfReader(BytesIO(pdf)).pages]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Сравнение режимов rewrite и incremental")
+    parser.add_argument('--dpi', type=int, default=150, help="разрешение растра для сравнения")
+    args = parser.parse_args(argv)
+
+    from utils import pdf_builder
+    from utils.catalog import catalog
+
+    try:
+        import pymupdf  # noqa: F401
+        render_pages = lambda pdf: rasterize(pdf, args.dpi)
+        method = f"растр {args.dpi} dpi"
+    except ImportError:
+        render_pages = extract_text
+        method = "текст (pymupdf не установлен)"
+
+    with open(os.path.join(pdf_builder.CONFIGS_DIR, 'form.pdf'), 'rb') as f:
+        template = f.read()
+
+    snapshot = catalog.snapshot
+    failures = 0
+    sizes = {'rewrite': 0, 'incremental': 0}
+    elapsed = {'rewrite': 0.0, 'incremental': 0.0}
+    for name in snapshot.names:
+        data = sample_data(snapshot[name])
+        pdfs = {}
+        for mode in ('rewrite', 'incremental'):
+            pdf_builder.render_card(data, mode=mode)  # фон в кэш
+            started = time.perf_counter()
+            pdfs[mode] = pdf_builder.render_card(data, mode=mode)
+            elapsed[mode] += time.perf_counter() - started
+            sizes[mode] += len(pdfs[mode])
+
+        problems = []
+        if not pdfs['incremental'].startswith(template):
+            problems.append("не начинается с байтов form.pdf")
+        if render_pages(pdfs['rewrite']) != render_pages(pdfs['incremental']):
+            problems.append(f"отличается ({method})")
+        if problems:
+            failures += 1
+            print(f"{name}: {', '.join(problems)}")
+
+    count = len(snapshot)
+    print(f"Проверено катеров: {count}, расхождений: {failures}, сравнение: {method}")
+    for mode in ('rewrite', 'incremental'):
+        print(
+            f"{mode:<12} рендер {elapsed[mode] / count * 1000:7.1f} мс, "
+            f"размер {sizes[mode] / count / 1024:7.0f} КБ"
+        )
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""Пакетная генерация карточек аренды из CSV или JSON Lines
+
+Пример:
+    python bulk_cards.py bookings.csv -o cards.zip
+    python bulk_cards.py bookings.jsonl -o cards/ --workers 4
+
+Поля строки: boat, date, time, hours, guests_count, client_name, captain,
+remaining_payment. Телефон капитана и причал берутся из configs/boats.json
+(для капитана не из каталога можно указать captain_phone).
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import zipfile
+import argparse
+import logging
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from utils.catalog import catalog
+from utils.pdf_builder import render_card
+from utils.validators import validate_name
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('boat', 'date', 'time', 'hours', 'guests_count', 'client_name', 'captain', 'remaining_payment')
+ALLOWED_HOURS = ('1', '1.5', '2', '2.5', '3', '4', '5', '6')
+
+
+def read_rows(path: str):
+    """Построчно читает брони, не загружая файл целиком
+
+    Строки JSON Lines отдаются как есть и разбираются в validate_row, чтобы
+    одна испорченная строка считалась ошибочной, а не прерывала пакет.
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.csv'):
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def validate_row(row: dict, snapshot) -> dict:
+    """Проверяет строку и дополняет ее данными из каталога
+
+    Возвращает данные в том же виде, что собирает бот, или бросает ValueError.
+    """
+    if isinstance(row, str):
+        try:
+            row = json.loads(row)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"строка не разбирается как JSON: {e}")
+    if not isinstance(row, dict):
+        raise ValueError("строка должна быть объектом JSON")
+    row = {key: str(value).strip() for key, value in row.items() if value is not None}
+    missing = [field for field in FIELDS if not row.get(field)]
+    if missing:
+        raise ValueError(f"нет полей: {', '.join(missing)}")
+
+    boat = snapshot.get(row['boat'])
+    if boat is None:
+        raise ValueError(f"катер не найден: {row['boat']}")
+    try:
+        datetime.strptime(row['date'], '%d.%m.%Y')
+        datetime.strptime(row['time'], '%H:%M')
+    except ValueError:
+        raise ValueError("дата должна быть ДД.ММ.ГГГГ, время ЧЧ:ММ")
+    if row['hours'] not in ALLOWED_HOURS:
+        raise ValueError(f"недопустимая продолжительность: {row['hours']}")
+    if not row['guests_count'].isdigit():
+        raise ValueError("количество гостей должно быть числом")
+    if not validate_name(row['client_name']):
+        raise ValueError("имя гостя может содержать только буквы, пробелы и дефисы")
+    if not re.match(r'^\d+$', row['remaining_payment']):
+        raise ValueError("остаток к оплате должен быть числом")
+
+    captain_phone = row.get('captain_phone')
+    if not captain_phone:
+        captain = next((c for c in boat.captains if c.name == row['captain']), None)
+        if captain is None:
+            raise ValueError(f"капитан {row['captain']} не закреплен за катером {boat.name}")
+        captain_phone = captain.phone
+
+    return {
+        'boat': boat.name,
+        'pier': boat.pier,
+        'captain_name': row['captain'],
+        'captain_phone': captain_phone,
+        'date': row['date'],
+        'time': row['time'],
+        'hours': row['hours'],
+        'guests_count': row['guests_count'],
+        'client_name': row['client_name'],
+        'remaining_payment': row['remaining_payment'],
+    }
+
+
+def card_filename(row_no: int, data: dict) -> str:
+    name = re.sub(r'[^\w.-]+', '_', f"{data['boat']}_{data['date']}_{data['time']}")
+    return f"{row_no:05d}_{name}.pdf"
+
+
+class ZipSink:
+    """Записывает карточки в ZIP по мере готовности"""
+
+    def __init__(self, path: str):
+        # PDF уже сжат внутри, повторное сжатие почти ничего не дает
+        self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED)
+
+    def write(self, filename: str, data: bytes):
+        self._zip.writestr(filename, data)
+
+    def close(self):
+        self._zip.close()
+
+
+class DirSink:
+    """Записывает карточки отдельными файлами в каталог"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, filename: str, data: bytes):
+        with open(os.path.join(self.path, filename), 'wb') as f:
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Пакетная генерация карточек аренды")
+    parser.add_argument('input', help="CSV или JSON Lines с бронями")
+    parser.add_argument('-o', '--output', required=True, help="ZIP-архив (.zip) или каталог")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="число процессов рендеринга")
+    args = parser.parse_args(argv)
+
+    sink = ZipSink(args.output) if args.output.lower().endswith('.zip') else DirSink(args.output)
+    snapshot = catalog.snapshot
+    # В работе держим ограниченное число карточек, чтобы память не росла
+    window = args.workers * 2
+
+    total = rendered = invalid = failed = 0
+    total_bytes = 0
+    started = time.perf_counter()
+
+    def collect(done):
+        nonlocal rendered, failed, total_bytes
+        for future in done:
+            row_no, filename = jobs.pop(future)
+            try:
+                data = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Строка {row_no}: ошибка рендеринга: {e}", file=sys.stderr)
+                continue
+            sink.write(filename, data)
+            rendered += 1
+            total_bytes += len(data)
+
+    jobs = {}
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for row_no, row in enumerate(read_rows(args.input), start=1):
+                total += 1
+                try:
+                    data = validate_row(row, snapshot)
+                except ValueError as e:
+                    invalid += 1
+                    print(f"Строка {row_no}: {e}", file=sys.stderr)
+                    continue
+
+                future = executor.submit(render_card, data)
+                jobs[future] = (row_no, card_filename(row_no, data))
+                if len(jobs) >= window:
+                    done, _ = wait(jobs, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+            collect(wait(jobs).done)
+    finally:
+        sink.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Строк: {total}, карточек: {rendered}, с ошибками: {invalid + failed}\n"
+        f"Время: {elapsed:.2f} с, {rendered / elapsed if elapsed else 0:.1f} карточек/с, "
+        f"{total_bytes / 1024 / 1024:.1f} МБ, процессов: {args.workers}"
+    )
+    return 1 if invalid or failed else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Локальная замена Telegram Bot API для нагрузочного теста
+
+Бот подключается к стенду через TELEGRAM_API_URL=http://127.0.0.1:8081.
+Апдейты виртуальных пользователей отдаются боту через getUpdates, а все,
+что бот отправляет в чат, попадает во входящие соответствующего
+пользователя (FakeBotAPI.inbox).
+
+Отдельный запуск (апдейты тогда никто не присылает, удобно для отладки):
+    python -m loadtest.fake_api --port 8081
+"""
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from typing import NamedTuple, Optional
+
+from aiohttp import web
+
+BOT_USER = {'id': 42, 'is_bot': True, 'first_name': 'RentCard', 'username': 'rentcard_loadtest_bot'}
+
+
+class Outgoing(NamedTuple):
+    """Вызов Bot API, адресованный чату"""
+    method: str
+    payload: dict
+    message_id: int
+    received_at: float  # time.perf_counter()
+
+
+class FakeBotAPI:
+    """Стенд Bot API: очередь апдейтов и входящие по чатам
+
+    latency добавляет задержку к каждому ответу, имитируя сеть до Telegram.
+    flood_rate — сколько вызовов в секунду принимается для одного чата;
+    сверх этого стенд отвечает 429 с retry_after, как flood control Telegram.
+    """
+
+    def __init__(self, latency: float = 0.0, flood_rate: float = 0.0):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.flood_errors = 0
+        self._chat_calls = {}  # chat_id -> время последних вызовов
+        self.updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._inboxes = {}
+        self.calls = {}
+        self.uploaded_bytes = 0
+
+    def inbox(self, chat_id: int) -> asyncio.Queue:
+        """Очередь сообщений, которые бот отправил в чат"""
+        try:
+            return self._inboxes[chat_id]
+        except KeyError:
+            queue = self._inboxes[chat_id] = asyncio.Queue()
+            return queue
+
+    def push_update(self, update: dict) -> int:
+        """Ставит апдейт в очередь getUpdates, возвращает его update_id"""
+        update['update_id'] = next(self._update_ids)
+        self.updates.append(update)
+        self._new_updates.set()
+        return update['update_id']
+
+    def next_message_id(self) -> int:
+        return next(self._message_ids)
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route('*', '/bot{token}/{method}', self._handle)
+        return app
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        payload = {}
+        for key, value in (await request.post()).items():
+            if isinstance(value, web.FileField):
+                size = len(value.file.read())
+                self.uploaded_bytes += size
+                payload[key] = {'filename': value.filename, 'size': size}
+            else:
+                payload[key] = value
+        payload.update(request.query)
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if self.flood_rate and 'chat_id' in payload:
+            retry_after = self._flood_control(payload['chat_id'])
+            if retry_after:
+                self.flood_errors += 1
+                return web.json_response({
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f"Too Many Requests: retry after {retry_after}",
+                    'parameters': {'retry_after': retry_after},
+                }, status=429)
+
+        handler = getattr(self, f"_api_{method.lower()}", self._api_default)
+        result = await handler(method, payload)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({'ok': True, 'result': result})
+
+    def _flood_control(self, chat_id) -> int:
+        """retry_after в секундах, если чат превысил flood_rate за последнюю секунду"""
+        now = time.monotonic()
+        calls = [t for t in self._chat_calls.get(chat_id, ()) if now - t < 1.0]
+        if len(calls) >= self.flood_rate:
+            self._chat_calls[chat_id] = calls
+            return 1
+        calls.append(now)
+        self._chat_calls[chat_id] = calls
+        return 0
+
+    async def _api_getupdates(self, method: str, payload: dict):
+        offset = int(payload.get('offset') or 0)
+        limit = int(payload.get('limit') or 100)
+        timeout = float(payload.get('timeout') or 0)
+
+        # Подтвержденные ботом апдейты больше не нужны
+        if offset:
+            self.updates = [u for u in self.updates if u['update_id'] >= offset]
+        if not self.updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:limit]
+
+    async def _api_getme(self, method: str, payload: dict):
+        return BOT_USER
+
+    def _message(self, method: str, payload: dict, message_id: Optional[int] = None) -> dict:
+        chat_id = int(payload['chat_id'])
+        message_id = message_id or self.next_message_id()
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if 'text' in payload:
+            message['text'] = payload['text']
+        if 'caption' in payload:
+            message['caption'] = payload['caption']
+        self.inbox(chat_id).put_nowait(Outgoing(method, payload, message_id, time.perf_counter()))
+        return message
+
+    async def _api_sendmessage(self, method: str, payload: dict):
+        return self._message(method, payload)
+
+    async def _api_editmessagetext(self, method: str, payload: dict):
+        if 'inline_message_id' in payload:
+            return True
+        return self._message(method, payload, int(payload['message_id']))
+
+    async def _api_sendphoto(self, method: str, payload: dict):
+        message = self._message(method, payload)
+        file_id = f"photo-{next(self._file_ids)}"
+        message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 853}]
+        return message
+
+    async def _api_senddocument(self, method: str, payload: dict):
+        message = self._message(method, payload)
+        document = payload.get('document')
+        file_id = f"document-{next(self._file_ids)}"
+        message['document'] = {
+            'file_id': file_id,
+            'file_unique_id': file_id,
+            'file_name': document['filename'] if isinstance(document, dict) else None,
+            'file_size': document['size'] if isinstance(document, dict) else None,
+        }
+        return message
+
+    async def _api_default(self, method: str, payload: dict):
+        # answerCallbackQuery, deleteWebhook и прочие вызовы без данных
+        return True
+
+
+async def serve(api: FakeBotAPI, host: str, port: int) -> web.AppRunner:
+    """Запускает стенд в текущем цикле событий"""
+    runner = web.AppRunner(api.create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальная замена Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа, мс")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="вызовов в секунду на чат до ответа 429")
+    args = parser.parse_args(argv)
+
+    async def run():
+        api = FakeBotAPI(latency=args.latency / 1000, flood_rate=args.flood_rate)
+        await serve(api, args.host, args.port)
+        print(f"Bot API стенд: http://{args.host}:{args.port}")
+        while True:
+            await asyncio.sleep(10)
+            print(json.dumps(api.calls, ensure_ascii=False))
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""Нагрузочный тест: N менеджеров одновременно заполняют карточку
+
+Скрипт поднимает локальный стенд Bot API (loadtest/fake_api.py), запускает
+main.py отдельным процессом с TELEGRAM_API_URL на стенд и проводит
+виртуальных пользователей через всю анкету Form: катер -> капитан -> часы ->
+календарь -> час/минуты -> гости -> имя -> остаток -> PDF.
+
+Запуск из корня проекта:
+    python -m loadtest.simulate --users 20
+    python -m loadtest.simulate --users 50 --cards 3 --ramp 10 --latency 50
+
+Задержка шага — время от постановки апдейта в getUpdates до ответа бота,
+которым шаг завершается. Задержка анкеты — от /start до получения PDF.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+import itertools
+import subprocess
+import tempfile
+from typing import Callable, NamedTuple
+
+from aiogram_calendar.schemas import SimpleCalendarCallback
+
+from loadtest.fake_api import BOT_USER, FakeBotAPI, Outgoing, serve
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Ответы бота, после которых шаг считается неудачным
+ERROR_MARKERS = ('❌', 'слишком много карточек')
+
+
+class Step(NamedTuple):
+    handler: str  # Обработчик main.py, который отвечает на шаг
+    update: Callable  # (user, boat) -> данные апдейта
+    done: Callable  # (Outgoing) -> True, если это ответ, завершающий шаг
+
+
+def replied(method: str, marker: str = ''):
+    def check(out: Outgoing) -> bool:
+        text = out.payload.get('text') or out.payload.get('caption') or ''
+        return out.method == method and marker in text
+    return check
+
+
+def is_error(out: Outgoing) -> bool:
+    text = out.payload.get('text') or ''
+    return out.method == 'sendMessage' and any(marker in text for marker in ERROR_MARKERS)
+
+
+def booking_date(user) -> str:
+    # У каждой анкеты свой день, чтобы аренды не пересекались по катеру и капитану
+    day = datetime.date.today() + datetime.timedelta(days=1 + user.flow)
+    return SimpleCalendarCallback(act='DAY', year=day.year, month=day.month, day=day.day).pack()
+
+
+FLOW = (
+    Step('start', lambda user, boat: user.message('/start'),
+         replied('sendMessage', 'Выберите катер')),
+    Step('process_boat_selection', lambda user, boat: user.callback(f"boat_select:{boat}"),
+         replied('sendPhoto')),
+    Step('process_boat', lambda user, boat: user.callback(f"boat_{boat}"),
+         replied('sendMessage', 'Выберите капитана')),
+    Step('process_captain_choice', lambda user, boat: user.callback('capt_0'),
+         replied('sendMessage', 'Сколько часов')),
+    Step('process_hours', lambda user, boat: user.message('2'),
+         replied('sendMessage', 'Выберите дату')),
+    Step('process_simple_calendar', lambda user, boat: user.callback(booking_date(user)),
+         replied('sendMessage', 'Выберите час')),
+    Step('process_hour_selection', lambda user, boat: user.callback('hour_12'),
+         replied('editMessageText', 'выберите минуты')),
+    Step('process_minute_selection', lambda user, boat: user.callback('minute_12:30'),
+         replied('editMessageText', 'количество гостей')),
+    Step('process_guests_count', lambda user, boat: user.message('6'),
+         replied('sendMessage', 'имя гостя')),
+    Step('process_client_name', lambda user, boat: user.message('Иван Петров'),
+         replied('sendMessage', 'остаток к оплате')),
+    Step('process_remaining_payment', lambda user, boat: user.message('15000'),
+         replied('sendDocument')),
+)
+
+
+class VirtualUser:
+    """Менеджер, который проходит анкету и ждет ответа бота на каждый шаг"""
+
+    _callback_ids = itertools.count(1)
+    _flows = itertools.count()
+
+    def __init__(self, api: FakeBotAPI, user_id: int):
+        self.api = api
+        self.user_id = user_id
+        self.inbox = api.inbox(user_id)
+        self.last_message_id = None  # Сообщение бота, к которому привязаны кнопки
+        self.flow = None  # Номер текущей анкеты среди всех пользователей
+
+    def start_flow(self):
+        self.flow = next(self._flows)
+
+    def _chat(self) -> dict:
+        return {'id': self.user_id, 'type': 'private'}
+
+    def _from(self) -> dict:
+        return {'id': self.user_id, 'is_bot': False, 'first_name': f"Менеджер {self.user_id}"}
+
+    def message(self, text: str) -> dict:
+        message = {
+            'message_id': self.api.next_message_id(),
+            'date': int(time.time()),
+            'chat': self._chat(),
+            'from': self._from(),
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'message': message}
+
+    def callback(self, data: str) -> dict:
+        return {'callback_query': {
+            'id': str(next(self._callback_ids)),
+            'chat_instance': str(self.user_id),
+            'from': self._from(),
+            'data': data,
+            'message': {
+                'message_id': self.last_message_id or 1,
+                'date': int(time.time()),
+                'chat': self._chat(),
+                'from': BOT_USER,
+                'text': '-',
+            },
+        }}
+
+    async def step(self, step: Step, boat: str, timeout: float) -> float:
+        """Отправляет апдейт шага и ждет завершающего ответа. Возвращает задержку"""
+        started = time.perf_counter()
+        self.api.push_update(step.update(self, boat))
+        deadline = started + timeout
+        while True:
+            out = await asyncio.wait_for(self.inbox.get(), max(deadline - time.perf_counter(), 0))
+            self.last_message_id = out.message_id
+            if step.done(out):
+                return out.received_at - started
+            if is_error(out):
+                raise RuntimeError(out.payload.get('text'))
+
+
+class Stats:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, name: str, seconds: float):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def error(self, name: str):
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def percentile(samples: list, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def run_user(user: VirtualUser, boats: list, args, stats: Stats, delay: float):
+    await asyncio.sleep(delay)
+    for card in range(args.cards):
+        boat = boats[(user.user_id + card) % len(boats)]
+        user.start_flow()
+        flow_started = time.perf_counter()
+        for step in FLOW:
+            try:
+                stats.add(step.handler, await user.step(step, boat, args.timeout))
+            except (asyncio.TimeoutError, RuntimeError):
+                stats.error(step.handler)
+                stats.error('flow')
+                break
+            if args.think:
+                await asyncio.sleep(args.think)
+        else:
+            stats.add('flow', time.perf_counter() - flow_started)
+
+
+async def wait_bot_ready(api: FakeBotAPI, process: subprocess.Popen, timeout: float = 60.0):
+    # Бот готов, когда начал опрашивать getUpdates
+    deadline = time.monotonic() + timeout
+    while not api.calls.get('getUpdates'):
+        if process.poll() is not None:
+            raise RuntimeError(f"main.py завершился с кодом {process.returncode}")
+        if time.monotonic() > deadline:
+            raise RuntimeError("main.py не начал опрос getUpdates")
+        await asyncio.sleep(0.1)
+
+
+def print_report(stats: Stats, elapsed: float, args, api: FakeBotAPI):
+    flows = len(stats.samples.get('flow', []))
+    updates = sum(len(samples) for name, samples in stats.samples.items() if name != 'flow')
+    print(
+        f"\nПользователей: {args.users}, карточек на пользователя: {args.cards}, "
+        f"задержка API: {args.latency:.0f} мс, ответов 429: {api.flood_errors}"
+    )
+    print(
+        f"Время: {elapsed:.1f} с, карточек: {flows} ({flows / elapsed * 60:.1f} в минуту), "
+        f"шагов: {updates} ({updates / elapsed:.1f} в секунду), "
+        f"загружено {api.uploaded_bytes / 1024 / 1024:.1f} МБ\n"
+    )
+    print(f"{'обработчик':<28}{'n':>6}{'ошибок':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    for name in [step.handler for step in FLOW] + ['flow']:
+        samples = stats.samples.get(name, [])
+        errors = stats.errors.get(name, 0)
+        if not samples:
+            print(f"{name:<28}{0:>6}{errors:>8}")
+            continue
+        p50, p95, p99 = (percentile(samples, q) * 1000 for q in (0.5, 0.95, 0.99))
+        print(f"{name:<28}{len(samples):>6}{errors:>8}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+
+
+async def run(args) -> int:
+    from utils.catalog import catalog
+    boats = [name for name in catalog.snapshot.names if catalog.snapshot[name].captains]
+
+    api = FakeBotAPI(latency=args.latency / 1000, flood_rate=args.flood_rate)
+    runner = await serve(api, '127.0.0.1', args.port)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            TELEGRAM_API_URL=f"http://127.0.0.1:{args.port}",
+            BOT_TOKEN='123456:LOADTEST',
+            BOT_MODE='polling',
+            FSM_DB_PATH=os.path.join(tmp, 'fsm.sqlite3'),
+            FILE_ID_CACHE_PATH=os.path.join(tmp, 'file_ids.json'),
+            BOOKINGS_DB_PATH=os.path.join(tmp, 'bookings.sqlite3'),
+        )
+        log = open(args.bot_log, 'w') if args.bot_log else subprocess.DEVNULL
+        process = subprocess.Popen([sys.executable, 'main.py'], cwd=BASE_DIR, env=env, stdout=log, stderr=log)
+        try:
+            await wait_bot_ready(api, process)
+            stats = Stats()
+            users = [VirtualUser(api, 100000 + i) for i in range(args.users)]
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                run_user(user, boats, args, stats, args.ramp * i / args.users)
+                for i, user in enumerate(users)
+            ))
+            elapsed = time.perf_counter() - started
+        finally:
+            process.terminate()
+            # Стенд должен отвечать, пока бот завершает опрос
+            await asyncio.to_thread(process.wait, 30)
+            if log is not subprocess.DEVNULL:
+                log.close()
+            await runner.cleanup()
+
+    print_report(stats, elapsed, args, api)
+    return 1 if stats.errors else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на локальном стенде Bot API")
+    parser.add_argument('--users', type=int, default=10, help="число одновременных менеджеров")
+    parser.add_argument('--cards', type=int, default=1, help="карточек на одного менеджера")
+    parser.add_argument('--ramp', type=float, default=0.0, help="за сколько секунд подключаются все менеджеры")
+    parser.add_argument('--think', type=float, default=0.0, help="пауза менеджера между шагами, с")
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа Bot API, мс")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="вызовов в секунду на чат до ответа 429")
+    parser.add_argument('--timeout', type=float, default=120.0, help="ожидание ответа на шаг, с")
+    parser.add_argument('--port', type=int, default=8081, help="порт стенда Bot API")
+    parser.add_argument('--bot-log', help="куда писать вывод main.py")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
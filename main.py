@@ -1,75 +1,127 @@
 import os
-import json
 import re
+import time
 import logging
 import asyncio
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from io import BytesIO
-from datetime import datetime
-from PIL import Image, ImageDraw
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import Paragraph, Frame
-from reportlab.lib.units import cm
-from reportlab.lib import colors
 from aiogram import Bot, Dispatcher, types, F
 from aiogram_calendar import SimpleCalendar, SimpleCalendarCallback
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import (
     CallbackQuery,
     ReplyKeyboardMarkup,
     KeyboardButton,
     InlineKeyboardMarkup,
     InlineKeyboardButton,
+    InlineQuery,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
     FSInputFile
 )
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram_calendar.schemas import SimpleCalendarCallback
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from dotenv import load_dotenv
+from utils.bookings import BookingConflict, booking_store, captain_key, duration_minutes, to_minutes
+from utils.catalog import catalog
+from utils.coalesce import CardCache, RepeatedCallbackMiddleware, card_key
+from utils.layout import layout_registry
+from utils.pdf_builder import OUTPUT_MODE, QUALITY_NAME, render_card_timed, warm_backgrounds
+from utils.profiler import ProfilerBusy, profiler, slow_render_log
+from utils.preview import PreviewUnavailable, preview_filename, render_preview_timed, warm_previews
+from utils.render_pool import RenderQueueFull, create_render_pool
+from utils.search import BoatSearchIndex
+from utils.file_ids import photo_file_ids
+from utils.markup_cache import CalendarCache, markup_cache
+from utils.outbound import create_outbound_scheduler, create_session
+from utils.sqlite_storage import DB_PATH, SQLiteStorage
+from utils.ttl_storage import TTLStorage
+from utils.webhook import WebhookSettings, run_webhook
+from utils.metrics import (
+    ApiMetricsMiddleware,
+    MetricsMiddleware,
+    observe_outbound,
+    observe_render,
+    observe_render_pool,
+    observe_storage,
+    registry,
+    slow_renders,
+    start_metrics_server,
+)
 
 # Настройка логгирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Путь к директории, где лежит main.py
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-CONFIGS_DIR = os.path.join(BASE_DIR, 'configs')
-PHOTOS_DIR = os.path.join(BASE_DIR, 'photos')
-FONTS_DIR = BASE_DIR
-
-font_path = os.path.join(FONTS_DIR, 'DejaVuSans.ttf')
-bold_font_path = os.path.join(FONTS_DIR, 'DejaVuSans-Bold.ttf')
-
-try:
-    pdfmetrics.registerFont(TTFont('DejaVuSans', font_path))
-    pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', bold_font_path))
-    font_normal = 'DejaVuSans'
-    font_bold = 'DejaVuSans-Bold'
-except Exception as e:
-    print(f"Ошибка загрузки шрифтов: {e}")
-    font_normal = 'Helvetica'
-    font_bold = 'Helvetica-Bold'
-
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_ID"))
 
-# Загрузка данных о катерах
-with open(os.path.join(BASE_DIR, 'configs', 'boats.json'), 'r', encoding='utf-8') as f:
-    BOATS = json.load(f)
+# Свой сервер Bot API (локальный сервер или стенд нагрузочного теста)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+bot = Bot(token=BOT_TOKEN, session=create_session(TELEGRAM_API_URL))
+# Лимиты отправки и повтор после 429; до метрик, чтобы они видели каждую попытку
+outbound = create_outbound_scheduler()
+bot.session.middleware(outbound)
+render_pool = create_render_pool()
+# Картинка-превью карточки: with_pdf — перед PDF, only — вместо PDF, off — без превью
+CARD_PREVIEW = os.getenv("CARD_PREVIEW", "with_pdf")
+# Календари на текущий и следующие месяцы строятся заранее
+calendar_cache = CalendarCache(SimpleCalendar, months=int(os.getenv("CALENDAR_MONTHS_AHEAD", 3)))
+
+# Незавершенные анкеты храним в SQLite, чтобы они переживали перезапуск
+if os.getenv("FSM_STORAGE", "sqlite") == "memory":
+    storage = MemoryStorage()
+else:
+    # Апдейты одного чата могут попасть в разные воркеры вебхука — тогда
+    # каждое изменение пишется сразу, без накопления
+    shared = os.getenv("BOT_MODE", "polling") == "webhook" and int(os.getenv("WEBHOOK_WORKERS", 1)) > 1
+    storage = SQLiteStorage(
+        os.getenv("FSM_DB_PATH", DB_PATH),
+        flush_interval=0 if shared else float(os.getenv("FSM_FLUSH_INTERVAL", 0.2)),
+    )
+
+async def notify_draft_expired(key, state):
+    await bot.send_message(
+        key.chat_id,
+        "⌛ Незавершенная карточка удалена: она долго не заполнялась. Начните заново:",
+        reply_markup=ReplyKeyboardMarkup(
+            keyboard=[[KeyboardButton(text="Новая карточка")]],
+            resize_keyboard=True
+        )
+    )
+
+# Брошенные анкеты удаляются через FSM_TTL секунд после последнего шага (0 — не удалять)
+FSM_TTL = float(os.getenv("FSM_TTL", 24 * 60 * 60))
+if FSM_TTL > 0:
+    storage = TTLStorage(
+        storage,
+        FSM_TTL,
+        on_expire=notify_draft_expired if os.getenv("FSM_TTL_NOTIFY", "1") == "1" else None,
+    )
+# Апдейты одного чата обрабатываются по очереди: двойное нажатие или
+# повторная отправка не пройдут по анкете дважды с одним и тем же состоянием
+dp = Dispatcher(storage=storage, events_isolation=SimpleEventIsolation())
+dp.callback_query.outer_middleware(RepeatedCallbackMiddleware())
+# Недавние карточки по содержимому анкеты: повтор уходит без рендера и загрузки
+card_cache = CardCache(
+    ttl=float(os.getenv("CARD_CACHE_TTL", 600)),
+    max_bytes=int(os.getenv("CARD_CACHE_MB", 64)) * 1024 * 1024,
+)
 
-bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+# Метрики обработчиков, рендера и вызовов Bot API (GET /metrics)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9101))  # 0 — не поднимать сервер метрик
+dp.message.middleware(MetricsMiddleware())
+dp.callback_query.middleware(MetricsMiddleware())
+bot.session.middleware(ApiMetricsMiddleware())
+registry.add_collector(lambda: observe_render_pool(render_pool))
+registry.add_collector(lambda: observe_outbound(outbound))
+if isinstance(storage, TTLStorage):
+    registry.add_collector(lambda: observe_storage(storage))
+metrics_runner = None
 
 class Form(StatesGroup):
     boat = State()         # Выбор лодки (автоматически заполняет pier, captain_name, captain_phone)
@@ -102,7 +154,11 @@ MANAGER_INFO = [
 async def is_admin(user_id: int) -> bool:
     return True #user_id == ADMIN_ID
 
-def get_boat_select_button(boat_name: str) -> InlineKeyboardMarkup:
+def is_owner(user_id: int) -> bool:
+    # Диагностика (профиль, статистика рендера) — только ADMIN_ID, даже пока is_admin открыт всем
+    return user_id == ADMIN_ID
+
+def build_boat_select_button(boat_name: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(
         text=f"✅ Выбрать {boat_name}", 
@@ -115,7 +171,11 @@ def get_boat_select_button(boat_name: str) -> InlineKeyboardMarkup:
     builder.adjust(1)  # Располагаем кнопки вертикально
     return builder.as_markup()
 
-def get_hours_keyboard() -> ReplyKeyboardMarkup:
+def get_boat_select_button(boat_name: str) -> InlineKeyboardMarkup:
+    # Вызывается только для катеров из текущего среза каталога
+    return catalog.snapshot.derived(('boat_select', boat_name), lambda snapshot: build_boat_select_button(boat_name))
+
+def build_hours_keyboard() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     hours = ['1', '1.5', '2', '2.5', '3', '4', '5', '6']
     for hour in hours:
@@ -123,149 +183,97 @@ def get_hours_keyboard() -> ReplyKeyboardMarkup:
     builder.adjust(4, 4)  # 4 кнопки в первом ряду, 4 во втором
     return builder.as_markup(resize_keyboard=True)
 
-def round_corners(image_path, radius=20):
-    """Создает изображение с закругленными углами"""
-    from PIL import Image, ImageDraw
-    from io import BytesIO
-    
-    original = Image.open(image_path).convert("RGBA")
-    width, height = original.size
-    
-    # Создаем маску с закругленными углами
-    mask = Image.new('L', (width, height), 0)
-    draw = ImageDraw.Draw(mask)
-    draw.rounded_rectangle((0, 0, width, height), radius, fill=255)
-    
-    # Применяем маску к изображению
-    result = Image.new('RGBA', (width, height))
-    result.paste(original, (0, 0), mask)
-    
-    # Сохраняем во временный буфер
-    output = BytesIO()
-    result.save(output, format='PNG')
-    output.seek(0)
-    return output
-
-def add_image_to_pdf(canvas, image_path, x, y, width, height, radius=15):
-    """Добавляет изображение на PDF canvas с закругленными углами"""
-    from reportlab.lib.utils import ImageReader
-    
-    try:
-        # Обрабатываем изображение с закругленными углами
-        rounded_img = round_corners(image_path, radius)
-        
-        # Рисуем обработанное изображение
-        img = ImageReader(rounded_img)
-        canvas.drawImage(img, x, y, width=width, height=height, mask='auto')
-        
-    except Exception as e:
-        logger.error(f"Ошибка при добавлении изображения: {e}")
-        # Если возникла ошибка, рисуем обычное изображение
-        img = ImageReader(image_path)
-        canvas.drawImage(img, x, y, width=width, height=height)
-
-def fill_pdf_template(data: dict) -> str:
-    """Заполняет шаблон PDF данными из аренды"""
-    boat_data = BOATS[data['boat']]
-    
-    # Пути к файлам
-    template_path = os.path.join(CONFIGS_DIR, 'form.pdf')
-    boat_image_path = os.path.join(PHOTOS_DIR, boat_data['photo'])
-    output_path = os.path.join(BASE_DIR, 'аренда.pdf')
-    
-    # Создаем временный PDF
-    packet = BytesIO()
-    can = canvas.Canvas(packet, pagesize=A4)
-    
-    # Устанавливаем белый цвет текста
-    can.setFillColor(colors.white)
-    
-    # Устанавливаем шрифт
-    try:
-        can.setFont('DejaVuSans', 12)
-    except:
-        can.setFont('Helvetica', 12)
-    
-    # Добавляем изображение лодки
-    add_image_to_pdf(can, boat_image_path, x=19, y=460, width=558, height=372, radius=30)
-    
-    # Подготавливаем данные для заполнения
-    fields = {
-        'Дата и время': f"{data['date']} в {data['time']}",
-        'Название катера': data['boat'],
-        'Остаток к оплате': f"{data.get('remaining_payment', '0')} руб.",
-        'Продолжительность': f"{data['hours']} ч.",
-        'ФИО гостя': data['client_name'],
-        'Количество гостей': data['guests_count'],
-        'Имя капитана': data['captain_name'],
-        'Телефон капитана': data['captain_phone'],
-        'Причал': data['pier']
-    }
-    
-    # Координаты полей (x, y)
-    coordinates = {
-        'Дата и время': (22, 370),
-        'Название катера': (22, 315),
-        'Остаток к оплате': (22, 260),
-        'Продолжительность': (429, 370),
-        'ФИО гостя': (429, 315),
-        'Количество гостей': (429, 260),
-        'Имя капитана': (208, 315),
-        'Телефон капитана': (208, 260),
-        'Причал': (208, 370)
-    }
-    
-    # Заполняем текстовые поля
-    for field, value in fields.items():
-        if field in coordinates:
-            x, y = coordinates[field]
-            can.drawString(x, y, value)
-    
-    can.save()
-    packet.seek(0)
-    new_pdf = PdfReader(packet)
-    
-    # Объединяем с шаблоном
-    existing_pdf = PdfReader(open(template_path, "rb"))
-    output = PdfWriter()
-    page = existing_pdf.pages[0]
-    page.merge_page(new_pdf.pages[0])
-    output.add_page(page)
-    
-    # Сохраняем результат
-    with open(output_path, "wb") as output_stream:
-        output.write(output_stream)
-    
-    return output_path
-
-def generate_hours_keyboard():
+def get_hours_keyboard() -> ReplyKeyboardMarkup:
+    return markup_cache.get('hours', build_hours_keyboard)
+
+# Катеров на одной странице списка (4 ряда по 3) и в одном ответе инлайн-поиска
+BOATS_PAGE_SIZE = 12
+INLINE_RESULTS_LIMIT = 50
+
+def boats_pages(snapshot) -> int:
+    return max(1, -(-len(snapshot) // BOATS_PAGE_SIZE))
+
+def build_boats_keyboard(snapshot, page: int = 0) -> InlineKeyboardMarkup:
+    """Страница инлайн клавиатуры с катерами по алфавиту, в 3 столбца"""
+    names = snapshot.names[page * BOATS_PAGE_SIZE:(page + 1) * BOATS_PAGE_SIZE]
+    buttons = [
+        [
+            InlineKeyboardButton(text=boat_name, callback_data=f"boat_select:{boat_name}")
+            for boat_name in names[i:i + 3]
+        ]
+        for i in range(0, len(names), 3)
+    ]
+    pages = boats_pages(snapshot)
+    if pages > 1:
+        # Листание по кругу
+        buttons.append([
+            InlineKeyboardButton(text="◀️", callback_data=f"boats_page:{(page - 1) % pages}"),
+            InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=f"boats_page:{page}"),
+            InlineKeyboardButton(text="▶️", callback_data=f"boats_page:{(page + 1) % pages}"),
+        ])
+    buttons.append([
+        InlineKeyboardButton(text="🔍 Поиск катера", switch_inline_query_current_chat="")
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def get_boats_keyboard(page: int = 0) -> InlineKeyboardMarkup:
+    snapshot = catalog.snapshot
+    page = min(max(page, 0), boats_pages(snapshot) - 1)
+    return snapshot.derived(('boats_keyboard', page), lambda snapshot: build_boats_keyboard(snapshot, page))
+
+def get_search_index() -> BoatSearchIndex:
+    # Индекс строится один раз на версию каталога
+    return catalog.snapshot.derived('search_index', BoatSearchIndex)
+
+def build_hours_inline_keyboard(hours: tuple) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    # Добавляем кнопки с часами с 9 утра до 11 вечера
-    for hour in range(0, 24):
+    # Добавляем кнопки с часами, в которые можно начать аренду
+    for hour in hours:
         builder.button(text=f"{hour}", callback_data=f"hour_{hour}")
     builder.adjust(4)  # 4 кнопки в ряд
     return builder.as_markup()
 
-def generate_minutes_keyboard(hour: int):
+def generate_hours_keyboard(free_starts: list = None):
+    hours = tuple(range(0, 24)) if free_starts is None else tuple(sorted({start // 60 for start in free_starts}))
+    return markup_cache.get(('hour', hours), lambda: build_hours_inline_keyboard(hours))
+
+def build_minutes_keyboard(hour: int, minutes: tuple) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     # Добавляем кнопки с минутами
-    for minute in ['00', '15', '30', '45']:
+    for minute in minutes:
         builder.button(text=f"{hour}:{minute}", callback_data=f"minute_{hour}:{minute}")
     builder.adjust(2)  # 2 кнопки в ряд
     return builder.as_markup()
 
+def generate_minutes_keyboard(hour: int, free_starts: list = None):
+    minutes = tuple(
+        minute for minute in ('00', '15', '30', '45')
+        if free_starts is None or hour * 60 + int(minute) in free_starts
+    )
+    return markup_cache.get(('minute', hour, minutes), lambda: build_minutes_keyboard(hour, minutes))
+
+async def get_free_starts(data: dict) -> list:
+    """Свободные времена начала (минуты от полуночи) для катера, капитана, даты и часов из анкеты"""
+    # В потоке, как запись аренды: чтение ждет ту же блокировку хранилища
+    return await asyncio.to_thread(
+        booking_store.free_starts,
+        data['boat'],
+        captain_key(data['captain_name'], data['captain_phone']),
+        data['date'],
+        duration_minutes(data['hours']),
+    )
+
 # Вспомогательные функции должны быть определены ДО их использования
 async def ask_hours(message: types.Message, state: FSMContext):
     """Запрос количества часов аренды"""
     await message.answer("Сколько часов аренды?", reply_markup=get_hours_keyboard())
     await state.set_state(Form.hours)
 
-async def ask_captain_choice(message: types.Message, captains: list):
-    """Запрос выбора капитана с опцией ручного ввода"""
+def build_captains_keyboard(captains: tuple) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for idx, captain in enumerate(captains):
         builder.button(
-            text=f"{captain['name']} ({captain['phone']})",
+            text=f"{captain.name} ({captain.phone})",
             callback_data=f"capt_{idx}"
         )
     # Добавляем кнопку ручного ввода
@@ -279,7 +287,12 @@ async def ask_captain_choice(message: types.Message, captains: list):
         callback_data="cancel_boat_selection"
     )
     builder.adjust(1)
-    await message.answer("👨‍✈️ Выберите капитана:", reply_markup=builder.as_markup())
+    return builder.as_markup()
+
+async def ask_captain_choice(message: types.Message, boat):
+    """Запрос выбора капитана с опцией ручного ввода"""
+    keyboard = catalog.snapshot.derived(('captains', boat.name), lambda snapshot: build_captains_keyboard(boat.captains))
+    await message.answer("👨‍✈️ Выберите капитана:", reply_markup=keyboard)
 
 
 @dp.callback_query(F.data == "custom_captain", Form.captain_choice)
@@ -314,29 +327,8 @@ async def start(message: types.Message):
         await message.answer("⛔ Доступ запрещён")
         return
     
-    # Создаем инлайн клавиатуру с кнопками лодок
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    
-    # Сортируем названия лодок по алфавиту
-    sorted_boat_names = sorted(BOATS.keys())
-    
-    # Создаем кнопки в 3 столбца
-    buttons = []
-    for i in range(0, len(sorted_boat_names), 3):  # Меняем шаг на 3
-        row = []
-        
-        # Добавляем до 3 кнопок в строку
-        for j in range(3):
-            if i + j < len(sorted_boat_names):
-                boat_name = sorted_boat_names[i + j]
-                row.append(InlineKeyboardButton(
-                    text=boat_name,
-                    callback_data=f"boat_select:{boat_name}"
-                ))
-        
-        buttons.append(row)
-    
-    keyboard.inline_keyboard = buttons
+    # Клавиатура с катерами собирается один раз на версию каталога
+    keyboard = get_boats_keyboard()
     
     await message.answer(
         "🚤 Выберите катер:",
@@ -348,29 +340,8 @@ async def cancel_captain_selection(callback: types.CallbackQuery, state: FSMCont
     # Очищаем состояние
     await state.clear()
     
-    # Создаем инлайн клавиатуру с кнопками лодок
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    
-    # Сортируем названия лодок по алфавиту
-    sorted_boat_names = sorted(BOATS.keys())
-    
-    # Создаем кнопки в 3 столбца
-    buttons = []
-    for i in range(0, len(sorted_boat_names), 3):
-        row = []
-        
-        # Добавляем до 3 кнопок в строку
-        for j in range(3):
-            if i + j < len(sorted_boat_names):
-                boat_name = sorted_boat_names[i + j]
-                row.append(InlineKeyboardButton(
-                    text=boat_name,
-                    callback_data=f"boat_select:{boat_name}"
-                ))
-        
-        buttons.append(row)
-    
-    keyboard.inline_keyboard = buttons
+    # Клавиатура с катерами собирается один раз на версию каталога
+    keyboard = get_boats_keyboard()
     
     # Редактируем сообщение с возвратом к выбору катера
     await callback.message.edit_text(
@@ -384,29 +355,8 @@ async def back_to_boats_list(callback: types.CallbackQuery, state: FSMContext):
     # Очищаем состояние
     await state.clear()
     
-    # Создаем инлайн клавиатуру с кнопками лодок
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    
-    # Сортируем названия лодок по алфавиту
-    sorted_boat_names = sorted(BOATS.keys())
-    
-    # Создаем кнопки в 3 столбца
-    buttons = []
-    for i in range(0, len(sorted_boat_names), 3):
-        row = []
-        
-        # Добавляем до 3 кнопок в строку
-        for j in range(3):
-            if i + j < len(sorted_boat_names):
-                boat_name = sorted_boat_names[i + j]
-                row.append(InlineKeyboardButton(
-                    text=boat_name,
-                    callback_data=f"boat_select:{boat_name}"
-                ))
-        
-        buttons.append(row)
-    
-    keyboard.inline_keyboard = buttons
+    # Клавиатура с катерами собирается один раз на версию каталога
+    keyboard = get_boats_keyboard()
     
     # Отправляем новое сообщение со списком катеров
     await callback.message.answer(
@@ -415,43 +365,108 @@ async def back_to_boats_list(callback: types.CallbackQuery, state: FSMContext):
     )
     await callback.answer()
 
-# Обработчик выбора лодки
-@dp.callback_query(lambda c: c.data.startswith("boat_select:"))
-async def process_boat_selection(callback_query: types.CallbackQuery):
-    boat_name = callback_query.data.split(":")[1]
-    
-    if boat_name not in BOATS:
-        await callback_query.answer("Катер не найден")
-        return
-    
-    boat_data = BOATS[boat_name]
-    
+async def send_boat_photo(message: types.Message, photo_path: str, **kwargs):
+    """Отправляет фото катера, по возможности по сохраненному file_id"""
+    file_id = photo_file_ids.get(photo_path)
+    if file_id is not None:
+        try:
+            await message.answer_photo(file_id, **kwargs)
+            return
+        except TelegramBadRequest as e:
+            # file_id больше не действителен — загрузим фото заново
+            logger.warning(f"Не удалось отправить фото по file_id: {e}")
+            photo_file_ids.forget(photo_path)
+
+    sent = await message.answer_photo(FSInputFile(photo_path), **kwargs)
+    photo_file_ids.put(photo_path, sent.photo[-1].file_id)
+
+async def show_boat(message: types.Message, boat):
+    """Фото и описание катера с кнопкой выбора"""
     try:
-        photo_path = os.path.join(PHOTOS_DIR, boat_data['photo'])
-        caption = f"🚤 {boat_name}\n📍 Причал: {boat_data['pier']}"
+        photo_path = boat.photo_path
+        caption = f"🚤 {boat.name}\n📍 Причал: {boat.pier}"
         
         # Добавляем первого капитана в описание
-        if boat_data['captain']:
-            captain = boat_data['captain'][0]
-            caption += f"\n👨‍✈️ Капитан: {captain['name']} ({captain['phone']})"
-            if len(boat_data['captain']) > 1:
+        if boat.captains:
+            captain = boat.captains[0]
+            caption += f"\n👨‍✈️ Капитан: {captain.name} ({captain.phone})"
+            if len(boat.captains) > 1:
                 caption += "\n(Есть выбор капитанов)"
         
-        await callback_query.message.answer_photo(
-            FSInputFile(photo_path),
+        await send_boat_photo(
+            message,
+            photo_path,
             caption=caption,
-            reply_markup=get_boat_select_button(boat_name)
+            reply_markup=get_boat_select_button(boat.name)
         )
         
     except Exception as e:
-        logger.error(f"Ошибка загрузки фото {boat_name}: {e}")
-        await callback_query.message.answer(
-            f"🚤 {boat_name}\n📍 Причал: {boat_data['pier']}",
-            reply_markup=get_boat_select_button(boat_name)
+        logger.error(f"Ошибка загрузки фото {boat.name}: {e}")
+        await message.answer(
+            f"🚤 {boat.name}\n📍 Причал: {boat.pier}",
+            reply_markup=get_boat_select_button(boat.name)
         )
+
+# Обработчик выбора лодки
+@dp.callback_query(lambda c: c.data.startswith("boat_select:"))
+async def process_boat_selection(callback_query: types.CallbackQuery):
+    boat_name = callback_query.data.split(":")[1]
     
+    boat = catalog.snapshot.get(boat_name)
+    if boat is None:
+        await callback_query.answer("Катер не найден")
+        return
+    
+    await show_boat(callback_query.message, boat)
     await callback_query.answer()
 
+@dp.callback_query(F.data.startswith("boats_page:"))
+async def process_boats_page(callback: types.CallbackQuery):
+    page = int(callback.data.removeprefix("boats_page:"))
+    try:
+        await callback.message.edit_reply_markup(reply_markup=get_boats_keyboard(page))
+    except TelegramBadRequest:
+        pass  # Нажата кнопка текущей страницы — менять нечего
+    await callback.answer()
+
+@dp.inline_query()
+async def search_boats(inline_query: InlineQuery):
+    """Инлайн-поиск катера по названию, причалу или капитану"""
+    if not await is_admin(inline_query.from_user.id):
+        await inline_query.answer([], is_personal=True)
+        return
+
+    offset = int(inline_query.offset or 0)
+    snapshot = catalog.snapshot
+    names = get_search_index().search(inline_query.query, limit=offset + INLINE_RESULTS_LIMIT + 1)
+    results = []
+    for boat_name in names[offset:offset + INLINE_RESULTS_LIMIT]:
+        boat = snapshot[boat_name]
+        description = f"📍 {boat.pier}"
+        if boat.captains:
+            description += f" · 👨‍✈️ {', '.join(captain.name for captain in boat.captains)}"
+        results.append(InlineQueryResultArticle(
+            id=str(len(results) + offset),
+            title=boat_name,
+            description=description,
+            # Выбранный результат приходит боту сообщением, см. process_boat_search_result
+            input_message_content=InputTextMessageContent(message_text=f"🚤 {boat_name}"),
+        ))
+    more = len(names) > offset + INLINE_RESULTS_LIMIT
+    await inline_query.answer(
+        results,
+        cache_time=5,
+        is_personal=True,
+        next_offset=str(offset + INLINE_RESULTS_LIMIT) if more else "",
+    )
+
+@dp.message(F.via_bot, F.text.startswith("🚤 "))
+async def process_boat_search_result(message: types.Message):
+    boat = catalog.snapshot.get(message.text.removeprefix("🚤 "))
+    if message.via_bot.id != bot.id or boat is None:
+        return
+    await show_boat(message, boat)
+
 @dp.message(F.text == "Новая карточка")
 async def new_card(message: types.Message):
     await start(message)
@@ -459,35 +474,37 @@ async def new_card(message: types.Message):
 @dp.callback_query(F.data.startswith("boat_"))
 async def process_boat(callback: types.CallbackQuery, state: FSMContext):
     boat_name = callback.data.removeprefix("boat_")
-    boat_data = BOATS[boat_name]
+    boat = catalog.snapshot.get(boat_name)
+    if boat is None:
+        await callback.answer("Катер не найден")
+        return
     
     # Сохраняем основные данные
     await state.update_data(
         boat=boat_name,
-        pier=boat_data['pier']
+        pier=boat.pier
     )
     
     # Обработка капитанов
-    captains = boat_data['captain']
     await state.set_state(Form.captain_choice)
-    await ask_captain_choice(callback.message, captains)
+    await ask_captain_choice(callback.message, boat)
     await callback.answer()
 
 @dp.callback_query(F.data.startswith("capt_"), Form.captain_choice)
 async def process_captain_choice(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    boat_data = BOATS[data['boat']]
+    boat = catalog.snapshot[data['boat']]
     capt_idx = int(callback.data.removeprefix("capt_"))
     
-    captain = boat_data['captain'][capt_idx]
+    captain = boat.captains[capt_idx]
     await state.update_data(
-        captain_name=captain['name'],
-        captain_phone=captain['phone']
+        captain_name=captain.name,
+        captain_phone=captain.phone
     )
     
     await callback.message.edit_text(
-        f"✅ Выбран капитан: {captain['name']}\n"
-        f"📞 Телефон: {captain['phone']}"
+        f"✅ Выбран капитан: {captain.name}\n"
+        f"📞 Телефон: {captain.phone}"
     )
     await ask_hours(callback.message, state)
     await callback.answer()
@@ -497,29 +514,8 @@ async def cancel_boat_selection(callback: types.CallbackQuery, state: FSMContext
     # Очищаем состояние
     await state.clear()
     
-    # Создаем инлайн клавиатуру с кнопками лодок
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    
-    # Сортируем названия лодок по алфавиту
-    sorted_boat_names = sorted(BOATS.keys())
-    
-    # Создаем кнопки в 3 столбца
-    buttons = []
-    for i in range(0, len(sorted_boat_names), 3):
-        row = []
-        
-        # Добавляем до 3 кнопок в строку
-        for j in range(3):
-            if i + j < len(sorted_boat_names):
-                boat_name = sorted_boat_names[i + j]
-                row.append(InlineKeyboardButton(
-                    text=boat_name,
-                    callback_data=f"boat_select:{boat_name}"
-                ))
-        
-        buttons.append(row)
-    
-    keyboard.inline_keyboard = buttons
+    # Клавиатура с катерами собирается один раз на версию каталога
+    keyboard = get_boats_keyboard()
     
     # Редактируем сообщение с возвратом к выбору катера
     await callback.message.edit_text(
@@ -551,18 +547,18 @@ async def process_hours(message: types.Message, state: FSMContext):
     # Запускаем календарь
     await message.answer(
         "📅 Выберите дату аренды:",
-        reply_markup=await SimpleCalendar().start_calendar()
+        reply_markup=await calendar_cache.get()
     )
 
 @dp.message(Form.date)
 async def process_date(message: types.Message, state: FSMContext):
     await message.answer(
         "📅 Выберите дату:",
-        reply_markup=await SimpleCalendar().start_calendar()
+        reply_markup=await calendar_cache.get()
     )
 
 # Добавляем новый обработчик календаря
-@dp.callback_query(SimpleCalendarCallback.filter())
+@dp.callback_query(SimpleCalendarCallback.filter(), Form.date)
 async def process_simple_calendar(
     callback_query: CallbackQuery, 
     callback_data: dict,
@@ -571,23 +567,42 @@ async def process_simple_calendar(
     selected, date = await SimpleCalendar().process_selection(callback_query, callback_data)
     if selected:
         await state.update_data(date=date.strftime("%d.%m.%Y"))
+        free_starts = await get_free_starts(await state.get_data())
+        if not free_starts:
+            await callback_query.message.edit_text(
+                f"⛔ На {date.strftime('%d.%m.%Y')} нет свободного времени для катера и капитана. "
+                "Выберите другую дату:",
+                reply_markup=await calendar_cache.get(date.year, date.month)
+            )
+            return
         await callback_query.message.edit_text(
             f"✅ Выбрана дата: {date.strftime('%d.%m.%Y')}"
         )
         await callback_query.message.answer(
-        "⏰ Выберите час начала аренды:",
-        reply_markup=generate_hours_keyboard()
-    )
-    await state.set_state(Form.time_hour)
+            "⏰ Выберите час начала аренды:",
+            reply_markup=generate_hours_keyboard(free_starts)
+        )
+        await state.set_state(Form.time_hour)
+
+@dp.callback_query(SimpleCalendarCallback.filter())
+async def process_stale_calendar(callback_query: CallbackQuery):
+    # Календарь из завершенной или удаленной анкеты
+    await callback_query.answer("⌛ Этот календарь устарел. Начните новую карточку", show_alert=True)
 
 @dp.callback_query(F.data.startswith("hour_"), Form.time_hour)
 async def process_hour_selection(callback: types.CallbackQuery, state: FSMContext):
     hour = callback.data.split("_")[1]
+    free_starts = await get_free_starts(await state.get_data())
+    if not any(start // 60 == int(hour) for start in free_starts):
+        # Клавиатура устарела: время заняли, пока менеджер выбирал
+        await callback.answer("⛔ Это время уже занято", show_alert=True)
+        await callback.message.edit_reply_markup(reply_markup=generate_hours_keyboard(free_starts))
+        return
     await state.update_data(time_hour=hour)
     await callback.message.edit_text(
         f"Выбран час: {hour}:00\n"
         "Теперь выберите минуты:",
-        reply_markup=generate_minutes_keyboard(int(hour))
+        reply_markup=generate_minutes_keyboard(int(hour), free_starts)
     )
     await state.set_state(Form.time_minute)
 
@@ -595,13 +610,18 @@ async def process_hour_selection(callback: types.CallbackQuery, state: FSMContex
 async def process_minute_selection(callback: types.CallbackQuery, state: FSMContext):
     try:
         time_str = callback.data.split("_")[1]
+        hour, minute = map(int, time_str.split(":"))
+        free_starts = await get_free_starts(await state.get_data())
+        if hour * 60 + minute not in free_starts:
+            await callback.answer("⛔ Это время уже занято", show_alert=True)
+            await callback.message.edit_text(
+                "⏰ Выберите час начала аренды:",
+                reply_markup=generate_hours_keyboard(free_starts)
+            )
+            await state.set_state(Form.time_hour)
+            return
         await state.update_data(time=time_str)
         
-        # Получаем данные из состояния
-        data = await state.get_data()
-        boat_name = data['boat']
-        boat_data = BOATS[boat_name]
-        
         # Показываем подтверждение с автоматическими данными
         await callback.message.edit_text(
             "👥 Введите количество гостей:"
@@ -623,10 +643,6 @@ async def process_guests_count(message: types.Message, state: FSMContext):
     
     await state.update_data(guests_count=message.text)
     
-    # Получаем данные о лодке из состояния
-    data = await state.get_data()
-    boat_data = BOATS[data['boat']]
-    
     # Показываем подтверждение данных капитана
     await message.answer(
         "🙋‍♂️ Введите имя гостя:"
@@ -653,6 +669,37 @@ async def process_remaining_payment(message: types.Message, state: FSMContext):
     
     data = await state.get_data()
     
+    # Занимаем время катера и капитана до генерации карточки
+    start = to_minutes(data['date'], data['time'])
+    slot = (
+        data['boat'],
+        captain_key(data['captain_name'], data['captain_phone']),
+        start,
+        start + duration_minutes(data['hours']),
+    )
+    # Отпечаток анкеты: по нему повторная отправка отличается от чужой аренды того же времени
+    form_key = card_key('form', dict(data, remaining_payment=message.text))
+    repeat = False
+    try:
+        booking_id = await asyncio.to_thread(
+            booking_store.add, *slot,
+            dict(
+                data,
+                remaining_payment=message.text,
+                chat_id=message.chat.id,
+                user_id=message.from_user.id,
+                form_key=form_key,
+            ),
+        )
+    except BookingConflict as e:
+        # Та же анкета того же менеджера (например, отправлена повторно) —
+        # аренда уже наша, карточка найдется в кэше
+        repeat = await is_repeated_booking(e.booking, slot, message.from_user.id, form_key)
+        if not repeat:
+            await offer_other_time(message, state, data, e)
+            return
+        booking_id = e.booking.id
+    
     # Добавляем подтверждение данных
     confirmation_text = (
         "✅ Данные аренды:\n"
@@ -668,19 +715,104 @@ async def process_remaining_payment(message: types.Message, state: FSMContext):
     
     await message.answer(confirmation_text)
     
-    # Генерация PDF
+    # Генерация PDF в пуле, чтобы не блокировать остальных менеджеров
     data['remaining_payment'] = message.text
-    pdf_path = fill_pdf_template(data)
-    
-    with open(pdf_path, 'rb') as pdf_file:
-        await message.answer_document(
-            types.BufferedInputFile(pdf_file.read(), filename="аренда.pdf"),
-            caption="📄 Ваша карточка аренды готова!"
+
+    # Превью рисуется за миллисекунды, поэтому уходит раньше PDF
+    if CARD_PREVIEW != "off" and await send_card_preview(message, data) and CARD_PREVIEW == "only":
+        await state.clear()
+        await offer_new_card(message)
+        return
+
+    async def notify_queued(position: int):
+        await message.answer(f"⏳ Карточка в очереди на генерацию, позиция: {position}")
+
+    try:
+        card = await get_card('pdf', data, render_card_timed, on_queued=notify_queued)
+    except RenderQueueFull:
+        # Аренда будет сохранена заново, когда менеджер повторит сумму
+        if not repeat:
+            await asyncio.to_thread(booking_store.remove, booking_id)
+        await message.answer(
+            "⏳ Сейчас генерируется слишком много карточек. "
+            "Отправьте сумму еще раз через минуту."
         )
+        return
     
-    os.remove(pdf_path)
-    await state.clear()
+    sent = await message.answer_document(
+        card.file_id or types.BufferedInputFile(card.data, filename="аренда.pdf"),
+        caption="📄 Ваша карточка аренды готова!"
+    )
+    card_cache.remember_file_id(card, sent.document.file_id if sent.document else None)
     
+    await state.clear()
+    await offer_new_card(message)
+
+async def is_repeated_booking(booking, slot: tuple, user_id: int, form_key: str) -> bool:
+    """Аренда, помешавшая сохранить slot, — та же анкета того же менеджера
+
+    В группе у каждого менеджера своя анкета, поэтому одного чата мало:
+    сверяются автор и содержимое анкеты.
+    """
+    if tuple(booking[1:]) != slot:
+        return False
+    stored = await asyncio.to_thread(booking_store.data, booking.id)
+    return stored.get('user_id') == user_id and stored.get('form_key') == form_key
+
+async def offer_other_time(message: types.Message, state: FSMContext, data: dict, e: BookingConflict):
+    busy = "Катер" if e.by == 'boat' else "Капитан"
+    free_starts = await get_free_starts(data)
+    if free_starts:
+        await message.answer(
+            f"❌ {busy} уже занят в это время. Выберите другое время начала:",
+            reply_markup=generate_hours_keyboard(free_starts)
+        )
+        await state.set_state(Form.time_hour)
+    else:
+        await message.answer(
+            f"❌ {busy} уже занят в этот день. Выберите другую дату:",
+            reply_markup=await calendar_cache.get()
+        )
+        await state.set_state(Form.date)
+
+def card_version() -> tuple:
+    """Настройки, от которых зависит вид карточки при тех же данных анкеты"""
+    return (QUALITY_NAME, OUTPUT_MODE, preview_filename(), layout_registry.snapshot.version, catalog.snapshot.version)
+
+async def get_card(kind: str, data: dict, render, **kwargs):
+    """Карточка из кэша по содержимому анкеты или рендер в пуле — один на одинаковые запросы"""
+    async def run():
+        started = time.perf_counter()
+        result, timings = await render_pool.run(render, data, **kwargs)
+        observe_render(timings)
+        # Медленный рендер записываем с разбором по этапам
+        if slow_render_log.record(kind, data, timings, time.perf_counter() - started, render_pool.stats()):
+            slow_renders.inc(kind=kind)
+        return result
+    return await card_cache.get(card_key(kind, data, card_version()), run)
+
+async def send_card_preview(message: types.Message, data: dict) -> bool:
+    """Отправляет превью карточки картинкой; False, если превью не получилось"""
+    try:
+        card = await get_card('preview', data, render_preview_timed)
+    except RenderQueueFull:
+        # Очередь занята — менеджер получит хотя бы PDF, когда до него дойдет
+        return False
+    except PreviewUnavailable as e:
+        logger.warning(f"Превью карточки недоступно: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Ошибка рендера превью: {e}")
+        return False
+
+    sent = await message.answer_photo(
+        card.file_id or types.BufferedInputFile(card.data, filename=preview_filename()),
+        caption="🖼 Превью карточки аренды"
+    )
+    card_cache.remember_file_id(card, sent.photo[-1].file_id if sent.photo else None)
+    return True
+
+async def offer_new_card(message: types.Message):
     # Предлагаем создать новую карточку
     await message.answer(
         "Создать новую карточку:",
@@ -690,8 +822,130 @@ async def process_remaining_payment(message: types.Message, state: FSMContext):
         )
     )
 
+@dp.message(Command("render_stats"))
+async def render_stats(message: types.Message):
+    if not is_owner(message.from_user.id):
+        await message.answer("⛔ Доступ запрещён")
+        return
+
+    stats = render_pool.stats()
+    cache = card_cache.stats()
+    await message.answer(
+        "📊 Генерация карточек:\n"
+        f"Пул: {stats['kind']}, воркеров {stats['workers']}\n"
+        f"В работе: {stats['active']}, в очереди: {stats['queued']}/{stats['max_queue']}\n"
+        f"Готово: {stats['jobs']}, среднее {stats['avg_time']:.2f} с, максимум {stats['max_time']:.2f} с\n"
+        f"Кэш карточек: {cache['entries']} шт., {cache['bytes'] / 2**20:.1f} МБ; "
+        f"из кэша {cache['hits']}, к идущему рендеру {cache['coalesced']}, отрисовано {cache['misses']}\n"
+        f"Медленных (дольше {slow_render_log.threshold * 1000:.0f} мс): {slow_render_log.count}"
+    )
+
+@dp.message(Command("slow_renders"))
+async def slow_renders_command(message: types.Message):
+    if not is_owner(message.from_user.id):
+        await message.answer("⛔ Доступ запрещён")
+        return
+
+    entries = list(slow_render_log.recent)[-5:]
+    if not entries:
+        await message.answer(f"🐢 Медленных рендеров (дольше {slow_render_log.threshold * 1000:.0f} мс) не было")
+        return
+    lines = [f"🐢 Последние медленные рендеры, всего {slow_render_log.count}:"]
+    for entry in reversed(entries):
+        stages = ', '.join(f"{stage} {ms:.0f}" for stage, ms in entry['stages_ms'].items())
+        lines.append(
+            f"{entry['at']} {entry['kind']} {entry['boat']}: {entry['total_ms']:.0f} мс, "
+            f"очередь {entry['queue_ms']:.0f} мс\n  этапы (мс): {stages}"
+        )
+    await message.answer("\n".join(lines))
+
+# Профиль не дольше PROFILE_MAX_SECONDS; задачи держим, чтобы их не собрал GC
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", 300))
+profile_tasks = set()
+
+@dp.message(Command("profile"))
+async def profile_command(message: types.Message):
+    if not is_owner(message.from_user.id):
+        await message.answer("⛔ Доступ запрещён")
+        return
+
+    args = message.text.split()[1:]
+    if args and not args[0].isdigit():
+        await message.answer("❌ Укажите длительность в секундах, например: /profile 30")
+        return
+    seconds = min(int(args[0]) if args else 30, PROFILE_MAX_SECONDS) or 1
+    if profiler.running:
+        await message.answer("⏳ Профиль уже снимается, дождитесь результата")
+        return
+
+    await message.answer(f"🔬 Снимаю профиль {seconds} с...")
+    # Снимаем в фоне: иначе апдейты этого чата ждали бы конца профиля
+    task = asyncio.create_task(send_profile(message, seconds))
+    profile_tasks.add(task)
+    task.add_done_callback(profile_tasks.discard)
+
+async def send_profile(message: types.Message, seconds: int):
+    try:
+        profile = await profiler.profile(seconds)
+    except ProfilerBusy:
+        await message.answer("⏳ Профиль уже снимается, дождитесь результата")
+        return
+    except Exception as e:
+        logger.error(f"Ошибка снятия профиля: {e}")
+        await message.answer("❌ Не удалось снять профиль")
+        return
+
+    top = "\n".join(f"{share:.0%} {name[:80]}" for name, share in profile.top(5))
+    caption = (
+        f"🔬 Профиль за {profile.duration:.0f} с: сэмплов {profile.samples} "
+        f"(раз в {profile.interval * 1000:.0f} мс), затраты {profile.overhead:.1%}\n"
+        f"Свернутые стеки для flamegraph.pl или speedscope.app\n"
+        f"Больше всего собственного времени:\n{top or 'потоки простаивали'}"
+    )
+    if render_pool.kind == 'process':
+        caption += "\nРендер идет в пуле процессов и в профиль не попал"
+    filename = time.strftime("profile-%Y%m%d-%H%M%S.folded", time.localtime(profile.started))
+    await message.answer_document(
+        types.BufferedInputFile(profile.collapsed().encode('utf-8'), filename=filename),
+        caption=caption[:1024]
+    )
+
+@dp.startup()
+async def on_startup():
+    global metrics_runner
+    # Собираем фоны карточек в фоне, не задерживая запуск бота
+    asyncio.get_running_loop().run_in_executor(None, warm_backgrounds)
+    if CARD_PREVIEW != "off":
+        asyncio.get_running_loop().run_in_executor(None, warm_previews)
+    await calendar_cache.warm()
+    if isinstance(storage, TTLStorage):
+        # Анкеты, брошенные до перезапуска, тоже удаляются по сроку
+        restored = await storage.restore()
+        if restored:
+            logger.info(f"Незавершенных анкет после перезапуска: {restored}")
+
+    if METRICS_PORT:
+        # Воркеры вебхука слушают метрики на соседних портах
+        port = METRICS_PORT + int(os.getenv("WEBHOOK_WORKER_INDEX", 0))
+        try:
+            metrics_runner = await start_metrics_server(METRICS_HOST, port)
+        except OSError as e:
+            logger.error(f"Не удалось запустить сервер метрик на порту {port}: {e}")
+
+@dp.shutdown()
+async def on_shutdown():
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+    await storage.close()
+    booking_store.close()
+    render_pool.shutdown()
+
 async def main():
     await dp.start_polling(bot)
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    # Режим работы: long polling (по умолчанию) или вебхук
+    if os.getenv("BOT_MODE", "polling") == "webhook":
+        run_webhook(dp, bot, WebhookSettings.from_env())
+    else:
+        asyncio.run(main())
\ No newline at end of file
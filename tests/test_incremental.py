@@ -0,0 +1,38 @@
+"""Режим incremental: карточка совпадает с обычным рендером (rewrite)
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+
+Полная проверка по всем катерам — python -m benchmarks.check_incremental.
+"""
+import pytest
+
+from benchmarks.bench_render import sample_data
+from benchmarks.check_incremental import extract_text, rasterize
+from utils import pdf_builder
+from utils.catalog import catalog
+from utils.layout import layout_registry
+
+BOATS = [name for name in catalog.snapshot.names if catalog.snapshot[name].captains][:2]
+
+
+@pytest.fixture(scope='module')
+def template() -> bytes:
+    with open(layout_registry.plan().template_path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('boat', BOATS)
+def test_incremental_matches_rewrite(boat, template):
+    data = sample_data(catalog.snapshot[boat])
+    rewrite = pdf_builder.render_card(data, mode='rewrite')
+    incremental = pdf_builder.render_card(data, mode='incremental')
+
+    # Шаблон не переписывается, а только дополняется
+    assert incremental.startswith(template)
+    assert extract_text(incremental) == extract_text(rewrite)
+    try:
+        import pymupdf  # noqa: F401
+    except ImportError:
+        return
+    assert rasterize(incremental, 100) == rasterize(rewrite, 100)
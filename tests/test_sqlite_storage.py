@@ -0,0 +1,156 @@
+"""SQLiteStorage: запись из нескольких процессов и вся анкета Form с перезапуском бота
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+import os
+import sys
+import socket
+import asyncio
+import sqlite3
+import subprocess
+
+from aiogram.fsm.storage.base import StorageKey
+
+from loadtest.fake_api import FakeBotAPI, serve
+from loadtest.simulate import BASE_DIR, FLOW, VirtualUser, wait_bot_ready
+from utils.sqlite_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=555001, user_id=555001)
+
+
+def rows(path: str) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT key, state, data FROM fsm").fetchall()
+    finally:
+        conn.close()
+
+
+def test_state_and_data_from_two_storages_do_not_overwrite(tmp_path):
+    path = str(tmp_path / 'fsm.sqlite3')
+
+    async def run():
+        # Как два воркера на одном файле: у каждого свои незаписанные изменения
+        first = SQLiteStorage(path, flush_interval=60)
+        second = SQLiteStorage(path, flush_interval=60)
+        await first.set_state(KEY, 'Form:hours')
+        await first.set_data(KEY, {'boat': 'Beluga'})
+        await second.set_data(KEY, {'boat': 'Beluga', 'hours': '2'})
+        await first.flush()
+        await second.flush()
+        await first.close()
+        await second.close()
+
+        fresh = SQLiteStorage(path)
+        try:
+            return await fresh.get_state(KEY), await fresh.get_data(KEY)
+        finally:
+            await fresh.close()
+
+    state, data = asyncio.run(run())
+    assert state == 'Form:hours'
+    assert data == {'boat': 'Beluga', 'hours': '2'}
+
+
+def test_write_through_is_visible_to_other_storage(tmp_path):
+    path = str(tmp_path / 'fsm.sqlite3')
+
+    async def run():
+        writer = SQLiteStorage(path, flush_interval=0)
+        reader = SQLiteStorage(path)
+        try:
+            await writer.set_state(KEY, 'Form:date')
+            await writer.set_data(KEY, {'hours': '3'})
+            return await reader.get_state(KEY), await reader.get_data(KEY)
+        finally:
+            await writer.close()
+            await reader.close()
+
+    assert asyncio.run(run()) == ('Form:date', {'hours': '3'})
+
+
+def test_cleared_record_is_deleted(tmp_path):
+    path = str(tmp_path / 'fsm.sqlite3')
+
+    async def run():
+        storage = SQLiteStorage(path, flush_interval=0)
+        await storage.set_state(KEY, 'Form:hours')
+        await storage.set_data(KEY, {'hours': '2'})
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        await storage.close()
+
+    asyncio.run(run())
+    assert rows(path) == []
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_form_flow_survives_restart(tmp_path):
+    """main.py против стенда Bot API: половина анкеты, перезапуск, вторая половина"""
+    from utils.catalog import catalog
+    boat = next(name for name in catalog.snapshot.names if catalog.snapshot[name].captains)
+    port = free_port()
+    db_path = str(tmp_path / 'fsm.sqlite3')
+    env = dict(
+        os.environ,
+        TELEGRAM_API_URL=f"http://127.0.0.1:{port}",
+        BOT_TOKEN='123456:SQLITE',
+        BOT_MODE='polling',
+        METRICS_PORT='0',
+        FSM_STORAGE='sqlite',
+        FSM_DB_PATH=db_path,
+        FILE_ID_CACHE_PATH=str(tmp_path / 'file_ids.json'),
+        BOOKINGS_DB_PATH=str(tmp_path / 'bookings.sqlite3'),
+    )
+    middle = [step.handler for step in FLOW].index('process_guests_count')
+
+    async def start_bot(api):
+        api.calls.pop('getUpdates', None)
+        process = subprocess.Popen(
+            [sys.executable, 'main.py'], cwd=BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        await wait_bot_ready(api, process)
+        return process
+
+    async def stop_bot(process):
+        process.terminate()
+        await asyncio.to_thread(process.wait, 30)
+
+    async def run():
+        api = FakeBotAPI()
+        runner = await serve(api, '127.0.0.1', port)
+        user = VirtualUser(api, 555001)
+        user.start_flow()
+        try:
+            process = await start_bot(api)
+            try:
+                for step in FLOW[:middle]:
+                    await user.step(step, boat, 30)
+            finally:
+                await stop_bot(process)
+            saved = rows(db_path)
+
+            # Обработанные апдейты новый процесс получать не должен
+            api.updates.clear()
+            process = await start_bot(api)
+            try:
+                for step in FLOW[middle:]:
+                    await user.step(step, boat, 30)
+            finally:
+                await stop_bot(process)
+            return saved
+        finally:
+            await runner.cleanup()
+
+    saved = asyncio.run(run())
+    assert [state for _key, state, _data in saved] == ['Form:guests_count']
+    assert '"boat"' in saved[0][2]
+    # Завершенная анкета очищена
+    assert rows(db_path) == []
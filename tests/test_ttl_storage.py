@@ -0,0 +1,93 @@
+"""TTLStorage поверх SQLiteStorage: анкеты, брошенные до перезапуска, удаляются по сроку
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+import time
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from utils.sqlite_storage import SQLiteStorage
+from utils.ttl_storage import TTLStorage
+
+KEY = StorageKey(bot_id=1, chat_id=555001, user_id=555001)
+FRESH_KEY = StorageKey(bot_id=1, chat_id=555002, user_id=555002)
+
+
+def test_restored_drafts_expire_by_updated_at(tmp_path):
+    path = str(tmp_path / 'fsm.sqlite3')
+
+    async def run():
+        # Процесс до перезапуска: анкета брошена на середине
+        before = SQLiteStorage(path, flush_interval=0)
+        await before.set_state(KEY, 'Form:guests_count')
+        await before.set_data(KEY, {'boat': 'Beluga', 'hours': '2'})
+        await before.close()
+        await asyncio.sleep(0.3)
+
+        expired = []
+
+        async def on_expire(key, state):
+            expired.append((key, state, time.monotonic()))
+
+        storage = TTLStorage(SQLiteStorage(path, flush_interval=0), 0.5, on_expire=on_expire, check_interval=0.05)
+        restored = await storage.restore()
+        stats = storage.stats()
+        started = time.monotonic()
+        await storage.set_state(FRESH_KEY, 'Form:hours')
+        while not expired:
+            await asyncio.sleep(0.02)
+        left = await storage.get_state(KEY)
+        fresh = await storage.get_state(FRESH_KEY)
+        await storage.close()
+        return restored, stats, expired, expired[0][2] - started, left, fresh
+
+    restored, stats, expired, waited, left, fresh = asyncio.run(run())
+    assert restored == 1
+    assert stats['entries'] == 1 and stats['bytes'] > 0
+    assert [(key, state) for key, state, _ in expired] == [(KEY, 'Form:guests_count')]
+    # Срок отсчитан от записи в базе (0.3 с назад), а не от запуска
+    assert waited < 0.45
+    assert left is None
+    assert fresh == 'Form:hours'
+
+
+def test_shared_file_expires_once_and_keeps_drafts_active_elsewhere(tmp_path):
+    """Два воркера на одном файле подхватывают одни анкеты"""
+    path = str(tmp_path / 'fsm.sqlite3')
+
+    async def run():
+        before = SQLiteStorage(path, flush_interval=0)
+        await before.set_state(KEY, 'Form:guests_count')
+        await before.set_state(FRESH_KEY, 'Form:hours')
+        await before.close()
+        await asyncio.sleep(0.8)
+
+        expired = []
+
+        def collect(worker):
+            async def on_expire(key, state):
+                expired.append((worker, key))
+            return on_expire
+
+        workers = [
+            TTLStorage(SQLiteStorage(path, flush_interval=0), 1.0, on_expire=collect(name), check_interval=0.05)
+            for name in ('a', 'b')
+        ]
+        for worker in workers:
+            assert await worker.restore() == 2
+        # Менеджер продолжает анкету FRESH_KEY через второй воркер
+        await workers[1].set_data(FRESH_KEY, {'hours': '2'})
+        await asyncio.sleep(0.6)
+
+        reader = SQLiteStorage(path)
+        states = await reader.get_state(KEY), await reader.get_state(FRESH_KEY)
+        await reader.close()
+        for worker in workers:
+            await worker.close()
+        return expired, states
+
+    expired, states = asyncio.run(run())
+    assert [key for _worker, key in expired] == [KEY]
+    assert states == (None, 'Form:hours')
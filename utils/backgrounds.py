@@ -0,0 +1,175 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from PyPDF2 import PdfReader, PageObject
+from PyPDF2.generic import ArrayObject, ContentStream, DictionaryObject, NameObject
+
+from utils.template_registry import copy_page, preload_objects
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'backgrounds')
+
+
+class BackgroundCache:
+    """Кэш готовых фонов карточек: шаблон + фото катера
+
+    Фон строится один раз на катер и пересобирается, когда меняется
+    шаблон или фото. Хранится разобранным в памяти и как PDF на диске.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=64):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (version, page)
+        self._blobs = OrderedDict()  # key -> (version, bytes)
+        self._lock = threading.Lock()
+
+    def _disk_path(self, key, version, tag):
+        digest = hashlib.sha1(f"{key}|{version}|{tag}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.pdf")
+
+    @staticmethod
+    def _version(template_path, photo_path):
+        key = (os.path.abspath(template_path), os.path.abspath(photo_path))
+        return key, (os.stat(key[0]).st_mtime_ns, os.stat(key[1]).st_mtime_ns)
+
+    def _lookup(self, entries, key, version):
+        with self._lock:
+            entry = entries.get(key)
+            if entry is not None and entry[0] == version:
+                entries.move_to_end(key)
+                return entry[1]
+        return None
+
+    def _remember(self, entries, key, version, value):
+        with self._lock:
+            entries[key] = (version, value)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def _read(self, key, version, tag, build) -> bytes:
+        disk_path = self._disk_path(key, version, tag)
+        try:
+            with open(disk_path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            data = build(*key)
+            self._write_disk(disk_path, data)
+            logger.info(f"Фон карточки собран: {os.path.basename(key[1])}")
+            return data
+
+    def get_page(self, template_path, photo_path, build, tag='') -> PageObject:
+        """Возвращает собственную копию страницы фона для одного рендера
+
+        build(template_path, photo_path) -> bytes собирает фон при промахе,
+        tag описывает параметры сборки (например, геометрию фото).
+        """
+        key, version = self._version(template_path, photo_path)
+        page = self._lookup(self._entries, key, (version, tag))
+        if page is None:
+            page = PdfReader(BytesIO(self._read(key, version, tag, build))).pages[0]
+            preload_objects(page.indirect_reference)
+            self._remember(self._entries, key, (version, tag), page)
+        return copy_page(page)
+
+    def get_bytes(self, template_path, photo_path, build, tag='') -> bytes:
+        """Возвращает фон как готовый PDF в байтах, без разбора"""
+        key, version = self._version(template_path, photo_path)
+        data = self._lookup(self._blobs, key, (version, tag))
+        if data is None:
+            data = self._read(key, version, tag, build)
+            self._remember(self._blobs, key, (version, tag), data)
+        return data
+
+    def _write_disk(self, disk_path, data):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{disk_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, disk_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить фон в кэш: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._blobs.clear()
+
+
+def merge_resources(resources, overlay_resources) -> tuple:
+    """Объединяет ресурсы страницы и слоя, не меняя исходные словари
+
+    Возвращает (новые ресурсы, {старое имя: новое имя}) для ресурсов слоя,
+    чьи имена уже заняты на странице.
+    """
+    resources = DictionaryObject(resources)
+    rename = {}
+
+    for category, entries in overlay_resources.items():
+        entries = entries.get_object()
+        if category == '/ProcSet':
+            merged = set(resources.get(category, ArrayObject()).get_object()) | set(entries)
+            resources[NameObject(category)] = ArrayObject(sorted(merged))
+            continue
+
+        merged = DictionaryObject(resources.get(category, DictionaryObject()).get_object())
+        for name in entries:
+            new_name = name
+            while new_name in merged:
+                new_name = NameObject(f"{new_name}_t")
+            if new_name != name:
+                rename[name] = new_name
+            merged[NameObject(new_name)] = entries.raw_get(name)
+        resources[NameObject(category)] = merged
+    return resources, rename
+
+
+def overlay_content(overlay: PageObject, rename: dict) -> ContentStream:
+    """Поток содержимого слоя с переименованными ресурсами"""
+    content = ContentStream(overlay.get_contents(), overlay.pdf)
+    if rename:
+        for operands, _operator in content.operations:
+            if not isinstance(operands, list):
+                continue
+            for i, operand in enumerate(operands):
+                if isinstance(operand, NameObject) and operand in rename:
+                    operands[i] = rename[operand]
+    return content
+
+
+def merge_overlay(page: PageObject, overlay: PageObject):
+    """Накладывает небольшой слой (текст) поверх страницы фона
+
+    В отличие от merge_page не разбирает содержимое фона: его поток
+    остается как есть, слой добавляется отдельным потоком в /Contents.
+    Конфликтующие имена ресурсов слоя переименовываются.
+    """
+    resources, rename = merge_resources(
+        page['/Resources'].get_object(), overlay['/Resources'].get_object()
+    )
+    content = overlay_content(overlay, rename)
+
+    # Без indirect_reference PdfWriter не сможет вынести поток из массива
+    # в отдельный объект при клонировании страницы
+    content.indirect_reference = None
+
+    contents = page.raw_get('/Contents')
+    if isinstance(contents.get_object(), ArrayObject):
+        contents = ArrayObject(contents.get_object())
+    else:
+        contents = ArrayObject([contents])
+    contents.append(content)
+
+    page[NameObject('/Contents')] = contents
+    page[NameObject('/Resources')] = resources
+
+
+background_cache = BackgroundCache()
@@ -0,0 +1,184 @@
+import os
+import re
+import json
+import time
+import logging
+import sqlite3
+import datetime
+import threading
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(BASE_DIR, 'data', 'bookings.sqlite3')
+
+# Время аренды хранится в минутах от EPOCH (местное время, без часового пояса)
+EPOCH = datetime.datetime(2000, 1, 1)
+# Шаг времени начала в клавиатурах, минуты
+SLOT = 15
+# Самая длинная возможная аренда: ограничивает просмотр индекса назад
+MAX_DURATION = 24 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY,
+    boat TEXT NOT NULL,
+    captain TEXT NOT NULL,
+    starts_at INTEGER NOT NULL,
+    ends_at INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bookings_boat ON bookings (boat, starts_at);
+CREATE INDEX IF NOT EXISTS bookings_captain ON bookings (captain, starts_at);
+"""
+
+
+class Booking(NamedTuple):
+    id: int
+    boat: str
+    captain: str
+    start: int  # минуты от EPOCH
+    end: int
+
+
+class BookingConflict(Exception):
+    """Время пересекается с другой арендой того же катера или капитана"""
+
+    def __init__(self, booking: Booking, by: str):
+        super().__init__(f"Пересечение с арендой #{booking.id} ({by})")
+        self.booking = booking
+        self.by = by  # 'boat' или 'captain'
+
+
+def to_minutes(date: str, time_str: str = '00:00') -> int:
+    """Минуты от EPOCH для даты ДД.ММ.ГГГГ и времени ЧЧ:ММ"""
+    moment = datetime.datetime.strptime(f"{date} {time_str}", "%d.%m.%Y %H:%M")
+    return (moment - EPOCH) // datetime.timedelta(minutes=1)
+
+
+def format_minutes(minutes: int) -> str:
+    return (EPOCH + datetime.timedelta(minutes=minutes)).strftime("%d.%m.%Y %H:%M")
+
+
+def duration_minutes(hours: str) -> int:
+    """Продолжительность аренды ('1.5' часа) в минутах"""
+    return round(float(hours) * 60)
+
+
+def captain_key(name: str, phone: str) -> str:
+    """Капитан определяется по последним 10 цифрам телефона, без него — по имени"""
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-10:] if digits else (name or '').strip().lower()
+
+
+class BookingStore:
+    """Аренды в SQLite с интервальными индексами по катеру и по капитану
+
+    Аренды одного катера и одного капитана не пересекаются. Пересечения
+    ищутся по индексам (катер, начало) и (капитан, начало), просматриваются
+    только аренды, начавшиеся не раньше чем за MAX_DURATION до отрезка,
+    поэтому проверка не замедляется по мере накопления аренд за сезон.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._pid = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Соединение открывается в каждом процессе заново (fork воркеров вебхука)
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _overlapping(self, column: str, key: str, start: int, end: int) -> list:
+        rows = self._connection().execute(
+            f"SELECT id, boat, captain, starts_at, ends_at FROM bookings "
+            f"WHERE {column} = ? AND starts_at > ? AND starts_at < ? AND ends_at > ? "
+            f"ORDER BY starts_at",
+            (key, start - MAX_DURATION, end, start),
+        ).fetchall()
+        return [Booking(*row) for row in rows]
+
+    def overlapping(self, boat: str, captain: str, start: int, end: int) -> list:
+        """Аренды катера или капитана, пересекающие отрезок [start, end)"""
+        with self._lock:
+            return self._overlapping('boat', boat, start, end) + self._overlapping('captain', captain, start, end)
+
+    def add(self, boat: str, captain: str, start: int, end: int, data: dict = None) -> int:
+        """Сохраняет аренду и возвращает ее номер; при пересечении — BookingConflict
+
+        Проверка и запись идут в одной транзакции, поэтому два процесса не
+        могут занять одно время.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for column, key in (('boat', boat), ('captain', captain)):
+                    existing = self._overlapping(column, key, start, end)
+                    if existing:
+                        raise BookingConflict(existing[0], column)
+                cursor = conn.execute(
+                    "INSERT INTO bookings (boat, captain, starts_at, ends_at, data, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (boat, captain, start, end, json.dumps(data or {}, ensure_ascii=False), time.time()),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        logger.info(f"Аренда #{cursor.lastrowid}: {boat}, {format_minutes(start)} - {format_minutes(end)}")
+        return cursor.lastrowid
+
+    def data(self, booking_id: int) -> dict:
+        """Данные анкеты, сохраненные вместе с арендой"""
+        with self._lock:
+            row = self._connection().execute("SELECT data FROM bookings WHERE id = ?", (booking_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def remove(self, booking_id: int):
+        with self._lock:
+            self._connection().execute("DELETE FROM bookings WHERE id = ?", (booking_id,))
+
+    def free_starts(self, boat: str, captain: str, date: str, duration: int) -> list:
+        """Свободные времена начала (минуты от полуночи, шаг SLOT) на дату ДД.ММ.ГГГГ
+
+        Аренда продолжительностью duration минут не должна пересекаться с
+        арендами катера и капитана, в том числе переходящими через полночь.
+        """
+        day = to_minutes(date)
+        # Аренды катера и капитана, объединенные в непересекающиеся отрезки
+        busy = []
+        for booking in sorted(self.overlapping(boat, captain, day, day + 24 * 60 + duration), key=lambda b: b.start):
+            if busy and booking.start <= busy[-1][1]:
+                busy[-1][1] = max(busy[-1][1], booking.end)
+            else:
+                busy.append([booking.start, booking.end])
+
+        free = []
+        index = 0
+        for offset in range(0, 24 * 60, SLOT):
+            start, end = day + offset, day + offset + duration
+            # Занятые отрезки, закончившиеся до start, дальше не нужны
+            while index < len(busy) and busy[index][1] <= start:
+                index += 1
+            if index == len(busy) or busy[index][0] >= end:
+                free.append(offset)
+        return free
+
+    def close(self):
+        if self._pid == os.getpid():
+            self._conn.close()
+            self._pid = None
+
+
+booking_store = BookingStore(os.getenv('BOOKINGS_DB_PATH', DB_PATH))
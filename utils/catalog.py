@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOATS_PATH = os.path.join(BASE_DIR, 'configs', 'boats.json')
+PHOTOS_DIR = os.path.join(BASE_DIR, 'photos')
+
+
+class Captain(NamedTuple):
+    name: str
+    phone: str
+
+
+class Boat(NamedTuple):
+    name: str
+    photo: str
+    photo_path: str
+    pier: str
+    captains: tuple
+
+
+class CatalogSnapshot:
+    """Неизменяемый срез каталога катеров с готовыми индексами"""
+
+    def __init__(self, boats: dict, mtime_ns: int, version: int):
+        self.boats = boats
+        self.mtime_ns = mtime_ns
+        self.version = version
+        self.names = tuple(sorted(boats))
+
+        by_pier = {}
+        by_captain = {}
+        for name in self.names:
+            boat = boats[name]
+            by_pier.setdefault(boat.pier, []).append(name)
+            for captain in boat.captains:
+                by_captain.setdefault(captain.name, []).append(name)
+        self.by_pier = {pier: tuple(names) for pier, names in by_pier.items()}
+        self.by_captain = {captain: tuple(names) for captain, names in by_captain.items()}
+
+        self._derived = {}
+
+    def get(self, name: str):
+        return self.boats.get(name)
+
+    def __contains__(self, name) -> bool:
+        return name in self.boats
+
+    def __getitem__(self, name: str) -> Boat:
+        return self.boats[name]
+
+    def __len__(self) -> int:
+        return len(self.boats)
+
+    def derived(self, key, build):
+        """Данные, производные от каталога (клавиатуры и т.п.)
+
+        Строятся один раз на срез и пропадают вместе с ним при перезагрузке.
+        """
+        try:
+            return self._derived[key]
+        except KeyError:
+            value = self._derived[key] = build(self)
+            return value
+
+
+def _parse_boats(raw: dict, photos_dir: str) -> dict:
+    boats = {}
+    for name, data in raw.items():
+        boats[name] = Boat(
+            name=name,
+            photo=data['photo'],
+            photo_path=os.path.join(photos_dir, data['photo']),
+            pier=data['pier'],
+            captains=tuple(
+                Captain(name=captain['name'], phone=captain['phone'])
+                for captain in data.get('captain', [])
+            ),
+        )
+    return boats
+
+
+class BoatCatalog:
+    """Каталог катеров из configs/boats.json с перезагрузкой при изменении
+
+    Файл проверяется не чаще раза в check_interval секунд. Новый срез
+    собирается целиком и подменяет старый одним присваиванием, поэтому
+    обработчики никогда не видят наполовину загруженный каталог.
+    """
+
+    def __init__(self, path=BOATS_PATH, photos_dir=PHOTOS_DIR, check_interval=1.0):
+        self.path = path
+        self.photos_dir = photos_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._failed_mtime_ns = None
+        self._snapshot = None
+        self._snapshot = self._load(os.stat(path).st_mtime_ns)
+
+    def _load(self, mtime_ns: int) -> CatalogSnapshot:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        return CatalogSnapshot(_parse_boats(raw, self.photos_dir), mtime_ns, version)
+
+    def refresh(self) -> bool:
+        """Перечитывает файл, если он изменился. Возвращает True при перезагрузке"""
+        self._checked_at = time.monotonic()
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.error(f"Каталог катеров недоступен: {e}")
+            return False
+        if mtime_ns in (self._snapshot.mtime_ns, self._failed_mtime_ns):
+            return False
+
+        with self._lock:
+            if mtime_ns in (self._snapshot.mtime_ns, self._failed_mtime_ns):
+                return False
+            try:
+                snapshot = self._load(mtime_ns)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # Оставляем прежний каталог, пока файл не исправят
+                logger.error(f"Ошибка перезагрузки каталога катеров: {e}")
+                self._failed_mtime_ns = mtime_ns
+                return False
+            self._snapshot = snapshot
+        logger.info(f"Каталог катеров перезагружен: {len(snapshot)} катеров")
+        return True
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+        return self._snapshot
+
+
+catalog = BoatCatalog()
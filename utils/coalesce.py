@@ -0,0 +1,164 @@
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+logger = logging.getLogger(__name__)
+
+
+def card_key(kind: str, data: dict, version=()) -> str:
+    """Адрес карточки по содержимому: вид (pdf, превью), версия настроек рендера и данные анкеты"""
+    payload = json.dumps([kind, list(version), data], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CachedCard:
+    """Отрисованная карточка и ее file_id после первой отправки"""
+
+    __slots__ = ('key', 'data', 'file_id', 'created_at')
+
+    def __init__(self, key: str, data: bytes):
+        self.key = key
+        self.data = data
+        self.file_id = None
+        self.created_at = time.monotonic()
+
+
+class CardCache:
+    """Недавно отрисованные карточки по адресу card_key
+
+    Одинаковые запросы, пришедшие, пока карточка рисуется, ждут тот же
+    рендер, а не запускают свой. Готовая карточка живет ttl секунд: за это
+    время повторный запрос получает те же байты или file_id Telegram без
+    рендера и загрузки. Объем байтов в памяти ограничен max_bytes, лишние
+    вытесняются по давности использования.
+    """
+
+    def __init__(self, ttl: float = 600.0, max_bytes: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, CachedCard]' = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def _lookup(self, key: str) -> Optional[CachedCard]:
+        card = self._entries.get(key)
+        if card is None:
+            return None
+        if time.monotonic() - card.created_at >= self.ttl:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return card
+
+    def _drop(self, key: str):
+        card = self._entries.pop(key)
+        self._bytes -= len(card.data)
+
+    def _put(self, card: CachedCard):
+        if len(card.data) > self.max_bytes:
+            return
+        if card.key in self._entries:
+            self._drop(card.key)
+        self._entries[card.key] = card
+        self._bytes += len(card.data)
+        while self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    async def get(self, key: str, render: Callable[[], Awaitable[bytes]]) -> CachedCard:
+        """Карточка из кэша, из уже идущего рендера или от нового вызова render()
+
+        Ошибка рендера (например, RenderQueueFull) достается всем, кто его ждал.
+        """
+        card = self._lookup(key)
+        if card is not None:
+            self.hits += 1
+            return card
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            card = CachedCard(key, await render())
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Ошибку забирают ожидающие; если их нет, asyncio не должен ругаться
+            future.exception()
+            raise
+        else:
+            self._put(card)
+            future.set_result(card)
+            return card
+        finally:
+            del self._inflight[key]
+
+    def remember_file_id(self, card: CachedCard, file_id: Optional[str]):
+        """Запоминает file_id отправленной карточки: повторы уйдут без загрузки"""
+        card.file_id = file_id
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'coalesced': self.coalesced,
+            'misses': self.misses,
+        }
+
+
+class RepeatedCallbackMiddleware(BaseMiddleware):
+    """Внешний middleware dp.callback_query: гасит повторное нажатие той же кнопки
+
+    Двойное нажатие дает два одинаковых callback (чат, сообщение, data).
+    Второй в пределах window секунд не обрабатывается — на него только
+    отвечаем, чтобы у кнопки пропали часики. Апдейты одного чата и так
+    идут по очереди (SimpleEventIsolation), поэтому повтор приходит уже
+    после первого и без этой проверки повторил бы его работу.
+    """
+
+    def __init__(self, window: float = 2.0, maxsize: int = 4096):
+        self.window = window
+        self.maxsize = maxsize
+        self._seen: 'OrderedDict[tuple, float]' = OrderedDict()
+        self.dropped = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        if event.message is None or event.data is None:
+            return await handler(event, data)
+
+        key = (event.message.chat.id, event.message.message_id, event.data)
+        now = time.monotonic()
+        # Записи по порядку времени: устаревшие снимаем с головы
+        while self._seen and now - next(iter(self._seen.values())) >= self.window:
+            self._seen.popitem(last=False)
+        if key in self._seen:
+            self.dropped += 1
+            logger.info(f"Повторное нажатие отброшено: чат {key[0]}, {event.data}")
+            await event.answer()
+            return None
+
+        self._seen[key] = now
+        if len(self._seen) > self.maxsize:
+            self._seen.popitem(last=False)
+        return await handler(event, data)
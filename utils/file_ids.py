@@ -0,0 +1,76 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_PATH = os.path.join(BASE_DIR, 'cache', 'file_ids.json')
+
+
+class FileIdCache:
+    """Сохраненные file_id Telegram для локальных файлов
+
+    После первой отправки фото его можно пересылать по file_id без
+    повторной загрузки. Запись сбрасывается, если файл изменился.
+    """
+
+    def __init__(self, store_path=STORE_PATH):
+        self.store_path = store_path
+        self._entries = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.store_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш file_id: {e}")
+            return {}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
+            tmp_path = f"{self.store_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.store_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш file_id: {e}")
+
+    @staticmethod
+    def _key(path) -> str:
+        return os.path.relpath(os.path.abspath(path), BASE_DIR)
+
+    @staticmethod
+    def _version(path) -> int:
+        return os.stat(path).st_mtime_ns
+
+    def get(self, path):
+        """Возвращает file_id для файла или None, если его нужно загрузить"""
+        entry = self._entries.get(self._key(path))
+        if entry is None:
+            return None
+        try:
+            if entry['mtime_ns'] != self._version(path):
+                self.forget(path)
+                return None
+        except OSError:
+            return None
+        return entry['file_id']
+
+    def put(self, path, file_id: str):
+        self._entries[self._key(path)] = {
+            'mtime_ns': self._version(path),
+            'file_id': file_id,
+        }
+        self._save()
+
+    def forget(self, path):
+        if self._entries.pop(self._key(path), None) is not None:
+            self._save()
+
+
+# Нагрузочный тест подставляет свой файл, чтобы не смешивать file_id стенда с настоящими
+photo_file_ids = FileIdCache(os.getenv('FILE_ID_CACHE_PATH', STORE_PATH))
@@ -0,0 +1,80 @@
+import os
+import pickle
+import logging
+from weakref import WeakKeyDictionary
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'fonts')
+
+
+def _scale(units_per_em: int):
+    # Так же, как TTFontFile.extractInfo: перевод единиц шрифта в 1/1000 em
+    if units_per_em == 1000:
+        return lambda x: x
+    multiplier = 1000 / units_per_em
+    return lambda x: x * multiplier
+
+
+def _cache_path(path: str, cache_dir: str) -> str:
+    from reportlab import Version
+    stat = os.stat(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}-{stat.st_mtime_ns}-{stat.st_size}-rl{Version}.pickle")
+
+
+def _dump(font, cache_path: str):
+    face = dict(vars(font.face))
+    # Байты шрифта перечитываются из файла, функция масштаба не сериализуется
+    del face['_ttf_data'], face['_pdfScale']
+    state = dict(vars(font))
+    del state['face'], state['state']
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((state, face), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+def _load(path: str, cache_path: str):
+    from reportlab.pdfbase.ttfonts import TTFont, TTFontFace
+
+    with open(cache_path, 'rb') as f:
+        state, face_state = pickle.load(f)
+    with open(path, 'rb') as f:
+        ttf_data = f.read()
+
+    face = TTFontFace.__new__(TTFontFace)
+    vars(face).update(face_state, _ttf_data=ttf_data, _pdfScale=_scale(face_state['unitsPerEm']))
+    font = TTFont.__new__(TTFont)
+    vars(font).update(state, face=face, state=WeakKeyDictionary())
+    return font
+
+
+def load_ttfont(name: str, path: str, cache_dir: str = CACHE_DIR):
+    """TTFont с разобранными метриками из кэша на диске
+
+    Разбор TTF (таблицы глифов и ширин) выполняется один раз, дальше
+    метрики читаются из pickle. Кэш привязан к mtime и размеру шрифта и
+    к версии reportlab; при любой ошибке шрифт разбирается заново.
+    """
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    cache_path = _cache_path(path, cache_dir)
+    try:
+        font = _load(path, cache_path)
+        if font.fontName == name:
+            return font
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать кэш шрифта {name}: {e}")
+
+    font = TTFont(name, path)
+    try:
+        _dump(font, cache_path)
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить кэш шрифта {name}: {e}")
+    return font
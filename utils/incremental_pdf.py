@@ -0,0 +1,164 @@
+from io import BytesIO
+
+from PyPDF2 import PdfReader, PageObject
+from PyPDF2.generic import (
+    ArrayObject,
+    ContentStream,
+    DecodedStreamObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    StreamObject,
+)
+
+from utils.backgrounds import merge_resources, overlay_content
+
+
+def _startxref(data: bytes) -> int:
+    position = data.rfind(b'startxref')
+    if position < 0:
+        raise ValueError("В PDF не найден startxref")
+    return int(data[position + len(b'startxref'):].split()[0])
+
+
+def _stream(data: bytes) -> StreamObject:
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return stream
+
+
+class IncrementalUpdate:
+    """Дописывает изменения в конец готового PDF (incremental update)
+
+    Байты исходного документа копируются как есть, за ними идут только
+    новые и измененные объекты, своя таблица xref и trailer со ссылкой
+    /Prev на прежнюю. Стоимость записи зависит от объема изменений, а не
+    от размера документа.
+    """
+
+    def __init__(self, base: bytes):
+        self.base = base
+        self.reader = PdfReader(BytesIO(base))
+        if self.reader.is_encrypted:
+            raise ValueError("Дописывание в зашифрованный PDF не поддерживается")
+        self.prev_xref = _startxref(base)
+        self.next_idnum = int(self.reader.trailer['/Size'])
+        self._objects = {}  # idnum -> (generation, объект)
+        self._imported = {}  # (документ, idnum, generation) -> новая ссылка
+
+    def add_object(self, obj) -> IndirectObject:
+        """Добавляет новый косвенный объект и возвращает ссылку на него"""
+        ref = IndirectObject(self.next_idnum, 0, None)
+        self.next_idnum += 1
+        self._objects[ref.idnum] = (0, obj)
+        return ref
+
+    def import_object(self, obj):
+        """Переносит значение из другого документа с перенумерацией ссылок
+
+        Ссылки на объекты исходного документа остаются как есть.
+        """
+        if isinstance(obj, IndirectObject):
+            if obj.pdf is self.reader:
+                return obj
+            key = (id(obj.pdf), obj.idnum, obj.generation)
+            ref = self._imported.get(key)
+            if ref is None:
+                # Номер выдаем до копирования, чтобы циклические ссылки сошлись
+                ref = self._imported[key] = self.add_object(None)
+                self._objects[ref.idnum] = (0, self._copy(obj.get_object()))
+            return ref
+        if isinstance(obj, StreamObject):
+            # Поток не может быть прямым объектом внутри словаря или массива
+            return self.add_object(self._copy(obj))
+        return self._copy(obj)
+
+    def _copy(self, obj):
+        if isinstance(obj, ContentStream):
+            return _stream(obj.get_data()).flate_encode()
+        if isinstance(obj, StreamObject):
+            stream = type(obj)()
+            stream._data = obj._data
+            for name, value in dict.items(obj):
+                if name != '/Length':
+                    stream[name] = self.import_object(value)
+            return stream
+        if isinstance(obj, DictionaryObject):
+            result = DictionaryObject()
+            for name, value in dict.items(obj):
+                result[name] = self.import_object(value)
+            return result
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self.import_object(value) for value in obj)
+        return obj
+
+    def overlay_page(self, overlay: PageObject, page_index: int = 0):
+        """Накладывает страницу overlay поверх страницы исходного документа
+
+        Меняется только словарь страницы: к /Contents добавляется поток
+        слоя, к /Resources — его ресурсы (конфликтующие имена переименуются).
+        Прежнее содержимое обрамляется q/Q, как в PageObject.merge_page.
+        """
+        page = self.reader.pages[page_index]
+        resources, rename = merge_resources(
+            page['/Resources'].get_object() if '/Resources' in page else DictionaryObject(),
+            overlay['/Resources'].get_object(),
+        )
+        content = overlay_content(overlay, rename)
+
+        contents = page.raw_get('/Contents')
+        if isinstance(contents.get_object(), ArrayObject):
+            contents = list(contents.get_object())
+        else:
+            contents = [contents]
+        contents = ArrayObject(
+            [self.add_object(_stream(b'q\n'))]
+            + contents
+            + [self.add_object(_stream(b'\nQ\n')), self.add_object(self._copy(content))]
+        )
+
+        updated = DictionaryObject(dict.items(page))
+        updated[NameObject('/Contents')] = contents
+        updated[NameObject('/Resources')] = self.import_object(resources)
+        ref = page.indirect_reference
+        self._objects[ref.idnum] = (ref.generation, updated)
+
+    def write(self) -> bytes:
+        """Исходный документ с дописанной секцией изменений"""
+        out = BytesIO()
+        out.write(self.base)
+        if not self.base.endswith(b'\n'):
+            out.write(b'\n')
+
+        offsets = []
+        for idnum in sorted(self._objects):
+            generation, obj = self._objects[idnum]
+            offsets.append((idnum, generation, out.tell()))
+            out.write(f"{idnum} {generation} obj\n".encode())
+            obj.write_to_stream(out, None)
+            out.write(b"\nendobj\n")
+
+        xref_offset = out.tell()
+        out.write(b"xref\n")
+        # Подразделы xref — непрерывные диапазоны номеров объектов
+        start = 0
+        while start < len(offsets):
+            end = start
+            while end + 1 < len(offsets) and offsets[end + 1][0] == offsets[end][0] + 1:
+                end += 1
+            out.write(f"{offsets[start][0]} {end - start + 1}\n".encode())
+            for _, generation, offset in offsets[start:end + 1]:
+                out.write(f"{offset:010d} {generation:05d} n\r\n".encode())
+            start = end + 1
+
+        trailer = DictionaryObject()
+        trailer[NameObject('/Size')] = NumberObject(self.next_idnum)
+        trailer[NameObject('/Prev')] = NumberObject(self.prev_xref)
+        for name in ('/Root', '/Info', '/ID'):
+            if name in self.reader.trailer:
+                trailer[NameObject(name)] = self.reader.trailer.raw_get(name)
+        out.write(b"trailer\n")
+        trailer.write_to_stream(out, None)
+        out.write(f"\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+        return out.getvalue()
@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import string
+import logging
+import threading
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIGS_DIR = os.path.join(BASE_DIR, 'configs')
+LAYOUT_PATH = os.path.join(CONFIGS_DIR, 'layout.json')
+FONTS_DIR = BASE_DIR
+
+ELLIPSIS = '…'
+FALLBACK_FONT = 'Helvetica'
+
+
+class PhotoBox(NamedTuple):
+    """Рамка фото катера, в пунктах от левого нижнего угла страницы"""
+    x: float
+    y: float
+    width: float
+    height: float
+    radius: float
+
+
+class TextField(NamedTuple):
+    name: str
+    parts: tuple  # ((литерал, имя поля данных или None), ...) из шаблона текста
+    x: float
+    y: float
+    font: str  # имя шрифта в reportlab
+    font_path: Optional[str]  # TTF для PIL; None — шрифт по умолчанию
+    size: float
+    min_size: float
+    max_width: Optional[float]
+    fit: str  # shrink — уменьшать до min_size, потом обрезать; truncate — сразу обрезать; none
+    color: tuple  # (r, g, b), 0-255
+    char_widths: dict  # ширины символов шрифта при размере 1
+    placed: Optional['PlacedText']  # готовый результат для текста без подстановок
+
+
+class PlacedText(NamedTuple):
+    """Строка, готовая к отрисовке: уже подогнанная по ширине"""
+    text: str
+    x: float
+    y: float
+    font: str
+    font_path: Optional[str]
+    size: float
+    color: tuple
+
+
+class RenderPlan(NamedTuple):
+    """Скомпилированная разметка карточки: шаблон, рамка фото и поля"""
+    name: str
+    template_path: str
+    photo: PhotoBox
+    fields: tuple
+    defaults: dict
+
+    def place(self, data: dict) -> list:
+        """Тексты полей для данных аренды, подогнанные под ширину поля"""
+        values = _Values(data, self.defaults)
+        placed = []
+        for field in self.fields:
+            if field.placed is not None:
+                placed.append(field.placed)
+                continue
+            text = ''.join(literal + (values[key] if key is not None else '') for literal, key in field.parts)
+            placed.append(fit_text(field, text))
+        return placed
+
+
+class _Values(dict):
+    """Данные аренды для подстановки: значение по умолчанию или пустая строка"""
+
+    def __init__(self, data, defaults):
+        super().__init__(data)
+        self.defaults = defaults
+
+    def __missing__(self, key):
+        return self.defaults.get(key, '')
+
+    def __getitem__(self, key):
+        return str(super().__getitem__(key))
+
+
+def text_width(field: TextField, text: str) -> float:
+    """Ширина текста при размере шрифта 1"""
+    widths = field.char_widths
+    total = 0.0
+    for char in text:
+        width = widths.get(char)
+        if width is None:
+            from reportlab.pdfbase.pdfmetrics import stringWidth
+            width = widths[char] = stringWidth(char, field.font, 1)
+        total += width
+    return total
+
+
+def fit_text(field: TextField, text: str) -> PlacedText:
+    """Подгоняет текст под max_width поля: уменьшает шрифт и/или обрезает с многоточием"""
+    size = field.size
+    if field.max_width is not None and field.fit != 'none':
+        width = text_width(field, text)
+        if width * size > field.max_width:
+            # Ширина строки пропорциональна размеру шрифта
+            if field.fit == 'shrink':
+                size = max(field.min_size, field.max_width / width)
+            if width * size > field.max_width:
+                text = truncate(field, text, field.max_width / size)
+    return PlacedText(text, field.x, field.y, field.font, field.font_path, size, field.color)
+
+
+def truncate(field: TextField, text: str, limit: float) -> str:
+    """Самое длинное начало text, которое вместе с многоточием не шире limit (при размере 1)"""
+    limit -= text_width(field, ELLIPSIS)
+    total = 0.0
+    for index, char in enumerate(text):
+        total += text_width(field, char)
+        if total > limit:
+            return text[:index].rstrip() + ELLIPSIS
+    return text
+
+
+def _parse_color(value) -> tuple:
+    if isinstance(value, str):
+        value = value.lstrip('#')
+        return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+    return tuple(value)
+
+
+def _register_font(name: str, path: str) -> bool:
+    """Регистрирует TTF в reportlab; False, если шрифт не загрузился"""
+    from reportlab.pdfbase import pdfmetrics
+    from utils.font_cache import load_ttfont
+
+    if name in pdfmetrics.getRegisteredFontNames():
+        return True
+    try:
+        pdfmetrics.registerFont(load_ttfont(name, path))
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка загрузки шрифта {name}: {e}")
+        return False
+
+
+def compile_layout(name: str, spec: dict, configs_dir: str = CONFIGS_DIR, fonts_dir: str = FONTS_DIR) -> RenderPlan:
+    """Собирает план рендера из описания разметки
+
+    Шрифты регистрируются здесь, а не при каждом рендере; если шрифт не
+    загрузился, поле рисуется запасным Helvetica. Шаблоны текстов
+    разбираются заранее, а тексты без подстановок (подписи) сразу
+    измеряются и подгоняются.
+    """
+    fonts = {}
+    for font, filename in spec.get('fonts', {}).items():
+        path = os.path.join(fonts_dir, filename)
+        fonts[font] = path if _register_font(font, path) else None
+
+    char_widths = {}
+    fields = []
+    for field_spec in spec['fields']:
+        field_spec = {**spec, **field_spec}
+        font = field_spec.get('font', FALLBACK_FONT)
+        font_path = fonts.get(font)
+        if font_path is None:
+            font = FALLBACK_FONT
+        parts = tuple(
+            (literal, key) for literal, key, _format, _conversion in string.Formatter().parse(field_spec['text'])
+        )
+        field = TextField(
+            name=field_spec['name'],
+            parts=parts,
+            x=field_spec['x'],
+            y=field_spec['y'],
+            font=font,
+            font_path=font_path,
+            size=field_spec.get('size', 12),
+            min_size=field_spec.get('min_size', field_spec.get('size', 12)),
+            max_width=field_spec.get('max_width'),
+            fit=field_spec.get('fit', 'shrink'),
+            color=_parse_color(field_spec.get('color', '#000000')),
+            # Поля одним шрифтом делят таблицу ширин
+            char_widths=char_widths.setdefault(font, {}),
+            placed=None,
+        )
+        if all(key is None for _literal, key in parts):
+            field = field._replace(placed=fit_text(field, ''.join(literal for literal, _key in parts)))
+        fields.append(field)
+
+    return RenderPlan(
+        name=name,
+        template_path=os.path.join(configs_dir, spec['template']),
+        photo=PhotoBox(**spec['photo']),
+        fields=tuple(fields),
+        defaults=dict(spec.get('defaults', {})),
+    )
+
+
+class LayoutSnapshot(NamedTuple):
+    plans: dict  # имя разметки -> RenderPlan
+    default: str
+    piers: dict  # причал -> имя разметки
+    version: tuple  # mtime файла разметки и шаблонов
+
+
+class LayoutRegistry:
+    """Планы рендера из configs/layout.json с пересборкой при изменении
+
+    Разметка компилируется при первом рендере и дальше переиспользуется.
+    Не чаще раза в check_interval секунд проверяются mtime файла разметки
+    и шаблонов; при изменении планы собираются заново и подменяются
+    целиком, как срез каталога катеров.
+    """
+
+    def __init__(self, path=LAYOUT_PATH, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._failed_version = None
+        self._snapshot = None
+
+    def _version(self, templates) -> tuple:
+        return (os.stat(self.path).st_mtime_ns,) + tuple(os.stat(path).st_mtime_ns for path in templates)
+
+    def _load(self) -> LayoutSnapshot:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        configs_dir = os.path.dirname(self.path)
+        plans = {name: compile_layout(name, spec, configs_dir) for name, spec in raw['layouts'].items()}
+        default = raw.get('default') or next(iter(plans))
+        if default not in plans:
+            raise KeyError(f"Нет разметки по умолчанию {default}")
+        version = self._version(sorted({plan.template_path for plan in plans.values()}))
+        return LayoutSnapshot(plans, default, dict(raw.get('piers', {})), version)
+
+    def refresh(self) -> bool:
+        """Пересобирает планы, если изменились разметка или шаблоны"""
+        self._checked_at = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None:
+            try:
+                version = self._version(sorted({plan.template_path for plan in snapshot.plans.values()}))
+            except OSError as e:
+                logger.error(f"Разметка карточки недоступна: {e}")
+                return False
+            if version in (snapshot.version, self._failed_version):
+                return False
+
+        with self._lock:
+            if self._snapshot is not snapshot:
+                return False
+            try:
+                new_snapshot = self._load()
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                if snapshot is None:
+                    raise
+                # Оставляем прежние планы, пока разметку не исправят
+                logger.error(f"Ошибка перезагрузки разметки карточки: {e}")
+                self._failed_version = version
+                return False
+            self._snapshot = new_snapshot
+        logger.info(f"Разметка карточки загружена: {', '.join(new_snapshot.plans)}")
+        return True
+
+    @property
+    def snapshot(self) -> LayoutSnapshot:
+        if self._snapshot is None or time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+        return self._snapshot
+
+    def plan(self, name: str = None) -> RenderPlan:
+        snapshot = self.snapshot
+        return snapshot.plans[name or snapshot.default]
+
+    def plan_for(self, data: dict) -> RenderPlan:
+        """План для аренды: явная разметка (data['layout']), разметка причала или по умолчанию"""
+        snapshot = self.snapshot
+        name = data.get('layout') or snapshot.piers.get(data.get('pier')) or snapshot.default
+        return snapshot.plans.get(name) or snapshot.plans[snapshot.default]
+
+
+layout_registry = LayoutRegistry()
@@ -0,0 +1,81 @@
+import logging
+import datetime
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class MarkupCache:
+    """Готовые клавиатуры: каждая строится один раз и дальше переиспользуется
+
+    Ключ описывает все, от чего зависит клавиатура (например, список
+    свободных часов). Клавиатуры из каталога катеров сюда не кладутся —
+    они живут в срезе каталога (CatalogSnapshot.derived) и сбрасываются
+    вместе с ним при изменении configs/boats.json.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        """Клавиатура по ключу; build() вызывается, если ее еще нет"""
+        try:
+            markup = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            markup = self._entries[key] = build()
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return markup
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return markup
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class CalendarCache:
+    """Клавиатуры календаря по месяцам, готовые на months месяцев вперед
+
+    Календарь выделяет сегодняшний день, поэтому набор пересобирается,
+    когда меняется дата; прошедшие месяцы при этом выпадают из кэша.
+    """
+
+    def __init__(self, calendar_factory, months: int = 3):
+        self.calendar_factory = calendar_factory
+        self.months = months
+        self._today = None
+        self._entries = {}
+
+    async def _build(self, year: int, month: int):
+        markup = self._entries[year, month] = await self.calendar_factory().start_calendar(year, month)
+        return markup
+
+    async def warm(self):
+        """Строит календари на текущий и следующие months месяцев"""
+        today = datetime.date.today()
+        self._today = today
+        self._entries = {}
+        for offset in range(self.months + 1):
+            year, month = divmod(today.month - 1 + offset, 12)
+            await self._build(today.year + year, month + 1)
+
+    async def get(self, year: int = None, month: int = None):
+        """Календарь на месяц, по умолчанию текущий"""
+        if datetime.date.today() != self._today:
+            await self.warm()
+        key = (year or self._today.year, month or self._today.month)
+        markup = self._entries.get(key)
+        if markup is None:
+            markup = await self._build(*key)
+        return markup
+
+
+markup_cache = MarkupCache()
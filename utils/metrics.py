@@ -0,0 +1,279 @@
+import time
+import logging
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """Метрика с метками; значения хранятся по кортежу значений меток"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._values.items()):
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: tuple, value) -> list:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, seconds: float, **labels):
+        key = self._key(labels)
+        value = self._values.get(key)
+        if value is None:
+            # Счетчики по корзинам + сумма + количество
+            value = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, seconds)
+        if index < len(self.buckets):
+            value[0][index] += 1
+        value[1] += seconds
+        value[2] += 1
+
+    def _render_value(self, key: tuple, value) -> list:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labels, key, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labels, key, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик процесса в текстовом формате Prometheus
+
+    Метрики живут в памяти процесса; в режиме вебхука с несколькими
+    воркерами у каждого процесса свой набор.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collect: Callable[[], None]):
+        """collect() вызывается перед каждой выдачей, чтобы обновить датчики"""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрик: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+handler_duration = registry.histogram(
+    'rentcard_handler_duration_seconds', "Время обработки апдейта обработчиком", ('handler', 'state'),
+)
+handler_errors = registry.counter(
+    'rentcard_handler_errors_total', "Исключения в обработчиках", ('handler', 'state'),
+)
+handler_in_flight = registry.gauge(
+    'rentcard_handler_in_flight', "Апдейты, которые обрабатываются сейчас", ('handler',),
+)
+render_stage_duration = registry.histogram(
+    'rentcard_render_stage_seconds', "Время этапов рендера карточки", ('stage',),
+)
+api_duration = registry.histogram(
+    'rentcard_telegram_api_duration_seconds', "Время вызовов Telegram Bot API", ('method',),
+)
+api_errors = registry.counter(
+    'rentcard_telegram_api_errors_total', "Ошибки вызовов Telegram Bot API", ('method', 'error'),
+)
+
+render_pool_tasks = registry.gauge(
+    'rentcard_render_pool_tasks', "Задачи пула рендеринга: в работе и в очереди", ('status',),
+)
+
+outbound_queue = registry.gauge(
+    'rentcard_outbound_queue', "Вызовы Bot API, ждущие лимита отправки", ('priority',),
+)
+outbound_wait = registry.histogram(
+    'rentcard_outbound_wait_seconds', "Ожидание лимита отправки перед вызовом Bot API", ('priority',),
+)
+outbound_retries = registry.counter(
+    'rentcard_outbound_retry_after_total', "Повторы вызовов Bot API после ответа 429", ('method',),
+)
+
+slow_renders = registry.counter(
+    'rentcard_slow_renders_total', "Рендеры карточек дольше порога RENDER_SLOW_MS", ('kind',),
+)
+
+fsm_drafts = registry.gauge(
+    'rentcard_fsm_drafts', "Незавершенные анкеты в хранилище FSM",
+)
+fsm_draft_bytes = registry.gauge(
+    'rentcard_fsm_draft_bytes', "Примерный объем незавершенных анкет в памяти, байты",
+)
+fsm_drafts_expired = registry.counter(
+    'rentcard_fsm_drafts_expired_total', "Анкеты, удаленные по сроку",
+)
+
+
+def observe_render(timings: dict):
+    """Записывает время этапов рендера из render_card(data, timings)"""
+    for stage, seconds in timings.items():
+        render_stage_duration.observe(seconds, stage=stage)
+
+
+def observe_render_pool(pool):
+    stats = pool.stats()
+    render_pool_tasks.set(stats['active'], status='active')
+    render_pool_tasks.set(stats['queued'], status='queued')
+
+
+def observe_outbound(scheduler):
+    for priority, count in scheduler.stats()['queued'].items():
+        outbound_queue.set(count, priority=priority)
+
+
+def observe_storage(storage):
+    stats = storage.stats()
+    fsm_drafts.set(stats['entries'])
+    fsm_draft_bytes.set(stats['bytes'])
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware: время, ошибки и число апдейтов в работе по обработчикам
+
+    Регистрируется на dp.message, dp.callback_query и т.д.; метка state —
+    состояние Form, в котором был пользователь, когда пришел апдейт.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        state = data.get('raw_state') or 'none'
+
+        handler_in_flight.inc(handler=name)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(handler=name, state=state)
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - started, handler=name, state=state)
+            handler_in_flight.dec(handler=name)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время и ошибки вызовов Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            api_errors.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            api_duration.observe(time.perf_counter() - started, method=name)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        body=registry.render().encode('utf-8'),
+        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'},
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднимает GET /metrics на host:port в текущем цикле событий"""
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики: http://{host}:{port}/metrics")
+    return runner
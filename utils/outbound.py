@@ -0,0 +1,245 @@
+import os
+import time
+import asyncio
+import logging
+import itertools
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InputFile
+
+from utils.metrics import outbound_retries, outbound_wait
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих вызовов: меньше — раньше
+INTERACTIVE, MESSAGE, UPLOAD = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', MESSAGE: 'message', UPLOAD: 'upload'}
+INTERACTIVE_METHODS = {
+    'AnswerCallbackQuery',
+    'EditMessageText',
+    'EditMessageReplyMarkup',
+    'EditMessageCaption',
+    'DeleteMessage',
+    'SendChatAction',
+}
+
+
+def method_priority(method) -> int:
+    """Правка сообщений — в первую очередь, загрузка файлов — в последнюю"""
+    if type(method).__name__ in INTERACTIVE_METHODS:
+        return INTERACTIVE
+    if any(isinstance(value, InputFile) for value in vars(method).values()):
+        return UPLOAD
+    return MESSAGE
+
+
+class TokenBucket:
+    """Ограничение частоты: rate вызовов в секунду, подряд не больше burst
+
+    При rate <= 0 частота не ограничивается, действует только пауза block().
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float, limited: bool = True) -> float:
+        """Через сколько секунд можно сделать следующий вызов
+
+        limited=False — вызов не расходует лимит и ждет только паузы после 429.
+        """
+        self._refill(now)
+        delay = self.blocked_until - now
+        if limited and self.rate > 0 and self.tokens < 1:
+            delay = max(delay, (1 - self.tokens) / self.rate)
+        return max(delay, 0.0)
+
+    def take(self, now: float):
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1
+
+    def block(self, seconds: float):
+        """Запрещает вызовы на seconds секунд (ответ 429 Retry-After)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst and self.blocked_until <= now
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Middleware сессии бота: очередь исходящих вызовов Bot API
+
+    Вызовы, адресованные чату, проходят через общий лимит бота. Заранее
+    частота ограничивается только в группах (group_rate) и, если задан
+    chat_rate, в личных чатах; правки сообщений и ответы на кнопки этот
+    лимит не тратят, чтобы ответ на действие пользователя не ждал. Когда
+    лимит исчерпан, вызовы ждут в очереди, и первыми уходят правки
+    сообщений, последними — загрузка файлов. На 429 вызов повторяется
+    через retry_after секунд, а чат (или весь бот для вызовов без чата) на
+    это время ставится на паузу. Вызовы без chat_id (getUpdates,
+    answerCallbackQuery) лимитом не ограничиваются.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 0,
+        chat_burst: float = 3,
+        group_rate: float = 20 / 60,
+        max_retries: int = 3,
+        max_retry_after: float = 30,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}  # chat_id -> TokenBucket
+        self._waiting = []  # (приоритет, номер, chat_id, future)
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._pump_task = None
+        self._sent = 0
+        self._retries = 0
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, 1)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id, priority: int):
+        if self._pump_task is None or self._pump_task.done():
+            self._wakeup = asyncio.Event()
+            self._pump_task = asyncio.create_task(self._pump())
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((priority, next(self._counter), chat_id, future))
+        self._wakeup.set()
+        started = time.perf_counter()
+        await future
+        outbound_wait.observe(time.perf_counter() - started, priority=PRIORITY_NAMES[priority])
+
+    def _dispatch(self) -> float:
+        """Выпускает вызовы, которые укладываются в лимиты, возвращает паузу до следующего"""
+        now = time.monotonic()
+        self._waiting = [item for item in self._waiting if not item[3].done()]
+        self._waiting.sort()
+        while self._waiting:
+            delay = self._global.delay(now)
+            if delay > 0:
+                return delay
+            delay = None
+            for item in self._waiting:
+                bucket = self._chat_bucket(item[2])
+                chat_delay = bucket.delay(now, limited=item[0] != INTERACTIVE)
+                if chat_delay <= 0:
+                    break
+                delay = chat_delay if delay is None else min(delay, chat_delay)
+            else:
+                return delay
+
+            self._waiting.remove(item)
+            self._global.take(now)
+            if item[0] != INTERACTIVE:
+                bucket.take(now)
+            item[3].set_result(None)
+
+        # Ведра, которые полностью восстановились, не нужны
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle(now)]:
+            del self._chats[chat_id]
+        return None
+
+    async def _pump(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._dispatch()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        priority = method_priority(method)
+        for attempt in range(self.max_retries + 1):
+            if chat_id is not None:
+                await self._acquire(chat_id, priority)
+            try:
+                result = await make_request(bot, method)
+                self._sent += 1
+                return result
+            except TelegramRetryAfter as e:
+                name = type(method).__name__
+                if attempt == self.max_retries or e.retry_after > self.max_retry_after:
+                    raise
+                self._retries += 1
+                outbound_retries.inc(method=name)
+                logger.warning(f"Flood control на {name} (чат {chat_id}): повтор через {e.retry_after} с")
+                if chat_id is not None:
+                    self._chat_bucket(chat_id).block(e.retry_after)
+                else:
+                    await asyncio.sleep(e.retry_after)
+
+    def stats(self) -> dict:
+        """Очередь по приоритетам и число отправленных вызовов"""
+        queued = dict.fromkeys(PRIORITY_NAMES.values(), 0)
+        for priority, _, _, future in self._waiting:
+            if not future.done():
+                queued[PRIORITY_NAMES[priority]] += 1
+        return {
+            'queued': queued,
+            'limited_chats': len(self._chats),
+            'sent': self._sent,
+            'retries': self._retries,
+        }
+
+
+class PooledSession(AiohttpSession):
+    """AiohttpSession с постоянными соединениями к Bot API
+
+    Все вызовы идут на один хост, поэтому лимит пула действует и на хост,
+    а простаивающие соединения держатся дольше стандартных 15 секунд.
+    """
+
+    def __init__(self, limit: int = 20, keepalive_timeout: float = 60, **kwargs):
+        super().__init__(limit=limit, **kwargs)
+        self._connector_init.update(limit_per_host=limit, keepalive_timeout=keepalive_timeout)
+
+
+def create_session(api_url: str = None) -> PooledSession:
+    """Создает сессию Bot API по настройкам из окружения (.env)"""
+    return PooledSession(
+        api=TelegramAPIServer.from_base(api_url) if api_url else PRODUCTION,
+        limit=int(os.getenv('TELEGRAM_POOL_SIZE', 20)),
+        keepalive_timeout=float(os.getenv('TELEGRAM_KEEPALIVE', 60)),
+    )
+
+
+def create_outbound_scheduler() -> OutboundScheduler:
+    """Создает очередь отправки по настройкам из окружения (.env)"""
+    return OutboundScheduler(
+        global_rate=float(os.getenv('TELEGRAM_GLOBAL_RATE', 30)),
+        # 0 — в личных чатах только пауза после 429
+        chat_rate=float(os.getenv('TELEGRAM_CHAT_RATE', 0)),
+        chat_burst=float(os.getenv('TELEGRAM_CHAT_BURST', 3)),
+        max_retries=int(os.getenv('TELEGRAM_MAX_RETRIES', 3)),
+    )
@@ -0,0 +1,296 @@
+import os
+import time
+import logging
+import hashlib
+from contextlib import contextmanager
+from functools import partial
+from io import BytesIO
+from typing import NamedTuple, Optional
+
+from utils.catalog import catalog
+from utils.layout import layout_registry
+
+# reportlab, PyPDF2 и PIL (через кэши фото и фонов) импортируются при первом
+# рендере или прогреве, чтобы не замедлять запуск бота
+
+logger = logging.getLogger(__name__)
+
+# Корень проекта (на уровень выше utils)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGS_DIR = os.path.join(BASE_DIR, 'configs')
+PHOTOS_DIR = os.path.join(BASE_DIR, 'photos')
+FONTS_DIR = BASE_DIR
+
+font_path = os.path.join(FONTS_DIR, 'DejaVuSans.ttf')
+bold_font_path = os.path.join(FONTS_DIR, 'DejaVuSans-Bold.ttf')
+
+# Запись карточки: rewrite — PdfWriter пересобирает весь документ,
+# incremental — байты шаблона копируются как есть, изменения дописываются в конец
+OUTPUT_MODE = os.getenv('PDF_OUTPUT_MODE', 'rewrite')
+
+class QualityProfile(NamedTuple):
+    """Параметры качества (и размера) карточки"""
+    dpi: Optional[int] = None  # Разрешение фото в рамке; None — как в исходном файле
+    jpeg_quality: Optional[int] = None  # Фото в JPEG + маска скругления; None — PNG без потерь
+    ascii85: bool = True  # Двоичные потоки reportlab в ASCII85 (+25% к их размеру)
+
+QUALITY_PROFILES = {
+    'original': QualityProfile(),
+    'print': QualityProfile(dpi=300, jpeg_quality=90, ascii85=False),
+    'standard': QualityProfile(dpi=150, jpeg_quality=85, ascii85=False),
+    'compact': QualityProfile(dpi=100, jpeg_quality=75, ascii85=False),
+}
+
+# Профиль качества карточек, задается один раз при запуске
+QUALITY_NAME = os.getenv('PDF_QUALITY', 'original')
+QUALITY = QUALITY_PROFILES[QUALITY_NAME]
+
+def new_canvas(packet):
+    """Canvas формата A4 с настройками потоков из профиля качества"""
+    from reportlab import rl_config
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+
+    # useA85 читается при создании потоков, поэтому выставляется перед рисованием
+    rl_config.useA85 = int(QUALITY.ascii85)
+    return canvas.Canvas(packet, pagesize=A4)
+
+def draw_masked_jpeg(canvas, jpeg: bytes, mask: bytes, x, y, width, height):
+    """Рисует JPEG с мягкой маской прозрачности (SMask)
+
+    reportlab встраивает JPEG без перекодирования, но маску к нему не
+    добавляет; маска регистрируется отдельным объектом так же, как это
+    делает Canvas.drawImage для PNG с альфа-каналом.
+    """
+    from reportlab.pdfbase import pdfdoc
+    from reportlab.lib.utils import ImageReader
+
+    extra = {'imgObj': None}
+    canvas.drawImage(ImageReader(BytesIO(jpeg)), x, y, width=width, height=height, extraReturn=extra)
+    image = extra['imgObj']
+    if getattr(image, 'smask', None):
+        return  # то же фото уже рисовалось на этом canvas
+
+    smask = pdfdoc.PDFImageXObject(hashlib.md5(mask).hexdigest(), ImageReader(BytesIO(mask)))
+    smask._decode = [0, 1]
+    name = canvas._doc.getXObjectName(smask.name)
+    canvas._setXObjects(smask)
+    image.smask = canvas._doc.Reference(smask, name)
+
+def add_image_to_pdf(canvas, image_path, x, y, width, height, radius=15):
+    """Добавляет изображение на PDF canvas с закругленными углами"""
+    from reportlab.lib.utils import ImageReader
+    from utils.photo_cache import photo_cache
+
+    quality = QUALITY
+    
+    try:
+        # Берем готовое изображение с закругленными углами из кэша
+        photo = photo_cache.get(image_path, radius, (width, height), quality.dpi, quality.jpeg_quality)
+        
+        if quality.jpeg_quality is not None:
+            mask = photo_cache.get(image_path, radius, (width, height), quality.dpi, quality.jpeg_quality, 'mask')
+            draw_masked_jpeg(canvas, photo, mask, x, y, width, height)
+        else:
+            # Рисуем обработанное изображение
+            img = ImageReader(BytesIO(photo))
+            canvas.drawImage(img, x, y, width=width, height=height, mask='auto')
+        
+    except Exception as e:
+        logger.error(f"Ошибка при добавлении изображения: {e}")
+        # Если возникла ошибка, рисуем обычное изображение
+        img = ImageReader(image_path)
+        canvas.drawImage(img, x, y, width=width, height=height)
+
+def draw_photo_layer(boat_image_path: str, photo) -> BytesIO:
+    """Рисует слой с фото катера (в рамке photo из плана рендера) в отдельный PDF"""
+    packet = BytesIO()
+    can = new_canvas(packet)
+    
+    # Добавляем изображение лодки
+    add_image_to_pdf(can, boat_image_path, **photo._asdict())
+    
+    can.save()
+    packet.seek(0)
+    return packet
+
+def build_background(template_path: str, boat_image_path: str, photo=None) -> bytes:
+    """Собирает фон карточки: шаблон с фото катера, без текста"""
+    from PyPDF2 import PdfReader, PdfWriter
+    from utils.template_registry import template_registry
+
+    photo_pdf = PdfReader(draw_photo_layer(boat_image_path, photo or layout_registry.plan().photo))
+    
+    output = PdfWriter()
+    page = template_registry.get_page(template_path)
+    page.merge_page(photo_pdf.pages[0])
+    output.add_page(page)
+    
+    result = BytesIO()
+    output.write(result)
+    return result.getvalue()
+
+def background_tag(photo, mode: str = 'rewrite') -> str:
+    """Метка версии фона: геометрия фото, профиль качества и режим записи"""
+    tag = repr(tuple(photo))
+    if QUALITY != QUALITY_PROFILES['original']:
+        tag += f"|{QUALITY!r}"
+    if mode != 'rewrite':
+        tag += f"|{mode}"
+    return tag
+
+def get_background_page(boat_name: str, plan=None):
+    """Возвращает копию готового фона карточки для катера (по плану рендера plan)"""
+    from utils import backgrounds
+    plan = plan or layout_registry.plan()
+    boat_image_path = catalog.snapshot[boat_name].photo_path
+    return backgrounds.background_cache.get_page(
+        plan.template_path, boat_image_path, partial(build_background, photo=plan.photo),
+        tag=background_tag(plan.photo),
+    )
+
+def build_background_incremental(template_path: str, boat_image_path: str, photo=None) -> bytes:
+    """Фон карточки как байты шаблона без изменений + дописанный слой с фото"""
+    from PyPDF2 import PdfReader
+    from utils.incremental_pdf import IncrementalUpdate
+
+    with open(template_path, 'rb') as f:
+        update = IncrementalUpdate(f.read())
+    photo_layer = draw_photo_layer(boat_image_path, photo or layout_registry.plan().photo)
+    update.overlay_page(PdfReader(photo_layer).pages[0])
+    return update.write()
+
+def get_background_bytes(boat_name: str, plan=None) -> bytes:
+    """Готовый фон карточки для катера в режиме incremental"""
+    from utils import backgrounds
+    plan = plan or layout_registry.plan()
+    boat_image_path = catalog.snapshot[boat_name].photo_path
+    return backgrounds.background_cache.get_bytes(
+        plan.template_path, boat_image_path, partial(build_background_incremental, photo=plan.photo),
+        tag=background_tag(plan.photo, 'incremental'),
+    )
+
+@contextmanager
+def timed(timings, stage: str):
+    """Добавляет время выполнения блока в timings[stage], если timings передан"""
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+def draw_text_layer(data: dict, plan=None) -> BytesIO:
+    """Рисует слой с текстом карточки (без фона) в отдельный PDF"""
+    plan = plan or layout_registry.plan_for(data)
+
+    # Создаем временный PDF
+    packet = BytesIO()
+    can = new_canvas(packet)
+    
+    # Шрифты, цвета и подгонка по ширине уже рассчитаны в плане рендера
+    font = color = None
+    for text in plan.place(data):
+        if (text.font, text.size) != font:
+            font = (text.font, text.size)
+            can.setFont(*font)
+        if text.color != color:
+            color = text.color
+            can.setFillColorRGB(*(channel / 255 for channel in color))
+        can.drawString(text.x, text.y, text.text)
+    
+    can.save()
+    packet.seek(0)
+    return packet
+
+def render_card_buffer(data: dict, timings: dict = None, mode: str = None) -> BytesIO:
+    """Заполняет шаблон PDF данными из аренды и возвращает буфер в памяти
+
+    Если передан timings, в него записывается время этапов рендера (в секундах).
+    mode — способ записи (rewrite или incremental), по умолчанию OUTPUT_MODE.
+    """
+    if (mode or OUTPUT_MODE) == 'incremental':
+        return render_card_incremental(data, timings)
+
+    from PyPDF2 import PdfReader, PdfWriter
+    from utils.backgrounds import merge_overlay
+
+    plan = layout_registry.plan_for(data)
+
+    # Фон (шаблон + фото) собран заранее, рисуем только текст
+    with timed(timings, 'background'):
+        page = get_background_page(data['boat'], plan)
+    
+    with timed(timings, 'overlay'):
+        packet = draw_text_layer(data, plan)
+    
+    # Накладываем текстовый слой на фон
+    with timed(timings, 'merge'):
+        new_pdf = PdfReader(packet)
+        output = PdfWriter()
+        merge_overlay(page, new_pdf.pages[0])
+        output.add_page(page)
+    
+    # Сохраняем результат в память
+    with timed(timings, 'write'):
+        result = BytesIO()
+        output.write(result)
+        result.seek(0)
+    return result
+
+def render_card_incremental(data: dict, timings: dict = None) -> BytesIO:
+    """Карточка как байты фона без изменений + дописанный текстовый слой"""
+    from PyPDF2 import PdfReader
+    from utils.incremental_pdf import IncrementalUpdate
+
+    plan = layout_registry.plan_for(data)
+
+    with timed(timings, 'background'):
+        base = get_background_bytes(data['boat'], plan)
+    
+    with timed(timings, 'overlay'):
+        packet = draw_text_layer(data, plan)
+    
+    with timed(timings, 'merge'):
+        update = IncrementalUpdate(base)
+        update.overlay_page(PdfReader(packet).pages[0])
+    
+    with timed(timings, 'write'):
+        result = BytesIO(update.write())
+    return result
+
+def render_card(data: dict, timings: dict = None, mode: str = None) -> bytes:
+    """Возвращает готовую карточку аренды в виде байтов PDF"""
+    return render_card_buffer(data, timings, mode).getvalue()
+
+def render_card_timed(data: dict) -> tuple:
+    """render_card для пула: возвращает байты PDF и время этапов рендера"""
+    timings = {}
+    started = time.perf_counter()
+    pdf = render_card(data, timings)
+    timings['total'] = time.perf_counter() - started
+    return pdf, timings
+
+def fill_pdf_template(data: dict, output_path: str = None) -> str:
+    """Сохраняет карточку аренды в файл и возвращает путь к нему"""
+    if output_path is None:
+        output_path = os.path.join(BASE_DIR, 'аренда.pdf')
+    with open(output_path, "wb") as output_stream:
+        output_stream.write(render_card(data))
+    return output_path
+
+def warm_backgrounds():
+    """Заранее компилирует разметку (со шрифтами) и собирает фоны карточек всех катеров"""
+    snapshot = catalog.snapshot
+    for boat_name in snapshot.names:
+        try:
+            plan = layout_registry.plan_for({'pier': snapshot[boat_name].pier})
+            if OUTPUT_MODE == 'incremental':
+                get_background_bytes(boat_name, plan)
+            else:
+                get_background_page(boat_name, plan)
+        except Exception as e:
+            logger.error(f"Ошибка сборки фона для {boat_name}: {e}")
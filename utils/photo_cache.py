@@ -0,0 +1,175 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'photos')
+
+# Ограничение памяти под готовые PNG (байты)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def round_corners(image_path, radius=20):
+    """Создает изображение с закругленными углами"""
+    original = Image.open(image_path).convert("RGBA")
+    width, height = original.size
+
+    # Создаем маску с закругленными углами
+    mask = Image.new('L', (width, height), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.rounded_rectangle((0, 0, width, height), radius, fill=255)
+
+    # Применяем маску к изображению
+    result = Image.new('RGBA', (width, height))
+    result.paste(original, (0, 0), mask)
+
+    # Сохраняем во временный буфер
+    output = BytesIO()
+    result.save(output, format='PNG')
+    output.seek(0)
+    return output
+
+
+def target_size(image_size, box, dpi) -> tuple:
+    """Размер фото в пикселях для рамки box (в пунктах) при разрешении dpi
+
+    Фото только уменьшается; при dpi=None размер остается исходным.
+    """
+    if dpi is None:
+        return tuple(image_size)
+    width = min(image_size[0], round(box[0] / 72 * dpi))
+    height = min(image_size[1], round(box[1] / 72 * dpi))
+    return width, height
+
+
+def prepare_photo(image_path, radius, box, dpi=None, jpeg_quality=None, part='image') -> bytes:
+    """Фото катера для карточки в заданном качестве
+
+    Без jpeg_quality — PNG RGBA с закругленными углами, как round_corners.
+    С jpeg_quality цвет сохраняется в JPEG без прозрачности, а скругление
+    отдается отдельно как маска (part='mask', PNG в оттенках серого).
+    """
+    if dpi is None and jpeg_quality is None and part == 'image':
+        return round_corners(image_path, radius).getvalue()
+
+    original = Image.open(image_path)
+    size = target_size(original.size, box, dpi)
+    # Радиус задан в пикселях исходного фото
+    radius = radius * size[0] / original.size[0]
+
+    mask = Image.new('L', size, 0)
+    ImageDraw.Draw(mask).rounded_rectangle((0, 0) + size, radius, fill=255)
+    output = BytesIO()
+    if part == 'mask':
+        mask.save(output, format='PNG', optimize=True)
+        return output.getvalue()
+
+    image = original.convert('RGB')
+    if size != image.size:
+        image = image.resize(size, Image.LANCZOS)
+    if jpeg_quality is not None:
+        image.save(output, format='JPEG', quality=jpeg_quality, optimize=True)
+    else:
+        result = Image.new('RGBA', size)
+        result.paste(image, (0, 0), mask)
+        result.save(output, format='PNG')
+    return output.getvalue()
+
+
+class PhotoCache:
+    """Кэш фотографий катеров с закругленными углами (память + диск)
+
+    Ключ записи — (файл фото, радиус, рамка на карточке, параметры
+    качества). Запись становится недействительной, как только меняется
+    mtime исходника.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (mtime_ns, png bytes)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(image_path, radius, box, quality=(None, None, 'image')):
+        return (os.path.abspath(image_path), radius, tuple(box)) + tuple(quality)
+
+    def _disk_path(self, key, mtime_ns):
+        path, radius, box, dpi, jpeg_quality, part = key
+        if dpi is None and jpeg_quality is None:
+            # Прежний ключ, чтобы не пересобирать уже сохраненные PNG
+            name = f"{path}|{mtime_ns}|{radius}|{box}"
+        else:
+            name = f"{path}|{mtime_ns}|{radius}|{box}|{dpi}|{jpeg_quality}|{part}"
+        digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+        extension = 'jpg' if jpeg_quality is not None and part == 'image' else 'png'
+        return os.path.join(self.cache_dir, f"{digest}.{extension}")
+
+    def get(self, image_path, radius, box, dpi=None, jpeg_quality=None, part='image') -> bytes:
+        """Возвращает подготовленное фото (см. prepare_photo), строя его при необходимости"""
+        key = self._key(image_path, radius, box, (dpi, jpeg_quality, part))
+        mtime_ns = os.stat(key[0]).st_mtime_ns
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime_ns:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        disk_path = self._disk_path(key, mtime_ns)
+        try:
+            with open(disk_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = prepare_photo(key[0], radius, box, dpi, jpeg_quality, part)
+            self._write_disk(disk_path, data)
+
+        self._put(key, mtime_ns, data)
+        return data
+
+    def _write_disk(self, disk_path, data):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{disk_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, disk_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить фото в кэш: {e}")
+
+    def _put(self, key, mtime_ns, data):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            if len(data) > self.max_bytes:
+                return
+            self._entries[key] = (mtime_ns, data)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def warm(self, image_paths, radius, box):
+        """Заранее строит записи для списка фотографий"""
+        for image_path in image_paths:
+            try:
+                self.get(image_path, radius, box)
+            except Exception as e:
+                logger.error(f"Ошибка прогрева кэша для {image_path}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+photo_cache = PhotoCache()
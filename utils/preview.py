@@ -0,0 +1,217 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+
+from utils.catalog import catalog
+from utils.layout import layout_registry
+from utils.pdf_builder import timed
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'previews')
+
+# Пикселей на пункт PDF: 1.5 дает 893x1263 для A4 — больше Telegram все равно ужмет
+SCALE = float(os.getenv('PREVIEW_SCALE', '1.5'))
+FORMAT = os.getenv('PREVIEW_FORMAT', 'JPEG').upper()
+QUALITY = int(os.getenv('PREVIEW_QUALITY', '82'))
+
+
+class PreviewUnavailable(Exception):
+    """Нечем растеризовать шаблон: нет ни form.png, ни PyMuPDF"""
+
+
+def rasterize_template(template_path: str, scale: float) -> 'Image.Image':
+    """Первая страница шаблона как RGB-картинка
+
+    Берется готовый form.png рядом с шаблоном (экспорт из редактора, если
+    он новее PDF), иначе PDF растеризуется PyMuPDF — необязательной
+    зависимостью. Растр общий для всех катеров, поэтому кэшируется.
+    """
+    return _template_raster(template_path, os.stat(template_path).st_mtime_ns, scale).copy()
+
+
+@lru_cache(maxsize=2)
+def _template_raster(template_path: str, mtime_ns: int, scale: float) -> 'Image.Image':
+    from PIL import Image
+
+    raster_path = os.path.splitext(template_path)[0] + '.png'
+    if os.path.exists(raster_path) and os.stat(raster_path).st_mtime_ns >= os.stat(template_path).st_mtime_ns:
+        with Image.open(raster_path) as image:
+            width, height = page_size(template_path, scale)
+            return image.convert('RGB').resize((width, height), Image.LANCZOS)
+
+    try:
+        import pymupdf
+    except ImportError:
+        raise PreviewUnavailable("Для превью нужен PyMuPDF или configs/form.png")
+
+    with pymupdf.open(template_path) as document:
+        pixmap = document[0].get_pixmap(matrix=pymupdf.Matrix(scale, scale), alpha=False)
+        return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+
+@lru_cache(maxsize=8)
+def _page_size(template_path: str, mtime_ns: int) -> tuple:
+    from PyPDF2 import PdfReader
+    box = PdfReader(template_path).pages[0].mediabox
+    return float(box.width), float(box.height)
+
+
+def page_size(template_path: str, scale: float = 1.0) -> tuple:
+    """Размер страницы шаблона в пикселях при масштабе scale"""
+    width, height = _page_size(template_path, os.stat(template_path).st_mtime_ns)
+    return round(width * scale), round(height * scale)
+
+
+def build_preview_background(template_path: str, boat_image_path: str, photo_box, scale: float) -> 'Image.Image':
+    """Растровый фон превью: шаблон с фото катера в рамке photo_box, без текста"""
+    from PIL import Image
+    from utils.photo_cache import photo_cache
+
+    background = rasterize_template(template_path, scale)
+    height = background.height
+    box = (photo_box.width, photo_box.height)
+    # То же фото, что в PDF, но уже в пикселях превью
+    photo = Image.open(BytesIO(photo_cache.get(boat_image_path, photo_box.radius, box, dpi=72 * scale)))
+    size = (round(box[0] * scale), round(box[1] * scale))
+    if photo.size != size:
+        photo = photo.resize(size, Image.LANCZOS)
+    left = round(photo_box.x * scale)
+    top = height - round((photo_box.y + photo_box.height) * scale)
+    background.paste(photo, (left, top), photo if photo.mode == 'RGBA' else None)
+    return background
+
+
+class PreviewBackgroundCache:
+    """Растровые фоны превью по катерам: в памяти картинкой, на диске PNG
+
+    Как и BackgroundCache для PDF, фон пересобирается при изменении
+    шаблона или фото; растр шаблона общий для всех катеров.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=64):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (version, image)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _version(template_path, photo_path, photo_box, scale):
+        key = (os.path.abspath(template_path), os.path.abspath(photo_path))
+        return key, (os.stat(key[0]).st_mtime_ns, os.stat(key[1]).st_mtime_ns, scale, tuple(photo_box))
+
+    def _disk_path(self, key, version):
+        digest = hashlib.sha1(f"{key}|{version}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.png")
+
+    def get(self, template_path, photo_path, photo_box, scale=SCALE) -> 'Image.Image':
+        """Фон превью для катера; вызывающий рисует на копии"""
+        from PIL import Image
+
+        key, version = self._version(template_path, photo_path, photo_box, scale)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        disk_path = self._disk_path(key, version)
+        try:
+            with Image.open(disk_path) as image:
+                background = image.convert('RGB')
+        except FileNotFoundError:
+            background = build_preview_background(template_path, photo_path, photo_box, scale)
+            self._write_disk(disk_path, background)
+            logger.info(f"Фон превью собран: {os.path.basename(photo_path)}")
+
+        with self._lock:
+            self._entries[key] = (version, background)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return background
+
+    def _write_disk(self, disk_path, image):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{disk_path}.{os.getpid()}.tmp"
+            # Фон читается с диска только после перезапуска: сжимаем быстро, а не плотно
+            image.save(tmp_path, 'PNG', compress_level=1)
+            os.replace(tmp_path, disk_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить фон превью в кэш: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+@lru_cache(maxsize=16)
+def load_font(font_path: str, size: int) -> 'ImageFont.FreeTypeFont':
+    from PIL import ImageFont
+
+    if font_path is None:
+        return ImageFont.load_default(size)
+    return ImageFont.truetype(font_path, size)
+
+
+def render_preview(data: dict, timings: dict = None, image_format: str = None, scale: float = None) -> bytes:
+    """Превью карточки аренды картинкой (JPEG или WebP) по тому же плану рендера, что PDF"""
+    from PIL import ImageDraw
+
+    image_format = image_format or FORMAT
+    scale = scale or SCALE
+    plan = layout_registry.plan_for(data)
+
+    with timed(timings, 'preview_background'):
+        photo_path = catalog.snapshot[data['boat']].photo_path
+        image = preview_cache.get(plan.template_path, photo_path, plan.photo, scale).copy()
+
+    with timed(timings, 'preview_text'):
+        draw = ImageDraw.Draw(image)
+        for text in plan.place(data):
+            font = load_font(text.font_path, round(text.size * scale))
+            # Координаты PDF — от низа страницы, по базовой линии
+            draw.text((text.x * scale, image.height - text.y * scale), text.text, font=font, fill=text.color, anchor='ls')
+
+    with timed(timings, 'preview_encode'):
+        output = BytesIO()
+        # method=2 для WebP вдвое быстрее умолчания при почти том же размере
+        image.save(output, image_format, quality=QUALITY, method=2)
+    return output.getvalue()
+
+
+def render_preview_timed(data: dict) -> tuple:
+    """render_preview для пула: возвращает байты картинки и время этапов"""
+    timings = {}
+    started = time.perf_counter()
+    preview = render_preview(data, timings)
+    timings['preview_total'] = time.perf_counter() - started
+    return preview, timings
+
+
+def preview_filename(image_format: str = None) -> str:
+    return 'аренда.webp' if (image_format or FORMAT) == 'WEBP' else 'аренда.jpg'
+
+
+def warm_previews():
+    """Заранее собирает фоны превью всех катеров"""
+    snapshot = catalog.snapshot
+    for boat_name in snapshot.names:
+        try:
+            plan = layout_registry.plan_for({'pier': snapshot[boat_name].pier})
+            preview_cache.get(plan.template_path, snapshot[boat_name].photo_path, plan.photo)
+        except PreviewUnavailable as e:
+            logger.warning(f"Превью карточек отключено: {e}")
+            return
+        except Exception as e:
+            logger.error(f"Ошибка сборки фона превью для {boat_name}: {e}")
+
+
+preview_cache = PreviewBackgroundCache()
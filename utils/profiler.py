@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter, deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SLOW_RENDER_LOG_PATH = os.path.join(BASE_DIR, 'cache', 'slow_renders.jsonl')
+
+# Верхние кадры потоков, которые ничего не делают: цикл событий ждет
+# сокеты, воркеры пулов ждут задач
+IDLE_FRAMES = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+}
+
+
+class ProfilerBusy(Exception):
+    """Профиль уже снимается"""
+
+
+def frame_name(code) -> str:
+    """Кадр стека в виде «функция (файл:строка)»; файлы проекта — относительно корня"""
+    filename = code.co_filename
+    if filename.startswith(BASE_DIR):
+        filename = os.path.relpath(filename, BASE_DIR)
+    else:
+        filename = os.path.basename(filename)
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({filename}:{code.co_firstlineno})"
+
+
+def is_idle(code) -> bool:
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def thread_group(name: str) -> str:
+    """Потоки одного пула (render_0, render_1) сводятся в один корень стека"""
+    return name.rstrip('0123456789').rstrip('_-') or name
+
+
+class Profile:
+    """Результат сэмплирования: число попаданий по стекам потоков"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()  # (поток, (code, ...) от корня к листу) -> сэмплы
+        self.samples = 0
+        self.idle = 0
+        self.sampling_time = 0.0  # сколько сам сэмплер занимал процесс
+        self.started = time.time()
+        self.duration = 0.0
+
+    def collapsed(self) -> str:
+        """Стеки в свернутом формате flamegraph.pl / speedscope: «поток;кадр;кадр N»"""
+        names = {}
+        lines = []
+        for (thread, codes), count in self.stacks.most_common():
+            frames = [names.get(code) or names.setdefault(code, frame_name(code)) for code in codes]
+            lines.append(f"{';'.join([thread] + frames)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def top(self, limit: int = 5) -> list:
+        """Функции с наибольшим собственным временем: [(кадр, доля сэмплов), ...]"""
+        leaves = Counter()
+        for (_thread, codes), count in self.stacks.items():
+            leaves[codes[-1]] += count
+        busy = sum(leaves.values()) or 1
+        return [(frame_name(code), count / busy) for code, count in leaves.most_common(limit)]
+
+    @property
+    def overhead(self) -> float:
+        """Доля времени профиля, которую занял сам сэмплер"""
+        return self.sampling_time / self.duration if self.duration else 0.0
+
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер всех потоков процесса
+
+    Отдельный поток раз в interval секунд снимает стеки остальных потоков
+    (sys._current_frames) и считает одинаковые. Код бота не
+    инструментируется, поэтому профиль можно снять на работающем боте:
+    затраты — только обход стеков в момент снимка. Стеки ожидающих
+    потоков (IDLE_FRAMES) не сохраняются, а только считаются.
+
+    Видны поток цикла событий (обработчики aiogram) и потоки пулов, в том
+    числе рендер карточек в пуле потоков. Рендер в пуле процессов
+    (RENDER_EXECUTOR=process) и другие воркеры вебхука не видны.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _sample_loop(self, stop: threading.Event, profile: Profile):
+        own = threading.get_ident()
+        threads = {}
+        while not stop.wait(self.interval):
+            started = time.perf_counter()
+            frames = sys._current_frames()
+            if frames.keys() - threads.keys():
+                threads = {thread.ident: thread_group(thread.name) for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                if is_idle(frame.f_code):
+                    profile.idle += 1
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                codes.reverse()
+                profile.stacks[(threads.get(ident, str(ident)), tuple(codes))] += 1
+            profile.samples += 1
+            profile.sampling_time += time.perf_counter() - started
+
+    def start(self) -> tuple:
+        """Запускает сэмплирование; возвращает (stop, поток, профиль) для stop()"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("Профиль уже снимается")
+        stop = threading.Event()
+        profile = Profile(self.interval)
+        thread = threading.Thread(target=self._sample_loop, args=(stop, profile), name='profiler', daemon=True)
+        thread.start()
+        return stop, thread, profile
+
+    def stop(self, handle: tuple) -> Profile:
+        stop, thread, profile = handle
+        stop.set()
+        thread.join()
+        profile.duration = time.time() - profile.started
+        self._lock.release()
+        return profile
+
+    async def profile(self, seconds: float) -> Profile:
+        """Профиль процесса за seconds секунд; ProfilerBusy, если уже снимается другой"""
+        handle = self.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile = await asyncio.to_thread(self.stop, handle)
+        return profile
+
+
+class SlowRenderLog:
+    """Разбор по этапам для рендеров карточек дольше threshold секунд
+
+    Последние maxlen записей хранятся в памяти (для /slow_renders), каждая
+    также пишется в лог и строкой JSON в path. Данные клиента в запись не
+    попадают — только катер и причал.
+    """
+
+    def __init__(self, threshold: float, path: Optional[str] = SLOW_RENDER_LOG_PATH, maxlen: int = 50):
+        self.threshold = threshold
+        self.path = path
+        self.recent = deque(maxlen=maxlen)
+        self.count = 0
+
+    def record(self, kind: str, data: dict, timings: dict, wall: float, pool: dict = None) -> bool:
+        """Сохраняет разбор, если рендер медленный; True, если сохранен
+
+        timings — этапы из render_card_timed/render_preview_timed, wall —
+        время от постановки в пул до результата (вместе с очередью).
+        """
+        # Общее время рендера — самое большое из этапов
+        total = max(timings.values(), default=0.0)
+        if not self.threshold or total < self.threshold:
+            return False
+
+        entry = {
+            'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'kind': kind,
+            'boat': data.get('boat'),
+            'pier': data.get('pier'),
+            'total_ms': round(total * 1000, 1),
+            'queue_ms': round(max(wall - total, 0.0) * 1000, 1),
+            'stages_ms': {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()},
+        }
+        if pool is not None:
+            entry['pool'] = {'active': pool['active'], 'queued': pool['queued'], 'workers': pool['workers']}
+        self.recent.append(entry)
+        self.count += 1
+
+        stages = ', '.join(f"{stage} {ms:.0f}" for stage, ms in entry['stages_ms'].items())
+        logger.warning(f"Медленный рендер {kind} {entry['boat']}: {entry['total_ms']:.0f} мс, этапы (мс): {stages}")
+        if self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            except OSError as e:
+                logger.error(f"Не удалось записать медленный рендер в {self.path}: {e}")
+        return True
+
+
+profiler = SamplingProfiler(float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000)
+slow_render_log = SlowRenderLog(
+    float(os.getenv('RENDER_SLOW_MS', '500')) / 1000,
+    os.getenv('SLOW_RENDER_LOG', SLOW_RENDER_LOG_PATH) or None,
+)
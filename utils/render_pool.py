@@ -0,0 +1,138 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class RenderQueueFull(Exception):
+    """Очередь рендеринга заполнена, новую задачу принять нельзя"""
+
+    def __init__(self, depth: int):
+        super().__init__(f"Очередь рендеринга заполнена ({depth})")
+        self.depth = depth
+
+
+class RenderPool:
+    """Пул для тяжелой генерации карточек вне event loop
+
+    Одновременно выполняется не больше `workers` задач, еще не больше
+    `max_queue` ждут своей очереди. Остальные получают RenderQueueFull.
+
+    Исполнитель создается при первой задаче в каждом процессе: пул создается
+    при импорте main.py, до fork воркеров вебхука, а очереди
+    ProcessPoolExecutor нельзя делить между процессами.
+    """
+
+    def __init__(self, kind: str = 'thread', workers: int = 2, max_queue: int = 16):
+        if kind not in ('process', 'thread'):
+            raise ValueError(f"Неизвестный тип пула: {kind}")
+        self._executor = None
+        self._pid = None
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self._active = 0
+        self._waiters = deque()
+        self._jobs = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+
+    def _get_executor(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            if self.kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='render')
+        return self._executor
+
+    @property
+    def depth(self) -> int:
+        """Сколько задач ждет свободного воркера"""
+        return len(self._waiters)
+
+    async def _acquire(self, on_queued):
+        if self._active < self.workers and not self._waiters:
+            self._active += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            raise RenderQueueFull(len(self._waiters))
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            if on_queued is not None:
+                await on_queued(len(self._waiters))
+            await waiter
+        except BaseException:
+            # Уведомление об очереди не ушло или задачу отменили
+            if waiter.done() and not waiter.cancelled():
+                # Слот уже передан нам — отдаем его следующему
+                self._release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def _release(self):
+        # Слот переходит напрямую первому ожидающему
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    async def run(self, func, *args, on_queued=None):
+        """Выполняет func(*args) в пуле и возвращает результат
+
+        on_queued(position) вызывается, если задаче пришлось встать в очередь.
+        """
+        await self._acquire(on_queued)
+        try:
+            started = time.perf_counter()
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), func, *args
+            )
+            elapsed = time.perf_counter() - started
+            self._jobs += 1
+            self._total_time += elapsed
+            self._max_time = max(self._max_time, elapsed)
+            logger.info(
+                f"Рендер {getattr(func, '__name__', func)}: {elapsed:.3f} с, "
+                f"в работе {self._active}/{self.workers}, в очереди {self.depth}"
+            )
+            return result
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        """Текущая загрузка пула и время рендера"""
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'active': self._active,
+            'queued': self.depth,
+            'max_queue': self.max_queue,
+            'jobs': self._jobs,
+            'avg_time': self._total_time / self._jobs if self._jobs else 0.0,
+            'max_time': self._max_time,
+        }
+
+    def shutdown(self):
+        # Исполнитель, унаследованный от родителя через fork, не наш
+        if self._pid == os.getpid():
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def create_render_pool() -> RenderPool:
+    """Создает пул по настройкам из окружения (.env)"""
+    return RenderPool(
+        kind=os.getenv('RENDER_EXECUTOR', 'thread'),
+        workers=int(os.getenv('RENDER_WORKERS', os.cpu_count() or 2)),
+        max_queue=int(os.getenv('RENDER_QUEUE_SIZE', 16)),
+    )
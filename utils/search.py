@@ -0,0 +1,97 @@
+import re
+from bisect import bisect_left
+
+_WORD = re.compile(r'\w+')
+
+
+def normalize(text: str) -> str:
+    """Строка для поиска: нижний регистр, ё -> е, слова через пробел"""
+    return ' '.join(_WORD.findall(text.lower().replace('ё', 'е')))
+
+
+def trigrams(text: str) -> set:
+    # Пробелы по краям дают триграммы начала и конца слова
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class BoatSearchIndex:
+    """Поиск катеров по названию, причалу и именам капитанов
+
+    Для каждого поля (название, причал, капитан) есть префиксный индекс —
+    отсортированный список пар (слово, катер): слова, начинающиеся с
+    запроса, находятся двоичным поиском, и просмотр останавливается, как
+    только набрано limit катеров. Если совпадений по префиксу не хватает,
+    добираем нечеткие по триграммам названия (опечатки, пропущенные
+    буквы). Индекс строится на срез каталога (snapshot.derived) и
+    пересобирается вместе с ним.
+    """
+
+    # Порядок полей: совпадение в названии важнее, чем в причале или капитане
+    FIELDS = ('name', 'pier', 'captain')
+    MIN_SIMILARITY = 0.4
+
+    def __init__(self, snapshot):
+        self.names = snapshot.names
+        words = {field: [] for field in self.FIELDS}
+        self._trigrams = {}
+        self._trigram_counts = []
+        for boat_id, name in enumerate(self.names):
+            boat = snapshot[name]
+            fields = [('name', name), ('pier', boat.pier)]
+            fields += [('captain', captain.name) for captain in boat.captains]
+            for field, text in fields:
+                text = normalize(text)
+                # Слова поля и само поле целиком — чтобы искать и по «Белуга 2»
+                for word in set(text.split()) | {text}:
+                    words[field].append((word, boat_id))
+            name_trigrams = trigrams(normalize(name))
+            for trigram in name_trigrams:
+                self._trigrams.setdefault(trigram, []).append(boat_id)
+            self._trigram_counts.append(len(name_trigrams))
+
+        self._prefixes = []
+        for field in self.FIELDS:
+            pairs = sorted(words[field])
+            self._prefixes.append(([word for word, _ in pairs], [boat_id for _, boat_id in pairs]))
+
+    def _prefix(self, query: str, limit: int) -> list:
+        """До limit катеров со словом, начинающимся с query, по порядку полей"""
+        found = {}
+        for words, boat_ids in self._prefixes:
+            index = bisect_left(words, query)
+            while index < len(words) and words[index].startswith(query) and len(found) < limit:
+                found.setdefault(boat_ids[index], None)
+                index += 1
+        return list(found)
+
+    def _fuzzy(self, query: str) -> dict:
+        """Катера с похожим названием: boat_id -> доля общих триграмм"""
+        query_trigrams = trigrams(query)
+        counts = {}
+        for trigram in query_trigrams:
+            for boat_id in self._trigrams.get(trigram, ()):
+                counts[boat_id] = counts.get(boat_id, 0) + 1
+        found = {}
+        for boat_id, count in counts.items():
+            # Коэффициент Дайса по множествам триграмм
+            similarity = 2 * count / (len(query_trigrams) + self._trigram_counts[boat_id])
+            if similarity >= self.MIN_SIMILARITY:
+                found[boat_id] = similarity
+        return found
+
+    def search(self, query: str, limit: int = 50) -> list:
+        """Названия катеров по запросу, самые подходящие первыми"""
+        query = normalize(query)
+        if not query:
+            return list(self.names[:limit])
+
+        ranked = self._prefix(query, limit)
+        if len(ranked) < limit:
+            fuzzy = self._fuzzy(query)
+            found = set(ranked)
+            ranked += sorted(
+                (boat_id for boat_id in fuzzy if boat_id not in found),
+                key=lambda boat_id: (-fuzzy[boat_id], boat_id),
+            )
+        return [self.names[boat_id] for boat_id in ranked[:limit]]
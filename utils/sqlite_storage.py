@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(BASE_DIR, 'data', 'fsm.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+# Состояние и данные пишутся отдельно: запись одного не затирает другое,
+# измененное тем временем другим процессом
+UPSERT = {
+    'state': (
+        "INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, '{}', ?) "
+        "ON CONFLICT (key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at"
+    ),
+    'data': (
+        "INSERT INTO fsm (key, state, data, updated_at) VALUES (?, NULL, ?, ?) "
+        "ON CONFLICT (key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at"
+    ),
+}
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # В режиме WAL NORMAL не делает fsync на каждый коммит
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище aiogram в SQLite (WAL)
+
+    Изменения копятся в памяти и записываются одной транзакцией раз в
+    flush_interval секунд, поэтому шаги анкеты не платят за запись на диск
+    каждый. Состояние и данные пишутся отдельными колонками, поэтому
+    несколько процессов могут работать с одним файлом, не затирая изменения
+    друг друга. Чтение идет из базы, если у процесса нет своих незаписанных
+    изменений ключа, — другой процесс увидит изменения не раньше чем через
+    flush_interval. Если апдейты одного чата могут попасть в разные процессы
+    (воркеры вебхука), нужен flush_interval=0: каждое изменение записывается
+    до ответа обработчика.
+    """
+
+    def __init__(
+        self,
+        path: str = DB_PATH,
+        flush_interval: float = 0.2,
+        key_builder: Optional[KeyBuilder] = None,
+    ) -> None:
+        if key_builder is None:
+            key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.key_builder = key_builder
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._pid = None
+        self._read_conn = None
+        self._write_conn = None
+        self._write_lock = threading.Lock()
+
+        self._pending: Dict[str, dict] = {}  # key -> {'state': ..., 'data': json}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _connections(self):
+        # Соединения SQLite нельзя наследовать через fork, поэтому
+        # каждый процесс открывает свои при первом обращении
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._read_conn = _connect(self.path)
+            self._read_conn.execute(SCHEMA)
+            self._write_conn = _connect(self.path)
+            self._pending.clear()
+            self._flush_task = None
+        return self._read_conn, self._write_conn
+
+    def _load(self, key: str, column: str):
+        pending = self._pending.get(key)
+        if pending is not None and column in pending:
+            return pending[column]
+        read_conn, _ = self._connections()
+        row = read_conn.execute(
+            f"SELECT {column} FROM fsm WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None if column == 'state' else '{}'
+        return row[0]
+
+    async def _store(self, key: str, column: str, value):
+        # Новый словарь, а не правка старого: flush() сравнивает записи по is
+        self._pending[key] = {**self._pending.get(key, {}), column: value}
+        if self.flush_interval <= 0:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Повторяем, пока есть изменения, пришедшие во время записи
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _write(self, batch: Dict[str, dict]):
+        now = time.time()
+        with self._write_lock:
+            _, conn = self._connections()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, record in batch.items():
+                    for column, value in record.items():
+                        conn.execute(UPSERT[column], (key, value, now))
+                    # Пустая запись (state.clear()) не хранится
+                    conn.execute(
+                        "DELETE FROM fsm WHERE key = ? AND state IS NULL AND data = '{}'", (key,)
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    async def flush(self):
+        """Записывает накопленные изменения в базу"""
+        if not self._pending:
+            return
+        batch = self._pending.copy()
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            logger.error(f"Ошибка записи FSM в SQLite: {e}")
+            return
+        # Снимаем только те записи, что не менялись во время записи
+        for key, record in batch.items():
+            if self._pending.get(key) is record:
+                del self._pending[key]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._store(self.key_builder.build(key), 'state', state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._load(self.key_builder.build(key), 'state')
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        await self._store(self.key_builder.build(key), 'data', json.dumps(data, ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return json.loads(self._load(self.key_builder.build(key), 'data'))
+
+    def _delete_stale(self, key: str, older_than: float):
+        with self._write_lock:
+            _, conn = self._connections()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT state FROM fsm WHERE key = ? AND updated_at < ?", (key, older_than)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM fsm WHERE key = ?", (key,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return row
+
+    async def expire(self, key: StorageKey, older_than: float) -> tuple:
+        """Удаляет запись, если ее не меняли с older_than (time.time()) ни в одном процессе
+
+        Возвращает (удалена ли, состояние). Проверка и удаление идут в одной
+        транзакции, поэтому из нескольких процессов запись удалит один.
+        """
+        db_key = self.key_builder.build(key)
+        if db_key in self._pending:
+            return False, None
+        row = await asyncio.to_thread(self._delete_stale, db_key, older_than)
+        return row is not None, row[0] if row is not None else None
+
+    def _records(self) -> list:
+        read_conn, _ = self._connections()
+        return read_conn.execute(
+            "SELECT key, state, data, updated_at FROM fsm ORDER BY updated_at"
+        ).fetchall()
+
+    def _parse_key(self, key: str) -> Optional[StorageKey]:
+        """StorageKey по строке ключа; None, если ключ построен не DefaultKeyBuilder по умолчанию"""
+        builder = self.key_builder
+        if not (
+            isinstance(builder, DefaultKeyBuilder)
+            and builder.with_bot_id
+            and builder.with_destiny
+            and not builder.with_business_connection_id
+        ):
+            return None
+        parts = key.split(builder.separator)
+        if len(parts) not in (5, 6) or parts[0] != builder.prefix:
+            return None
+        try:
+            bot_id, chat_id, *thread_id, user_id = map(int, parts[1:-1])
+        except ValueError:
+            return None
+        storage_key = StorageKey(
+            bot_id=bot_id,
+            chat_id=chat_id,
+            user_id=user_id,
+            thread_id=thread_id[0] if thread_id else None,
+            destiny=parts[-1],
+        )
+        # Разбор неоднозначен, если в ключе есть лишние части — сверяем с построенным
+        return storage_key if builder.build(storage_key) == key else None
+
+    async def drafts(self) -> list:
+        """Сохраненные анкеты от старых к новым: [(StorageKey, состояние, данные, updated_at), ...]"""
+        await self.flush()
+        drafts = []
+        for key, state, data, updated_at in await asyncio.to_thread(self._records):
+            storage_key = self._parse_key(key)
+            if storage_key is not None:
+                drafts.append((storage_key, state, json.loads(data), updated_at))
+        return drafts
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        if self._pid == os.getpid():
+            self._read_conn.close()
+            self._write_conn.close()
+            self._pid = None
@@ -0,0 +1,92 @@
+import os
+import logging
+import threading
+from io import BytesIO
+
+from PyPDF2 import PdfReader, PageObject
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject
+
+logger = logging.getLogger(__name__)
+
+
+class _Template:
+    """Разобранный шаблон и его первая страница, готовая к слиянию"""
+
+    def __init__(self, path, mtime_ns, reader, page):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.reader = reader
+        self.page = page
+
+
+def preload_objects(obj, seen=None):
+    """Рекурсивно подгружает все косвенные объекты страницы
+
+    После этого рендеры только читают кэш PdfReader и не трогают
+    общий поток шаблона, поэтому могут идти параллельно.
+    """
+    if seen is None:
+        seen = set()
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key in seen:
+            return
+        seen.add(key)
+        obj = obj.get_object()
+    if isinstance(obj, DictionaryObject):
+        for name, value in obj.items():
+            if name != '/Parent':
+                preload_objects(value, seen)
+    elif isinstance(obj, ArrayObject):
+        for value in obj:
+            preload_objects(value, seen)
+
+
+def copy_page(page) -> PageObject:
+    """Неглубокая копия страницы: общие объекты, свои ключи верхнего уровня"""
+    result = PageObject(pdf=page.pdf)
+    result.update(page)
+    return result
+
+
+class TemplateRegistry:
+    """Реестр PDF-шаблонов: разбор один раз, перезагрузка при изменении файла"""
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def _load(self, path, mtime_ns):
+        with open(path, 'rb') as f:
+            data = f.read()
+        reader = PdfReader(BytesIO(data))
+        page = reader.pages[0]
+        preload_objects(page.indirect_reference)
+        logger.info(f"Шаблон загружен: {path}")
+        return _Template(path, mtime_ns, reader, page)
+
+    def get(self, path):
+        """Возвращает актуальный разобранный шаблон"""
+        path = os.path.abspath(path)
+        mtime_ns = os.stat(path).st_mtime_ns
+        template = self._templates.get(path)
+        if template is not None and template.mtime_ns == mtime_ns:
+            return template
+
+        with self._lock:
+            template = self._templates.get(path)
+            if template is None or template.mtime_ns != mtime_ns:
+                template = self._load(path, mtime_ns)
+                self._templates[path] = template
+        return template
+
+    def get_page(self, path) -> PageObject:
+        """Отдает собственную копию страницы шаблона для одного рендера
+
+        merge_page меняет только ключи верхнего уровня страницы, поэтому
+        неглубокой копии достаточно, чтобы рендеры не мешали друг другу.
+        """
+        return copy_page(self.get(path).page)
+
+
+template_registry = TemplateRegistry()
@@ -0,0 +1,169 @@
+import sys
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from utils.metrics import fsm_drafts_expired
+
+logger = logging.getLogger(__name__)
+
+
+def approx_size(value) -> int:
+    """Примерный размер объекта в памяти вместе с вложенными словарями и списками
+
+    Ключи словарей не считаются: это имена полей из кода, общие для всех анкет.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(item) for item in value.values())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approx_size(item) for item in value)
+    return size
+
+
+class TTLStorage(BaseStorage):
+    """Обертка FSM-хранилища, удаляющая брошенные анкеты через ttl секунд
+
+    Ключи с состоянием или данными лежат в OrderedDict в порядке последнего
+    обращения: каждое чтение или запись переносит ключ в конец, поэтому
+    самые старые всегда в начале и истекшие снимаются с головы без обхода
+    всех ключей. Для каждого ключа хранится примерный размер состояния и
+    данных (approx_size) — по сумме видно, сколько памяти занимают анкеты.
+    Учитываются ключи, к которым обращался этот процесс, и анкеты,
+    подхваченные из хранилища при запуске (restore).
+    """
+
+    def __init__(
+        self,
+        storage: BaseStorage,
+        ttl: float,
+        on_expire: Optional[Callable[[StorageKey, Optional[str]], Awaitable[None]]] = None,
+        check_interval: float = 60.0,
+    ) -> None:
+        self.storage = storage
+        self.ttl = ttl
+        self.on_expire = on_expire
+        self.check_interval = check_interval
+        self._entries: 'OrderedDict[StorageKey, list]' = OrderedDict()  # key -> [время, байты состояния, байты данных]
+        self._bytes = 0
+        self._expired = 0
+        self._expire_task: Optional[asyncio.Task] = None
+
+    def _touch(self, key: StorageKey, state_bytes: int = None, data_bytes: int = None):
+        entry = self._entries.get(key)
+        if entry is None:
+            if not state_bytes and not data_bytes:
+                return  # пустые ключи (все, кто просто написал боту) не отслеживаем
+            entry = self._entries[key] = [0.0, 0, 0]
+            self._start_expire_loop()
+        else:
+            self._entries.move_to_end(key)
+        entry[0] = time.monotonic()
+        if state_bytes is not None:
+            self._bytes += state_bytes - entry[1]
+            entry[1] = state_bytes
+        if data_bytes is not None:
+            self._bytes += data_bytes - entry[2]
+            entry[2] = data_bytes
+        if not entry[1] and not entry[2]:
+            # Анкета завершена (state.clear()) — ключ больше не нужен
+            del self._entries[key]
+
+    def _start_expire_loop(self):
+        if self._expire_task is None or self._expire_task.done():
+            self._expire_task = asyncio.get_running_loop().create_task(self._expire_loop())
+
+    async def restore(self) -> int:
+        """Подхватывает анкеты, сохраненные до перезапуска; возвращает их число
+
+        Нужна поддержка во внутреннем хранилище (SQLiteStorage.drafts()):
+        срок анкеты отсчитывается от времени ее последнего изменения в базе,
+        поэтому брошенные до перезапуска тоже удаляются. Вызывается при
+        запуске бота, до обработки апдейтов.
+        """
+        drafts = getattr(self.storage, 'drafts', None)
+        if drafts is None:
+            return 0
+        now, wall_now = time.monotonic(), time.time()
+        restored = OrderedDict()
+        for key, state, data, updated_at in await drafts():
+            if key in self._entries:
+                continue
+            entry = [now - max(wall_now - updated_at, 0.0), approx_size(state) if state else 0, approx_size(data) if data else 0]
+            restored[key] = entry
+            self._bytes += entry[1] + entry[2]
+        if restored:
+            # Подхваченные анкеты старше всех, которых уже касался этот процесс
+            restored.update(self._entries)
+            self._entries = restored
+            self._start_expire_loop()
+        return len(restored)
+
+    async def _expire_loop(self):
+        while self._entries:
+            key, (touched_at, _, _) = next(iter(self._entries.items()))
+            delay = touched_at + self.ttl - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(min(delay, self.check_interval))
+                continue
+            await self._expire(key)
+
+    async def _expire(self, key: StorageKey):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[1] + entry[2]
+        try:
+            expire = getattr(self.storage, 'expire', None)
+            if expire is not None:
+                # Хранилище общее с другими процессами: удаляем, только если
+                # анкету не меняли и там, и только в одном процессе
+                expired, state = await expire(key, time.time() - self.ttl)
+                if not expired:
+                    return
+            else:
+                state = await self.storage.get_state(key)
+                if key in self._entries:
+                    return  # пользователь вернулся, пока читали состояние
+                await self.storage.set_state(key, None)
+                await self.storage.set_data(key, {})
+        except Exception as e:
+            logger.error(f"Ошибка удаления брошенной анкеты {key.chat_id}: {e}")
+            return
+        self._expired += 1
+        fsm_drafts_expired.inc()
+        logger.info(f"Брошенная анкета удалена: чат {key.chat_id}, состояние {state}")
+        if self.on_expire is not None:
+            try:
+                await self.on_expire(key, state)
+            except Exception as e:
+                logger.warning(f"Не удалось сообщить об удалении анкеты {key.chat_id}: {e}")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self.storage.set_state(key, state)
+        state = state.state if isinstance(state, State) else state
+        self._touch(key, state_bytes=approx_size(state) if state else 0)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        self._touch(key)
+        return await self.storage.get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self.storage.set_data(key, data)
+        self._touch(key, data_bytes=approx_size(dict(data)) if data else 0)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        self._touch(key)
+        return await self.storage.get_data(key)
+
+    def stats(self) -> dict:
+        """Число отслеживаемых анкет, их примерный размер в байтах и сколько удалено"""
+        return {'entries': len(self._entries), 'bytes': self._bytes, 'expired': self._expired}
+
+    async def close(self) -> None:
+        if self._expire_task is not None and not self._expire_task.done():
+            self._expire_task.cancel()
+        await self.storage.close()
@@ -0,0 +1,140 @@
+import os
+import signal
+import asyncio
+import logging
+import multiprocessing
+from typing import NamedTuple, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookSettings(NamedTuple):
+    host: str = '0.0.0.0'
+    port: int = 8080
+    path: str = '/webhook'
+    secret: Optional[str] = None
+    url: Optional[str] = None  # Публичный адрес; без него вебхук не регистрируется
+    workers: int = 1
+    drain_timeout: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> 'WebhookSettings':
+        """Настройки из окружения (.env)"""
+        return cls(
+            host=os.getenv('WEBHOOK_HOST', cls._field_defaults['host']),
+            port=int(os.getenv('WEBHOOK_PORT', cls._field_defaults['port'])),
+            path=os.getenv('WEBHOOK_PATH', cls._field_defaults['path']),
+            secret=os.getenv('WEBHOOK_SECRET') or None,
+            url=os.getenv('WEBHOOK_URL') or None,
+            workers=int(os.getenv('WEBHOOK_WORKERS', cls._field_defaults['workers'])),
+            drain_timeout=float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', cls._field_defaults['drain_timeout'])),
+        )
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """Обработчик вебхука, который при остановке дожидается начатых апдейтов
+
+    Telegram получает ответ сразу, а апдейт обрабатывается в фоне. Перед
+    закрытием сессии бота ждем эти задачи не дольше drain_timeout секунд.
+    """
+
+    def __init__(self, *args, drain_timeout: float = 30.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.drain_timeout = drain_timeout
+
+    async def drain(self):
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logger.info(f"Ожидаем завершения {len(tasks)} апдейтов")
+        done, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        if pending:
+            logger.warning(f"Не дождались {len(pending)} апдейтов, прерываем")
+            for task in pending:
+                task.cancel()
+
+    async def close(self) -> None:
+        await self.drain()
+        await super().close()
+
+
+def create_app(dispatcher: Dispatcher, bot: Bot, settings: WebhookSettings) -> web.Application:
+    """aiohttp приложение, передающее апдейты из вебхука в диспетчер
+
+    Для локальной проверки достаточно отправить JSON апдейта:
+    curl -X POST -H 'X-Telegram-Bot-Api-Secret-Token: <secret>' \\
+         -d @update.json http://localhost:8080/webhook
+    """
+    app = web.Application()
+    DrainingRequestHandler(
+        dispatcher=dispatcher,
+        bot=bot,
+        secret_token=settings.secret,
+        drain_timeout=settings.drain_timeout,
+    ).register(app, path=settings.path)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+async def register_webhook(bot: Bot, settings: WebhookSettings):
+    """Сообщает Telegram адрес вебхука"""
+    try:
+        await bot.set_webhook(
+            url=settings.url.rstrip('/') + settings.path,
+            secret_token=settings.secret,
+        )
+        logger.info(f"Вебхук зарегистрирован: {settings.url}")
+    finally:
+        await bot.session.close()
+
+
+def _serve(dispatcher: Dispatcher, bot: Bot, settings: WebhookSettings, index: int = 0):
+    # Номер воркера нужен, например, чтобы развести порты метрик
+    os.environ['WEBHOOK_WORKER_INDEX'] = str(index)
+    app = create_app(dispatcher, bot, settings)
+    # reuse_port позволяет нескольким процессам слушать один порт
+    web.run_app(
+        app,
+        host=settings.host,
+        port=settings.port,
+        reuse_port=settings.workers > 1,
+        shutdown_timeout=settings.drain_timeout,
+        print=None,
+    )
+
+
+def run_webhook(dispatcher: Dispatcher, bot: Bot, settings: WebhookSettings):
+    """Запускает бота в режиме вебхука в settings.workers процессах"""
+    if settings.url:
+        asyncio.run(register_webhook(bot, settings))
+
+    logger.info(
+        f"Вебхук слушает {settings.host}:{settings.port}{settings.path}, "
+        f"процессов: {settings.workers}"
+    )
+    if settings.workers <= 1:
+        _serve(dispatcher, bot, settings)
+        return
+
+    context = multiprocessing.get_context('fork')
+    workers = [
+        context.Process(target=_serve, args=(dispatcher, bot, settings, i), name=f"webhook-{i}")
+        for i in range(settings.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def stop(signum, frame):
+        # Каждый воркер сам дорабатывает начатые апдейты
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for worker in workers:
+        worker.join()